@@ -0,0 +1,234 @@
+"""
+Approximate Nearest-Neighbour Index
+Inverted-file (IVF) index over drug embeddings for maximum inner product search
+
+Drug vectors are clustered with k-means. At query time only the `nprobe`
+lists whose centroids score highest against the patient are scanned, instead
+of every drug in the vocabulary.
+
+Usage (recall-vs-exact diagnostic):
+    python ann_index.py --artifact ../model/artifact --nprobe 1 2 4 8 16
+"""
+
+import argparse
+import contextlib
+import io
+import math
+import time
+
+import torch
+
+
+class IVFIndex:
+    """
+    IVF index built in PyTorch, no external service required.
+
+    Lists are stored as one padded (nlist, max_list_len) tensor of drug ids so
+    that a batch of queries can gather and score its candidates in one pass.
+    """
+
+    def __init__(self, vectors: torch.Tensor, centroids: torch.Tensor, lists: torch.Tensor):
+        self.vectors = vectors  # float tensor, or a QuantizedMatrix (quantization.py)
+        self.centroids = centroids
+        self.lists = lists  # (nlist, max_len), padded with -1
+
+    @property
+    def nlist(self) -> int:
+        return self.centroids.size(0)
+
+    @classmethod
+    @torch.no_grad()
+    def build(cls, vectors: torch.Tensor, nlist: int = 0, n_iter: int = 20, seed: int = 0):
+        """
+        Cluster vectors with k-means and build the inverted lists.
+
+        Args:
+            vectors: (n, dim) float tensor of drug embeddings
+            nlist: Number of lists; 0 picks 4 * sqrt(n)
+            n_iter: k-means iterations
+            seed: Random seed for centroid initialisation
+        """
+        vectors = vectors.float()
+        n = vectors.size(0)
+        if nlist <= 0:
+            nlist = max(1, int(4 * math.sqrt(n)))
+        nlist = min(nlist, n)
+
+        generator = torch.Generator().manual_seed(seed)
+        centroids = vectors[torch.randperm(n, generator=generator)[:nlist]].clone()
+
+        for _ in range(n_iter):
+            assign = cls._assign(vectors, centroids)
+            counts = torch.bincount(assign, minlength=nlist)
+            sums = torch.zeros_like(centroids).index_add_(0, assign, vectors)
+            nonempty = counts > 0
+            centroids[nonempty] = sums[nonempty] / counts[nonempty].unsqueeze(1)
+
+            # Re-seed empty clusters from random points
+            empty = (~nonempty).nonzero(as_tuple=True)[0]
+            if empty.numel() > 0:
+                reseed = torch.randint(0, n, (empty.numel(),), generator=generator)
+                centroids[empty] = vectors[reseed]
+
+        assign = cls._assign(vectors, centroids)
+        return cls(vectors, centroids, cls._build_lists(assign, nlist))
+
+    @staticmethod
+    def _assign(vectors: torch.Tensor, centroids: torch.Tensor, chunk_size: int = 65536) -> torch.Tensor:
+        """Nearest centroid (L2) for every vector, computed in chunks."""
+        centroid_norms = (centroids * centroids).sum(dim=1)
+        assign = torch.empty(vectors.size(0), dtype=torch.long)
+        for start in range(0, vectors.size(0), chunk_size):
+            chunk = vectors[start:start + chunk_size]
+            dist = centroid_norms.unsqueeze(0) - 2 * torch.matmul(chunk, centroids.T)
+            assign[start:start + chunk_size] = dist.argmin(dim=1)
+        return assign
+
+    @staticmethod
+    def _build_lists(assign: torch.Tensor, nlist: int) -> torch.Tensor:
+        """Pack list membership into a padded (nlist, max_len) id matrix."""
+        order = torch.argsort(assign, stable=True)
+        counts = torch.bincount(assign, minlength=nlist)
+        max_len = max(int(counts.max().item()), 1)
+        offsets = torch.cumsum(counts, 0) - counts
+
+        sorted_assign = assign[order]
+        position = torch.arange(order.numel()) - offsets[sorted_assign]
+        lists = torch.full((nlist, max_len), -1, dtype=torch.long)
+        lists[sorted_assign, position] = order
+        return lists
+
+    def gather(self, ids: torch.Tensor) -> torch.Tensor:
+        """Float32 vectors of the given drug ids (any shape)."""
+        if isinstance(self.vectors, torch.Tensor):
+            return self.vectors[ids]
+        return self.vectors.dequantize(ids)
+
+    @torch.no_grad()
+    def search(self, queries: torch.Tensor, k: int, nprobe: int = 8, chunk_size: int = 256):
+        """
+        Approximate top-k inner product search.
+
+        Args:
+            queries: (batch, dim) query vectors
+            k: Number of results per query
+            nprobe: Number of lists scanned per query
+            chunk_size: Queries scored together, bounding the candidate buffer
+
+        Returns:
+            Tuple of (scores, ids), each (batch, k). Slots that could not be
+            filled from the probed lists have id -1 and score -inf.
+        """
+        queries = queries.float()
+        nprobe = min(nprobe, self.nlist)
+        k = min(k, nprobe * self.lists.size(1))
+
+        all_scores, all_ids = [], []
+        for start in range(0, queries.size(0), chunk_size):
+            chunk = queries[start:start + chunk_size]
+
+            # Pick the lists whose centroids best match each query
+            _, probe = torch.topk(torch.matmul(chunk, self.centroids.T), nprobe, dim=1)
+
+            # (chunk, nprobe * max_len) candidate drug ids
+            candidates = self.lists[probe].reshape(chunk.size(0), -1)
+            valid = candidates >= 0
+            cand_vectors = self.gather(candidates.clamp(min=0))
+
+            scores = torch.einsum('bcd,bd->bc', cand_vectors, chunk)
+            scores = scores.masked_fill(~valid, float('-inf'))
+
+            topk_scores, topk_pos = torch.topk(scores, k, dim=1)
+            topk_ids = torch.gather(candidates, 1, topk_pos)
+            all_scores.append(topk_scores)
+            all_ids.append(topk_ids.masked_fill(torch.isinf(topk_scores), -1))
+
+        if not all_scores:
+            return torch.empty(0, k), torch.empty(0, k, dtype=torch.long)
+        return torch.cat(all_scores), torch.cat(all_ids)
+
+    def save(self, path: str):
+        """Save centroids and lists (vectors are rebuilt from the embeddings)."""
+        torch.save({"centroids": self.centroids, "lists": self.lists}, path)
+
+    @classmethod
+    def load(cls, path: str, vectors: torch.Tensor):
+        """Load a saved index over the given drug vectors."""
+        state = torch.load(path, weights_only=True, map_location='cpu')
+        if int(state["lists"].max().item()) >= vectors.size(0):
+            raise ValueError(f"ANN index at {path} does not match the drug embeddings")
+        return cls(vectors.float(), state["centroids"], state["lists"])
+
+
+@torch.no_grad()
+def recall_vs_exact(index: IVFIndex, queries: torch.Tensor, k: int = 10, nprobe: int = 8) -> dict:
+    """
+    Measure how much of the exact top-k the index recovers.
+
+    Args:
+        index: Built IVF index
+        queries: (n, dim) sample of patient embeddings
+        k: Cut-off for recall
+        nprobe: Number of lists scanned per query
+
+    Returns:
+        Dict with recall@k and per-query latency of both paths
+    """
+    queries = queries.float()
+
+    start = time.perf_counter()
+    num_drugs = index.vectors.size(0)
+    _, exact_ids = torch.topk(torch.matmul(queries, index.gather(torch.arange(num_drugs)).T), min(k, num_drugs), dim=1)
+    exact_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    _, ann_ids = index.search(queries, k, nprobe=nprobe)
+    ann_time = time.perf_counter() - start
+
+    hits = (ann_ids.unsqueeze(2) == exact_ids.unsqueeze(1)).any(dim=2).sum().item()
+    n = queries.size(0)
+    return {
+        "k": k,
+        "nprobe": nprobe,
+        "nlist": index.nlist,
+        "queries": n,
+        "recall": round(hits / max(n * exact_ids.size(1), 1), 4),
+        "exact_ms_per_query": round(1000 * exact_time / max(n, 1), 4),
+        "ann_ms_per_query": round(1000 * ann_time / max(n, 1), 4),
+    }
+
+
+def main():
+    from inference import DrugRecommender
+
+    parser = argparse.ArgumentParser(description="IVF recall-vs-exact diagnostic")
+    parser.add_argument("--artifact", help="Memory-mapped artifact directory")
+    parser.add_argument("--embeddings", help="Path to embeddings.pt")
+    parser.add_argument("--mappings", help="Path to mappings.pt")
+    parser.add_argument("--nlist", type=int, default=0, help="Number of IVF lists (0 = auto)")
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=1000, help="Number of sampled patients")
+    parser.add_argument("--save", help="Write the built index to this path")
+    args = parser.parse_args()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        recommender = DrugRecommender(args.artifact or args.embeddings, args.mappings)
+
+    start = time.perf_counter()
+    index = IVFIndex.build(recommender.drug_embeddings, nlist=args.nlist)
+    print(f"Built IVF index: {index.nlist} lists over {index.vectors.size(0)} drugs "
+          f"in {time.perf_counter() - start:.2f}s")
+    if args.save:
+        index.save(args.save)
+        print(f"Saved index to {args.save}")
+
+    n = min(args.queries, recommender.patient_embeddings.size(0))
+    sample = torch.randperm(recommender.patient_embeddings.size(0))[:n]
+    queries = recommender.patient_embeddings[sample]
+    for nprobe in args.nprobe:
+        print(recall_vs_exact(index, queries, k=args.k, nprobe=nprobe))
+
+
+if __name__ == "__main__":
+    main()
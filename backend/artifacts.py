@@ -0,0 +1,233 @@
+"""
+Memory-mapped Embedding Artifacts
+Flat on-disk layout for embeddings and ID maps that workers can open zero-copy
+
+An artifact is a directory holding one raw binary file per array plus a small
+JSON header describing dtype and shape:
+
+    artifact/
+        header.json
+        patient_embeddings.bin
+        concept_embeddings.bin
+        drug_concept_indices.bin
+        patient_ids.bin
+        concept_cuis.bin
+        patient_keys.bin, patient_key_rows.bin   (sorted ID codes, see id_maps.py)
+        concept_keys.bin, concept_key_rows.bin
+        patient_row_codes.bin, concept_row_codes.bin   (ID code of each row)
+
+Arrays are opened with np.memmap, so every worker process shares the same
+page cache instead of unpickling a private copy of the tables.
+
+Usage:
+    python artifacts.py --embeddings ../model/embeddings.pt \\
+        --mappings ../model/mappings.pt --out ../model/artifact
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+import torch
+
+from id_maps import CUI_FORMAT, PATIENT_FORMAT, IdMap
+
+HEADER_NAME = "header.json"
+FORMAT_NAME = "drug-rec-embeddings"
+FORMAT_VERSION = 1
+
+
+def is_artifact_dir(path: str) -> bool:
+    """Check whether a path is an exported artifact directory."""
+    return os.path.isfile(os.path.join(path, HEADER_NAME))
+
+
+def _id_arrays(mappings: dict, num_patients: int, num_concepts: int):
+    """Flatten the pickled ID maps into index-ordered string arrays."""
+    if 'pid_to_idx' in mappings:
+        patient_to_idx = mappings['pid_to_idx']
+    elif 'patient_to_idx' in mappings:
+        patient_to_idx = mappings['patient_to_idx']
+    else:
+        patient_to_idx = {str(i): i for i in range(num_patients)}
+
+    if 'cui_to_idx' in mappings:
+        idx_to_cuid = {v: k for k, v in mappings['cui_to_idx'].items()}
+    elif 'concept_to_idx' in mappings:
+        idx_to_cuid = {v: k for k, v in mappings['concept_to_idx'].items()}
+    elif 'idx_to_concept' in mappings:
+        idx_to_cuid = mappings['idx_to_concept']
+    else:
+        idx_to_cuid = {}
+
+    patient_ids = [""] * num_patients
+    for pid, idx in patient_to_idx.items():
+        patient_ids[idx] = str(pid)
+
+    concept_cuis = [""] * num_concepts
+    for idx, cui in idx_to_cuid.items():
+        if 0 <= idx < num_concepts:
+            concept_cuis[idx] = str(cui)
+
+    return np.array(patient_ids, dtype=np.bytes_), np.array(concept_cuis, dtype=np.bytes_)
+
+
+def export_artifact(embeddings_path: str, mappings_path: str, out_dir: str) -> dict:
+    """
+    Convert embeddings.pt / mappings.pt pickles into a memory-mappable artifact.
+
+    The artifact is written to a sibling temp directory and renamed into place,
+    so readers never see a half-written layout.
+
+    Args:
+        embeddings_path: Path to embeddings.pt
+        mappings_path: Path to mappings.pt
+        out_dir: Destination artifact directory
+
+    Returns:
+        The header dict that was written
+    """
+    embeddings = torch.load(embeddings_path, weights_only=False, map_location='cpu')
+    mappings = torch.load(mappings_path, weights_only=False, map_location='cpu')
+
+    patient_embeddings = embeddings['patient_embeddings'].detach().float().contiguous().numpy()
+    concept_embeddings = embeddings['concept_embeddings'].detach().float().contiguous().numpy()
+    drug_concept_indices = embeddings['drug_concept_indices'].detach().long().contiguous().numpy()
+    patient_ids, concept_cuis = _id_arrays(
+        mappings, patient_embeddings.shape[0], concept_embeddings.shape[0]
+    )
+    patient_map = IdMap.from_row_ids(patient_ids, **PATIENT_FORMAT)
+    concept_map = IdMap.from_row_ids(concept_cuis, **CUI_FORMAT)
+
+    arrays = {
+        "patient_embeddings": patient_embeddings,
+        "concept_embeddings": concept_embeddings,
+        "drug_concept_indices": drug_concept_indices,
+        "patient_ids": patient_ids,
+        "concept_cuis": concept_cuis,
+        "patient_keys": patient_map.keys,
+        "patient_key_rows": patient_map.key_rows,
+        "concept_keys": concept_map.keys,
+        "concept_key_rows": concept_map.key_rows,
+        "patient_row_codes": patient_map.row_codes,
+        "concept_row_codes": concept_map.row_codes,
+    }
+
+    tmp_dir = out_dir.rstrip(os.sep) + ".tmp"
+    if os.path.exists(tmp_dir):
+        shutil.rmtree(tmp_dir)
+    os.makedirs(tmp_dir)
+
+    digest = hashlib.sha256()
+    header = {
+        "format": FORMAT_NAME,
+        "format_version": FORMAT_VERSION,
+        "created_at": time.time(),
+        "arrays": {},
+    }
+    for name, array in arrays.items():
+        filename = f"{name}.bin"
+        array.tofile(os.path.join(tmp_dir, filename))
+        digest.update(name.encode())
+        digest.update(array.tobytes())
+        header["arrays"][name] = {
+            "file": filename,
+            "dtype": array.dtype.str,
+            "shape": list(array.shape),
+        }
+    header["version"] = digest.hexdigest()[:16]
+
+    with open(os.path.join(tmp_dir, HEADER_NAME), "w") as f:
+        json.dump(header, f, indent=2)
+
+    if os.path.exists(out_dir):
+        shutil.rmtree(out_dir)
+    os.rename(tmp_dir, out_dir)
+
+    print(f"Exported artifact {header['version']} to {out_dir}")
+    return header
+
+
+def open_artifact(artifact_dir: str):
+    """
+    Open an artifact directory without copying the arrays.
+
+    Arrays are mapped copy-on-write: pages are shared with every other process
+    mapping the same files until something writes to them.
+
+    Returns:
+        Tuple of (header dict, dict of name -> np.memmap)
+    """
+    with open(os.path.join(artifact_dir, HEADER_NAME)) as f:
+        header = json.load(f)
+
+    if header.get("format") != FORMAT_NAME:
+        raise ValueError(f"Not an embedding artifact: {artifact_dir}")
+    if header.get("format_version") != FORMAT_VERSION:
+        raise ValueError(f"Unsupported artifact format version: {header.get('format_version')}")
+
+    arrays = {}
+    for name, spec in header["arrays"].items():
+        shape = tuple(spec["shape"])
+        if 0 in shape:
+            arrays[name] = np.empty(shape, dtype=np.dtype(spec["dtype"]))
+            continue
+        arrays[name] = np.memmap(
+            os.path.join(artifact_dir, spec["file"]),
+            dtype=np.dtype(spec["dtype"]),
+            mode="c",
+            shape=shape,
+        )
+    return header, arrays
+
+
+def _open_id_map(arrays: dict, kind: str, id_format: dict) -> IdMap:
+    """IdMap over the saved sorted keys, or encoded from the ID strings (older exports)."""
+    row_ids = arrays["patient_ids" if kind == "patient" else "concept_cuis"]
+    if f"{kind}_keys" in arrays:
+        return IdMap.from_sorted(
+            arrays[f"{kind}_keys"], arrays[f"{kind}_key_rows"], row_ids,
+            row_codes=arrays.get(f"{kind}_row_codes"), **id_format,
+        )
+    return IdMap.from_row_ids(row_ids, **id_format)
+
+
+def load_artifact(artifact_dir: str):
+    """
+    Load an artifact in the shape DrugRecommender expects from torch.load.
+
+    Returns:
+        Tuple of (embeddings dict of tensors, mappings dict, artifact version)
+    """
+    header, arrays = open_artifact(artifact_dir)
+
+    embeddings = {
+        "patient_embeddings": torch.from_numpy(arrays["patient_embeddings"]),
+        "concept_embeddings": torch.from_numpy(arrays["concept_embeddings"]),
+        "drug_concept_indices": torch.from_numpy(arrays["drug_concept_indices"]),
+    }
+
+    mappings = {
+        "patient_ids": _open_id_map(arrays, "patient", PATIENT_FORMAT),
+        "concept_ids": _open_id_map(arrays, "concept", CUI_FORMAT),
+    }
+
+    return embeddings, mappings, header["version"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export embeddings to a memory-mapped artifact")
+    parser.add_argument("--embeddings", required=True, help="Path to embeddings.pt")
+    parser.add_argument("--mappings", required=True, help="Path to mappings.pt")
+    parser.add_argument("--out", required=True, help="Output artifact directory")
+    args = parser.parse_args()
+
+    export_artifact(args.embeddings, args.mappings, args.out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Dynamic Micro-Batching
+Coalesces concurrent /api/recommend calls into one batched scoring pass
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+
+
+class MicroBatcher:
+    """
+    Request-coalescing scheduler for DrugRecommender.recommend_batch.
+
+    Requests are queued on the event loop. A collector task takes the first
+    waiting request, gathers more for up to `max_wait_ms` (or until
+    `max_batch_size` is reached) and scores the whole batch on a worker
+    thread, so the blocking matmul never runs on the event loop. Requests that
+    arrive while a batch is being scored form the next batch.
+    """
+
+    def __init__(self, get_recommender, max_batch_size: int = 64, max_wait_ms: float = 2.0,
+                 max_top_k: int = 100):
+        self.get_recommender = get_recommender
+        self.max_batch_size = max_batch_size
+        self.max_top_k = max_top_k  # the whole batch is scored at its largest top_k
+        self.max_wait = max_wait_ms / 1000.0
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="recommend-batch")
+        self._queue = None
+        self._task = None
+        self._loop = None
+        self.batches = 0
+        self.requests = 0
+
+    def _ensure_started(self):
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._loop is not loop:
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._task = loop.create_task(self._run())
+
+    async def submit(self, patient_id: str, top_k: int = 5):
+        """
+        Queue one patient and wait for its batched result.
+
+        Returns:
+            Tuple of (same as DrugRecommender.recommend: a list of
+            recommendation dicts or an error dict for an unknown patient,
+            the DrugRecommender that scored the batch)
+        """
+        if not 1 <= top_k <= self.max_top_k:
+            raise ValueError(f"top_k must be between 1 and {self.max_top_k}")
+        self._ensure_started()
+        future = self._loop.create_future()
+        await self._queue.put((patient_id, top_k, future))
+        return await future
+
+    async def _collect(self) -> list:
+        """Wait for one request, then gather more until full or timed out."""
+        batch = [await self._queue.get()]
+        deadline = self._loop.time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - self._loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        while len(batch) < self.max_batch_size and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            batch = [item for item in batch if not item[2].done()]
+            if not batch:
+                continue
+
+            patient_ids = [patient_id for patient_id, _, _ in batch]
+            max_k = max(top_k for _, top_k, _ in batch)
+            self.batches += 1
+            self.requests += len(batch)
+            metrics.BATCH_SIZE.observe(len(batch), source="microbatch")
+
+            try:
+                recommender = self.get_recommender()
+                results = await self._loop.run_in_executor(
+                    self._executor, recommender.recommend_batch, patient_ids, max_k
+                )
+            except Exception as e:
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            for (_, top_k, future), result in zip(batch, results):
+                if future.done():
+                    continue
+                if isinstance(result, list):
+                    result = result[:top_k]
+                future.set_result((result, recommender))
+
+    def stats(self) -> dict:
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "max_top_k": self.max_top_k,
+            "batches": self.batches,
+            "requests": self.requests,
+            "avg_batch_size": round(self.requests / self.batches, 2) if self.batches else 0.0,
+        }
@@ -0,0 +1,8 @@
+"""
+Benchmarks
+Synthetic data generators and reproducible micro-benchmarks for the backend
+
+Run from backend/:
+    python -m benchmarks.run --scales 10k,100k,1m --out bench.json
+    python -m benchmarks.compare base.json bench.json
+"""
@@ -0,0 +1,80 @@
+"""
+Benchmark Comparison
+Diff two benchmarks.run reports and flag regressions
+
+Usage (from backend/):
+    python -m benchmarks.compare base.json new.json --threshold 1.2
+
+Exits with status 1 when any metric got slower by more than the threshold.
+"""
+
+import argparse
+import json
+import sys
+
+METRICS = ("seconds", "p50_ms", "p99_ms")
+
+
+def _key(result: dict) -> tuple:
+    return result["scale"], result["benchmark"], json.dumps(result.get("params", {}), sort_keys=True)
+
+
+def compare(base: dict, new: dict, threshold: float = 1.2) -> list:
+    """
+    Per-metric ratios new / base for results present in both reports.
+
+    Returns:
+        List of dicts with scale, benchmark, params, metric, base, new, ratio
+        and regression (ratio above threshold)
+    """
+    base_results = {_key(result): result for result in base["results"]}
+    rows = []
+    for result in new["results"]:
+        previous = base_results.get(_key(result))
+        if previous is None:
+            continue
+        for metric in METRICS:
+            if metric not in result or metric not in previous or not previous[metric]:
+                continue
+            ratio = result[metric] / previous[metric]
+            rows.append({
+                "scale": result["scale"],
+                "benchmark": result["benchmark"],
+                "params": result.get("params", {}),
+                "metric": metric,
+                "base": previous[metric],
+                "new": result[metric],
+                "ratio": round(ratio, 3),
+                "regression": ratio > threshold,
+            })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two benchmark reports")
+    parser.add_argument("base", help="Report from the baseline commit")
+    parser.add_argument("new", help="Report from the commit under test")
+    parser.add_argument("--threshold", type=float, default=1.2, help="Slowdown ratio counted as a regression")
+    parser.add_argument("--json", action="store_true", help="Print the comparison as JSON")
+    args = parser.parse_args()
+
+    with open(args.base) as f:
+        base = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+
+    rows = compare(base, new, args.threshold)
+    if args.json:
+        print(json.dumps(rows, indent=2))
+    else:
+        print(f"base {base['environment'].get('commit')} -> new {new['environment'].get('commit')}")
+        for row in rows:
+            flag = "  REGRESSION" if row["regression"] else ""
+            print(f"{row['scale']:>10} {row['benchmark']:<24} {json.dumps(row['params']):<32} "
+                  f"{row['metric']:<8} {row['base']:>10} -> {row['new']:>10}  x{row['ratio']}{flag}")
+
+    sys.exit(1 if any(row["regression"] for row in rows) else 0)
+
+
+if __name__ == "__main__":
+    main()
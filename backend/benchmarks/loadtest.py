@@ -0,0 +1,315 @@
+"""
+Load Test
+asyncio load generator for the FastAPI service, in-process or over HTTP
+
+Drives a weighted mix of /api/recommend, /api/diagnoses/{id} and
+/api/patients either in closed loop (N clients, each sending its next
+request when the previous one returns) or open loop (Poisson arrivals at a
+fixed rate, independent of response times). Open-loop latency is measured
+from each request's scheduled send time, so a saturated server shows up as
+queueing delay instead of a lower arrival rate.
+
+Usage (from backend/):
+    # in-process, against a synthetic dataset from benchmarks.synthetic
+    python -m benchmarks.loadtest --dataset ../model/benchmark-data/p100000_c50000_d2000_h64_s0 \\
+        --mode closed --concurrency 1,8,32 --duration 20
+
+    # against a running server, e.g. uvicorn main:app --workers 4 --port 8001;
+    # without --patient-file only the 20 IDs of /api/patients are queried
+    python -m benchmarks.loadtest --url http://localhost:8001 --patient-file patient_ids.txt \\
+        --mode open --rate 200,500,1000
+
+Each level reports the result cache hit rate over the level, so runs that
+mostly measure cache hits are visible.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import random
+import time
+
+import httpx
+import numpy as np
+
+ENDPOINTS = ("recommend", "diagnoses", "patients")
+
+
+def parse_mix(text: str) -> dict:
+    """Parse "recommend=8,diagnoses=1,patients=1" into normalized weights."""
+    weights = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in ENDPOINTS:
+            raise ValueError(f"Unknown endpoint in mix: {name}")
+        weights[name] = float(weight or 1)
+    total = sum(weights.values())
+    if total <= 0:
+        raise ValueError("Mix weights must sum to a positive number")
+    return {name: weight / total for name, weight in weights.items()}
+
+
+class LoadGenerator:
+    """
+    Issues requests from a weighted endpoint mix and records
+    (endpoint, send time, latency, status) per request.
+
+    Args:
+        client: httpx.AsyncClient (ASGI transport or a real base URL)
+        mix: Endpoint -> probability, from parse_mix
+        patient_ids: IDs drawn uniformly for recommend/diagnoses
+        top_k: top_k sent to /api/recommend
+        seed: Seed for endpoint and patient choice
+    """
+
+    def __init__(self, client: httpx.AsyncClient, mix: dict, patient_ids: list,
+                 top_k: int = 10, seed: int = 0):
+        self.client = client
+        self.names = list(mix)
+        self.weights = [mix[name] for name in self.names]
+        self.patient_ids = patient_ids
+        self.top_k = top_k
+        self.random = random.Random(seed)
+        self.records = []
+
+    def _next_request(self):
+        name = self.random.choices(self.names, self.weights)[0]
+        patient_id = self.random.choice(self.patient_ids)
+        if name == "recommend":
+            return name, "POST", "/api/recommend", {"json": {"patient_id": patient_id, "top_k": self.top_k}}
+        if name == "diagnoses":
+            return name, "GET", f"/api/diagnoses/{patient_id}", {}
+        return name, "GET", "/api/patients", {}
+
+    async def _send(self, scheduled: float = None):
+        name, method, path, kwargs = self._next_request()
+        start = time.perf_counter()
+        try:
+            response = await self.client.request(method, path, **kwargs)
+            status = response.status_code
+        except httpx.HTTPError:
+            status = 0
+        end = time.perf_counter()
+        # Open loop: count time spent waiting to be sent as latency too
+        sent = start if scheduled is None else scheduled
+        self.records.append((name, sent, end - sent, status))
+
+    async def closed_loop(self, concurrency: int, duration: float):
+        """`concurrency` clients, each sending back to back for `duration` seconds."""
+        deadline = time.perf_counter() + duration
+
+        async def client_loop():
+            while time.perf_counter() < deadline:
+                await self._send()
+
+        await asyncio.gather(*(client_loop() for _ in range(concurrency)))
+
+    async def open_loop(self, rate: float, duration: float, max_in_flight: int = 1000) -> int:
+        """
+        Poisson arrivals at `rate` requests/s for `duration` seconds.
+
+        Returns:
+            Number of arrivals dropped because max_in_flight were outstanding
+        """
+        start = time.perf_counter()
+        next_arrival = start
+        in_flight = set()
+        dropped = 0
+        while True:
+            next_arrival += self.random.expovariate(rate)
+            if next_arrival - start >= duration:
+                break
+            delay = next_arrival - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if len(in_flight) >= max_in_flight:
+                dropped += 1
+                continue
+            task = asyncio.ensure_future(self._send(scheduled=next_arrival))
+            in_flight.add(task)
+            task.add_done_callback(in_flight.discard)
+        if in_flight:
+            await asyncio.gather(*in_flight)
+        return dropped
+
+
+def report(records: list, window_start: float, window_end: float) -> dict:
+    """Latency percentiles and throughput per endpoint for requests sent in the window."""
+    window = [record for record in records if window_start <= record[1] < window_end]
+    elapsed = max(window_end - window_start, 1e-9)
+
+    def stats(rows: list) -> dict:
+        if not rows:
+            return {"requests": 0}
+        latencies = np.array([latency for _, _, latency, _ in rows]) * 1000
+        errors = sum(1 for *_, status in rows if not 200 <= status < 300)
+        return {
+            "requests": len(rows),
+            "errors": errors,
+            "throughput_rps": round(len(rows) / elapsed, 1),
+            "mean_ms": round(float(latencies.mean()), 3),
+            "p50_ms": round(float(np.percentile(latencies, 50)), 3),
+            "p95_ms": round(float(np.percentile(latencies, 95)), 3),
+            "p99_ms": round(float(np.percentile(latencies, 99)), 3),
+            "max_ms": round(float(latencies.max()), 3),
+        }
+
+    by_endpoint = {}
+    for record in window:
+        by_endpoint.setdefault(record[0], []).append(record)
+    return {
+        "overall": stats(window),
+        "endpoints": {name: stats(rows) for name, rows in sorted(by_endpoint.items())},
+    }
+
+
+async def cache_counters(client: httpx.AsyncClient):
+    """(hits, misses) of the result cache, or None if /api/cache/stats is unavailable."""
+    try:
+        response = await client.get("/api/cache/stats")
+        response.raise_for_status()
+        stats = response.json()
+        return stats["hits"], stats["misses"]
+    except (httpx.HTTPError, KeyError, TypeError, ValueError):
+        return None
+
+
+def cache_hit_rate(before, after):
+    """
+    Result cache hit rate between two cache_counters() snapshots (warm-up
+    included). With several workers this covers only the worker that
+    answered /api/cache/stats.
+    """
+    if before is None or after is None:
+        return None
+    hits, lookups = after[0] - before[0], (after[0] + after[1]) - (before[0] + before[1])
+    return round(hits / lookups, 4) if lookups > 0 else None
+
+
+def load_in_process_app(dataset: str = None):
+    """
+    Import main.app, optionally serving a benchmarks.synthetic dataset
+    instead of the model/ directory.
+
+    Returns:
+        Tuple of (app, patient IDs to query)
+    """
+    import config
+    import main
+    from inference import DrugRecommender
+
+    if dataset:
+        config.DIAGNOSES_CSV = os.path.join(dataset, "mimic_diagnoses_mapped.csv")
+        config.DIAGNOSES_PATH = os.path.join(dataset, "diagnoses")
+        embeddings_path = os.path.join(dataset, "embeddings.pt")
+        mappings_path = os.path.join(dataset, "mappings.pt")
+        with contextlib.redirect_stdout(io.StringIO()):
+            recommender = DrugRecommender(
+                embeddings_path,
+                mappings_path,
+                cache_size=config.CACHE_SIZE,
+                cache_ttl=config.CACHE_TTL,
+            )
+        main._model_slot.set(recommender, embeddings_path, mappings_path)
+    with contextlib.redirect_stdout(io.StringIO()):
+        recommender = main.get_recommender()
+        main.get_diagnosis_data()
+    return main.app, recommender.get_sample_patients(len(recommender.patient_ids))
+
+
+async def run(args) -> dict:
+    if args.url:
+        app, patient_ids = None, None
+        client = httpx.AsyncClient(base_url=args.url, timeout=args.timeout,
+                                   limits=httpx.Limits(max_connections=None))
+    else:
+        app, patient_ids = load_in_process_app(args.dataset)
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app),
+                                   base_url="http://loadtest", timeout=args.timeout)
+
+    if args.patient_file:
+        with open(args.patient_file) as f:
+            patient_ids = [line.strip() for line in f if line.strip()]
+
+    async with client:
+        if patient_ids is None:
+            # /api/patients only lists a sample; pass --patient-file for more
+            response = await client.get("/api/patients")
+            response.raise_for_status()
+            patient_ids = response.json()["patients"]
+            print(f"Warning: drawing from the {len(patient_ids)} patient IDs /api/patients lists, so "
+                  "/api/recommend is mostly served from the result cache. Pass --patient-file, "
+                  "or start the server with DRUG_REC_CACHE_SIZE=0")
+        rng = random.Random(args.seed)
+        patient_ids = rng.sample(patient_ids, min(args.patients, len(patient_ids)))
+
+        levels = args.concurrency if args.mode == "closed" else args.rate
+        runs = []
+        for level in levels:
+            generator = LoadGenerator(client, parse_mix(args.mix), patient_ids, args.top_k, args.seed)
+            cache_before = await cache_counters(client)
+            start = time.perf_counter()
+            dropped = 0
+            if args.mode == "closed":
+                await generator.closed_loop(int(level), args.warmup + args.duration)
+            else:
+                dropped = await generator.open_loop(level, args.warmup + args.duration, args.max_in_flight)
+
+            result = report(generator.records, start + args.warmup, start + args.warmup + args.duration)
+            result.update({"mode": args.mode, "concurrency" if args.mode == "closed" else "rate": level})
+            if args.mode == "open":
+                result["dropped"] = dropped
+            result["cache_hit_rate"] = cache_hit_rate(cache_before, await cache_counters(client))
+            runs.append(result)
+
+            overall = result["overall"]
+            print(f"{args.mode} {level:>8}: {overall.get('throughput_rps', 0):>9} req/s  "
+                  f"p50={overall.get('p50_ms')}ms p95={overall.get('p95_ms')}ms "
+                  f"p99={overall.get('p99_ms')}ms errors={overall.get('errors', 0)} "
+                  f"cache_hit_rate={result['cache_hit_rate']}")
+
+    return {
+        "target": args.url or "in-process",
+        "mix": parse_mix(args.mix),
+        "duration_s": args.duration,
+        "warmup_s": args.warmup,
+        "runs": runs,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the drug recommendation API")
+    parser.add_argument("--url", help="Base URL of a running server (default: in-process app)")
+    parser.add_argument("--dataset", help="In-process only: synthetic dataset directory to serve")
+    parser.add_argument("--mix", default="recommend=8,diagnoses=1,patients=1",
+                        help="Endpoint weights: recommend, diagnoses, patients")
+    parser.add_argument("--mode", choices=("closed", "open"), default="closed")
+    parser.add_argument("--concurrency", default="1,8,32", help="Closed loop: comma-separated client counts")
+    parser.add_argument("--rate", default="100,500", help="Open loop: comma-separated requests/s")
+    parser.add_argument("--max-in-flight", type=int, default=1000, help="Open loop: drop arrivals beyond this")
+    parser.add_argument("--duration", type=float, default=10.0, help="Measured seconds per level")
+    parser.add_argument("--warmup", type=float, default=2.0, help="Unmeasured seconds before each level")
+    parser.add_argument("--patient-file", help="File with one patient ID per line to draw from")
+    parser.add_argument("--patients", type=int, default=10000, help="Distinct patient IDs to draw from")
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="Write the JSON report here")
+    args = parser.parse_args()
+
+    args.concurrency = [int(c) for c in args.concurrency.split(",")]
+    args.rate = [float(r) for r in args.rate.split(",")]
+
+    result = asyncio.run(run(args))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(result, f, indent=2, sort_keys=True)
+        print(f"Wrote report to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
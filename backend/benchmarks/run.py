@@ -0,0 +1,241 @@
+"""
+Micro-benchmarks
+Load time, recommend, batched recommend, diagnosis lookup and serialization
+
+Each scale gets a seeded synthetic dataset (cached under --data-dir), and the
+same seeded patient sample is queried on every run, so results from two
+commits are comparable. Output is one JSON document (see benchmarks.compare).
+
+Usage (from backend/):
+    python -m benchmarks.run --scales 10k,100k,1m --out bench.json
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import time
+
+import numpy as np
+import torch
+from fastapi.responses import JSONResponse
+
+from artifacts import export_artifact
+from diagnoses import DiagnosisIndex
+from inference import DrugRecommender
+
+from benchmarks.synthetic import parse_count, patient_ids, write_dataset
+
+BENCHMARKS = [
+    "load_pt", "load_artifact", "recommend", "recommend_batch", "serialize",
+    "diagnoses_load_csv", "diagnoses_open_store", "diagnoses_lookup", "diagnoses_lookup_many",
+]
+
+
+def summarize(samples: list, items_per_sample: int = 1) -> dict:
+    """Latency percentiles (ms) and throughput of per-call timings (s)."""
+    values = np.asarray(samples, dtype=np.float64)
+    total = float(values.sum())
+    return {
+        "n": len(values),
+        "mean_ms": round(float(values.mean()) * 1000, 4),
+        "p50_ms": round(float(np.percentile(values, 50)) * 1000, 4),
+        "p95_ms": round(float(np.percentile(values, 95)) * 1000, 4),
+        "p99_ms": round(float(np.percentile(values, 99)) * 1000, 4),
+        "min_ms": round(float(values.min()) * 1000, 4),
+        "max_ms": round(float(values.max()) * 1000, 4),
+        "items_per_s": round(len(values) * items_per_sample / total, 1) if total > 0 else None,
+    }
+
+
+def measure(fn, args_list: list, warmup: int = 5) -> list:
+    """Time fn(*args) for each args tuple, after a few untimed warm-up calls."""
+    for args in args_list[:warmup]:
+        fn(*args)
+    samples = []
+    for args in args_list:
+        start = time.perf_counter()
+        fn(*args)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def batched(items: list, batch_size: int, min_batches: int = 20) -> list:
+    """Consecutive batches of items, wrapping around to give at least min_batches."""
+    num_batches = max(len(items) // batch_size, min_batches)
+    return np.resize(np.asarray(items), (num_batches, batch_size)).tolist()
+
+
+def timed_once(fn):
+    """(result, seconds) of a single call with its prints suppressed."""
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = fn()
+    return result, time.perf_counter() - start
+
+
+def environment(args) -> dict:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "torch": torch.__version__,
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "torch_threads": torch.get_num_threads(),
+        "config": {
+            "concepts": args.concepts, "drugs": args.drugs, "dim": args.dim,
+            "queries": args.queries, "batch_sizes": args.batch_sizes, "top_k": args.top_k,
+            "seed": args.seed,
+        },
+    }
+
+
+def dataset_dir(args, num_patients: int) -> str:
+    name = f"p{num_patients}_c{args.concepts}_d{args.drugs}_h{args.dim}_s{args.seed}"
+    return os.path.join(args.data_dir, name)
+
+
+def run_scale(args, num_patients: int, selected: set) -> list:
+    """All selected benchmarks at one patient count."""
+    data_dir = dataset_dir(args, num_patients)
+    paths = {
+        "embeddings": os.path.join(data_dir, "embeddings.pt"),
+        "mappings": os.path.join(data_dir, "mappings.pt"),
+        "diagnoses": os.path.join(data_dir, "mimic_diagnoses_mapped.csv"),
+    }
+    if not all(os.path.exists(path) for path in paths.values()):
+        print(f"Generating {num_patients} patients in {data_dir}")
+        write_dataset(data_dir, num_patients, args.concepts, args.drugs, args.dim, seed=args.seed)
+
+    results = []
+
+    def record(benchmark: str, stats: dict, **params):
+        results.append({"scale": num_patients, "benchmark": benchmark, "params": params, **stats})
+        print(f"  {benchmark:<24} {json.dumps(params):<22} "
+              + " ".join(f"{key}={value}" for key, value in stats.items() if key != "n"))
+
+    rng = np.random.default_rng(args.seed)
+    sample = patient_ids(num_patients)[rng.integers(0, num_patients, args.queries)].tolist()
+
+    recommender, seconds = timed_once(lambda: DrugRecommender(paths["embeddings"], paths["mappings"]))
+    if "load_pt" in selected:
+        record("load_pt", {"seconds": round(seconds, 4)})
+
+    if "load_artifact" in selected:
+        artifact_dir = os.path.join(data_dir, "artifact")
+        if not os.path.exists(artifact_dir):
+            timed_once(lambda: export_artifact(paths["embeddings"], paths["mappings"], artifact_dir))
+        artifact_recommender, seconds = timed_once(lambda: DrugRecommender(artifact_dir))
+        record("load_artifact", {"seconds": round(seconds, 4)})
+        del artifact_recommender
+
+    if "recommend" in selected:
+        samples = measure(recommender.recommend, [(pid, args.top_k) for pid in sample])
+        record("recommend", summarize(samples), top_k=args.top_k)
+
+    if "recommend_batch" in selected:
+        for batch_size in args.batch_sizes:
+            batch_args = [(batch, args.top_k) for batch in batched(sample, batch_size)]
+            samples = measure(recommender.recommend_batch, batch_args, warmup=2)
+            record("recommend_batch", summarize(samples, batch_size),
+                   batch_size=batch_size, top_k=args.top_k)
+
+    if "serialize" in selected:
+        single = recommender.recommend(sample[0], args.top_k)
+        samples = measure(lambda payload: JSONResponse(payload), [(
+            {"patient_id": sample[0], "recommendations": single, "cold_start": False, "live": False},
+        )] * args.queries)
+        record("serialize", summarize(samples), kind="recommend")
+
+        batch_ids = batched(sample, max(args.batch_sizes))[0]
+        payload = {"results": [
+            {"patient_id": pid, "recommendations": recs, "cold_start": False, "error": None}
+            for pid, recs in zip(batch_ids, recommender.recommend_batch(batch_ids, args.top_k))
+        ]}
+        samples = measure(lambda body: JSONResponse(body), [(payload,)] * max(args.queries // 10, 10))
+        record("serialize", summarize(samples, len(batch_ids)), kind="batch", batch_size=len(batch_ids))
+    del recommender
+
+    diagnosis_names = {"diagnoses_load_csv", "diagnoses_open_store", "diagnoses_lookup", "diagnoses_lookup_many"}
+    if selected & diagnosis_names:
+        index, seconds = timed_once(lambda: DiagnosisIndex.from_csv(paths["diagnoses"]))
+        if "diagnoses_load_csv" in selected:
+            record("diagnoses_load_csv", {"seconds": round(seconds, 4), "rows": len(index)})
+
+        store_dir = os.path.join(data_dir, "diagnoses")
+        if not DiagnosisIndex.is_store(store_dir):
+            index.save(store_dir)
+        index, seconds = timed_once(lambda: DiagnosisIndex.open(store_dir))
+        if "diagnoses_open_store" in selected:
+            record("diagnoses_open_store", {"seconds": round(seconds, 4)})
+
+        subject_ids = [int(pid) for pid in sample]
+        if "diagnoses_lookup" in selected:
+            samples = measure(index.lookup, [(subject_id, 10) for subject_id in subject_ids])
+            record("diagnoses_lookup", summarize(samples), top_k=10)
+        if "diagnoses_lookup_many" in selected:
+            batch_size = max(args.batch_sizes)
+            batch_args = [(batch, 10) for batch in batched(subject_ids, batch_size)]
+            samples = measure(index.lookup_many, batch_args, warmup=2)
+            record("diagnoses_lookup_many", summarize(samples, batch_size),
+                   batch_size=batch_size, top_k=10)
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backend micro-benchmarks on synthetic data")
+    parser.add_argument("--scales", default="10k,100k,1m",
+                        help="Comma-separated patient counts (10m needs ~8 GB RAM at dim 64)")
+    parser.add_argument("--concepts", default="50k")
+    parser.add_argument("--drugs", default="2000")
+    parser.add_argument("--dim", type=int, default=64)
+    parser.add_argument("--queries", type=int, default=1000, help="Sampled patients per benchmark")
+    parser.add_argument("--batch-sizes", default="16,64,256")
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--threads", type=int, default=1, help="torch intra-op threads")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--only", help=f"Comma-separated subset of: {', '.join(BENCHMARKS)}")
+    parser.add_argument("--data-dir", default=os.path.join("..", "model", "benchmark-data"),
+                        help="Where synthetic datasets are cached")
+    parser.add_argument("--out", help="Write results JSON here (default: stdout only)")
+    args = parser.parse_args()
+
+    args.concepts = parse_count(args.concepts)
+    args.drugs = parse_count(args.drugs)
+    args.batch_sizes = [int(size) for size in args.batch_sizes.split(",")]
+    torch.set_num_threads(args.threads)
+    torch.manual_seed(args.seed)
+
+    selected = set(args.only.split(",")) if args.only else set(BENCHMARKS)
+    unknown = selected - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"Unknown benchmarks: {', '.join(sorted(unknown))}")
+
+    report = {"environment": environment(args), "results": []}
+    for scale in args.scales.split(","):
+        num_patients = parse_count(scale)
+        print(f"Scale: {num_patients} patients")
+        report["results"].extend(run_scale(args, num_patients, selected))
+
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+        print(f"Wrote {len(report['results'])} results to {args.out}")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
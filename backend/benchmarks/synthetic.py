@@ -0,0 +1,136 @@
+"""
+Synthetic Data
+Seeded generators for embeddings.pt / mappings.pt and the diagnoses table
+
+The files have the same layout as the training notebook's exports, so
+DrugRecommender, export_artifact and DiagnosisIndex load them unchanged.
+
+Usage:
+    python -m benchmarks.synthetic --patients 100000 --out /tmp/synthetic
+"""
+
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+import torch
+
+FIRST_SUBJECT_ID = 10000000
+
+
+def parse_count(value: str) -> int:
+    """Parse counts like "10k", "2.5m" or "10000"."""
+    value = str(value).strip().lower()
+    for suffix, factor in (("k", 10**3), ("m", 10**6)):
+        if value.endswith(suffix):
+            return int(float(value[:-1]) * factor)
+    return int(value)
+
+
+def patient_ids(num_patients: int) -> np.ndarray:
+    """MIMIC-style subject IDs as strings ('10000000', '10000001', ...)."""
+    return (FIRST_SUBJECT_ID + np.arange(num_patients)).astype(str)
+
+
+def concept_cuis(num_concepts: int) -> np.ndarray:
+    """UMLS-style CUIs, spread over the C0000000-C4999999 range."""
+    stride = max(5000000 // max(num_concepts, 1), 1)
+    return np.char.add("C", np.char.zfill((np.arange(num_concepts) * stride).astype(str), 7))
+
+
+def generate_embeddings(num_patients: int, num_concepts: int = 50000, num_drugs: int = 2000,
+                        dim: int = 64, seed: int = 0):
+    """
+    Random embeddings and ID maps.
+
+    Returns:
+        Tuple of (embeddings dict, mappings dict) as saved by the notebook
+    """
+    generator = torch.Generator().manual_seed(seed)
+    embeddings = {
+        "patient_embeddings": torch.randn(num_patients, dim, generator=generator),
+        "concept_embeddings": torch.randn(num_concepts, dim, generator=generator),
+        "drug_concept_indices": torch.randperm(num_concepts, generator=generator)[:num_drugs].sort().values,
+    }
+    mappings = {
+        "pid_to_idx": {pid: idx for idx, pid in enumerate(patient_ids(num_patients).tolist())},
+        "cui_to_idx": {cui: idx for idx, cui in enumerate(concept_cuis(num_concepts).tolist())},
+    }
+    return embeddings, mappings
+
+
+def generate_diagnoses(num_patients: int, num_concepts: int = 50000, mean_per_patient: float = 12.0,
+                       num_icd_codes: int = 20000, seed: int = 0) -> pd.DataFrame:
+    """
+    Diagnoses table in the mimic_diagnoses_mapped.csv layout.
+
+    Each patient gets 1 + Poisson(mean_per_patient - 1) rows; every ICD code
+    maps to one fixed CUI, as in the real ICD -> UMLS mapping.
+    """
+    rng = np.random.default_rng(seed)
+    counts = rng.poisson(max(mean_per_patient - 1.0, 0.0), num_patients) + 1
+    total = int(counts.sum())
+
+    code_to_concept = rng.integers(0, num_concepts, num_icd_codes)
+    codes = rng.integers(0, num_icd_codes, total)
+    return pd.DataFrame({
+        "subject_id": np.repeat(FIRST_SUBJECT_ID + np.arange(num_patients), counts),
+        "hadm_id": rng.integers(20000000, 30000000, total),
+        "icd_code": np.char.add("D", codes.astype(str)),
+        "icd_version": np.where(codes % 2 == 0, 9, 10).astype(np.int16),
+        "cui": concept_cuis(num_concepts)[code_to_concept[codes]],
+    })
+
+
+def write_dataset(out_dir: str, num_patients: int, num_concepts: int = 50000, num_drugs: int = 2000,
+                  dim: int = 64, mean_diagnoses: float = 12.0, seed: int = 0) -> dict:
+    """
+    Write embeddings.pt, mappings.pt and mimic_diagnoses_mapped.csv.
+
+    Returns:
+        Dict of file paths
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    paths = {
+        "embeddings": os.path.join(out_dir, "embeddings.pt"),
+        "mappings": os.path.join(out_dir, "mappings.pt"),
+        "diagnoses": os.path.join(out_dir, "mimic_diagnoses_mapped.csv"),
+    }
+    embeddings, mappings = generate_embeddings(num_patients, num_concepts, num_drugs, dim, seed)
+    torch.save(embeddings, paths["embeddings"])
+    torch.save(mappings, paths["mappings"])
+    del embeddings, mappings
+
+    generate_diagnoses(num_patients, num_concepts, mean_diagnoses, seed=seed).to_csv(
+        paths["diagnoses"], index=False
+    )
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic embeddings + diagnoses dataset")
+    parser.add_argument("--patients", default="10k", help="Number of patients (e.g. 10k, 1m)")
+    parser.add_argument("--concepts", default="50k")
+    parser.add_argument("--drugs", default="2000")
+    parser.add_argument("--dim", type=int, default=64)
+    parser.add_argument("--diagnoses-per-patient", type=float, default=12.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", required=True, help="Output directory")
+    args = parser.parse_args()
+
+    paths = write_dataset(
+        args.out,
+        parse_count(args.patients),
+        parse_count(args.concepts),
+        parse_count(args.drugs),
+        args.dim,
+        args.diagnoses_per_patient,
+        args.seed,
+    )
+    for name, path in paths.items():
+        print(f"{name}: {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,254 @@
+"""
+Bulk Scoring
+Top-k drug recommendations for every patient, streamed to disk in resumable chunks
+
+The patient table is cut into chunks of --chunk-size rows. Each chunk is
+scored in blocks of --block-size patients (one (block, drugs) matmul and
+top-k per block, through the same scoring path as the API, so
+DRUG_REC_SEARCH_MODE / DRUG_REC_QUANTIZE apply) and written as one part
+file. Parts are written to a temp name and renamed when complete, so a
+rerun with the same arguments skips every finished chunk and resumes at
+the first missing one. Memory is bounded by the chunks in flight.
+
+Output directory layout:
+
+    out/
+        _manifest.json            model version, top_k, chunking
+        part-00000.jsonl          {"patient_id", "recommendations": [...]} per line
+        ...                       (part-00000.parquet with --format parquet)
+        _SUCCESS                  written once every chunk is done
+
+Usage (from backend/):
+    python bulk_score.py --out ../model/bulk --top-k 20 --workers 4
+    python bulk_score.py --model ../model/artifact --pool process --workers 4 --out ../model/bulk
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+
+import numpy as np
+import torch
+
+from artifacts import is_artifact_dir
+from inference import default_model_paths, load_recommender
+
+MANIFEST_NAME = "_manifest.json"
+SUCCESS_NAME = "_SUCCESS"
+FORMATS = ("jsonl", "parquet")
+
+# Recommender of a process-pool worker (set by _init_process)
+_worker_recommender = None
+
+
+def part_path(out_dir: str, chunk: int, fmt: str) -> str:
+    return os.path.join(out_dir, f"part-{chunk:05d}.{fmt}")
+
+
+@torch.no_grad()
+def score_rows(recommender, start: int, end: int, top_k: int, block_size: int):
+    """
+    Top-k for patient rows [start, end) that have an ID.
+
+    Returns:
+        Tuple of (patient IDs, (n, k) local drug indices with -1 for empty
+        ANN slots, (n, k) scores rounded like the API)
+    """
+    rows = np.arange(start, end, dtype=np.int64)
+    ids = recommender.patient_ids.ids_of(rows)
+    keep = [i for i, id_ in enumerate(ids) if id_]
+    rows, ids = rows[keep], [ids[i] for i in keep]
+
+    idx_blocks, score_blocks = [], []
+    for block_start in range(0, len(rows), block_size):
+        block = torch.from_numpy(rows[block_start:block_start + block_size])
+        scores, idx = recommender._score_topk(recommender._patient_vectors(block), top_k)
+        idx_blocks.append(idx.numpy())
+        score_blocks.append(np.round(scores.numpy().astype(np.float64), 4))
+    if not idx_blocks:
+        return ids, np.empty((0, top_k), dtype=np.int64), np.empty((0, top_k))
+    return ids, np.concatenate(idx_blocks), np.concatenate(score_blocks)
+
+
+def write_jsonl(path: str, recommender, ids: list, idx: np.ndarray, scores: np.ndarray):
+    """
+    One {"patient_id", "recommendations"} object per line, as /api/recommend
+    returns them. The JSON around each drug is rendered once per drug, not
+    once per recommendation.
+    """
+    prefix = [f'{{"cuid":{json.dumps(cuid)},"score":' for cuid in recommender.drug_cuis.tolist()]
+    suffix = [f',"concept_idx":{concept}}}' for concept in recommender.drug_concept_idx.tolist()]
+    with open(path, "w") as f:
+        for patient_id, row_idx, row_scores in zip(ids, idx.tolist(), scores.tolist()):
+            recs = ",".join(prefix[d] + repr(score) + suffix[d] for d, score in zip(row_idx, row_scores) if d >= 0)
+            f.write(f'{{"patient_id":{json.dumps(patient_id)},"recommendations":[{recs}]}}\n')
+
+
+def write_parquet(path: str, recommender, ids: list, idx: np.ndarray, scores: np.ndarray):
+    """One row per patient with list columns cuid / score / concept_idx."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    valid = idx >= 0
+    offsets = np.concatenate([[0], np.cumsum(valid.sum(axis=1))]).astype(np.int32)
+    flat_idx = idx[valid]
+
+    def column(values, value_type):
+        return pa.ListArray.from_arrays(pa.array(offsets), pa.array(values, type=value_type))
+
+    table = pa.table({
+        "patient_id": pa.array(ids, type=pa.string()),
+        "cuid": column(recommender.drug_cuis[flat_idx].tolist(), pa.string()),
+        "score": column(scores[valid].astype(np.float32), pa.float32()),
+        "concept_idx": column(recommender.drug_concept_idx[flat_idx], pa.int64()),
+    })
+    pq.write_table(table, path)
+
+
+WRITERS = {"jsonl": write_jsonl, "parquet": write_parquet}
+
+
+def run_chunk(recommender, out_dir: str, chunk: int, start: int, end: int,
+              top_k: int, block_size: int, fmt: str) -> dict:
+    """Score one chunk and atomically write its part file."""
+    chunk_start = time.perf_counter()
+    ids, idx, scores = score_rows(recommender, start, end, top_k, block_size)
+    scored = time.perf_counter()
+
+    path = part_path(out_dir, chunk, fmt)
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    WRITERS[fmt](tmp_path, recommender, ids, idx, scores)
+    os.replace(tmp_path, path)
+    return {
+        "chunk": chunk,
+        "patients": len(ids),
+        "score_seconds": scored - chunk_start,
+        "write_seconds": time.perf_counter() - scored,
+    }
+
+
+def _init_process(model_path: str, torch_threads: int):
+    global _worker_recommender
+    torch.set_num_threads(torch_threads)
+    _worker_recommender = load_recommender(model_path)
+
+
+def _run_chunk_in_process(*args) -> dict:
+    return run_chunk(_worker_recommender, *args)
+
+
+def prepare_output(out_dir: str, manifest: dict, overwrite: bool = False):
+    """Create the output directory, or check that a previous run used the same settings."""
+    os.makedirs(out_dir, exist_ok=True)
+    path = os.path.join(out_dir, MANIFEST_NAME)
+    if os.path.exists(path) and not overwrite:
+        with open(path) as f:
+            previous = json.load(f)
+        changed = [key for key in manifest if previous.get(key) != manifest[key]]
+        if changed:
+            raise ValueError(
+                f"{out_dir} holds a run with different {', '.join(changed)}; "
+                "pass --overwrite or choose another --out"
+            )
+        # Parts an interrupted run was still writing
+        for name in os.listdir(out_dir):
+            if ".tmp-" in name:
+                os.remove(os.path.join(out_dir, name))
+        return
+    for name in os.listdir(out_dir):
+        if name.startswith("part-") or name == SUCCESS_NAME:
+            os.remove(os.path.join(out_dir, name))
+    with open(path, "w") as f:
+        json.dump(manifest, f, indent=2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score every patient and stream top-k drugs to disk")
+    parser.add_argument("--model", help="Artifact directory or embeddings.pt (default: as the API)")
+    parser.add_argument("--out", required=True, help="Output directory")
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--chunk-size", type=int, default=100000, help="Patients per part file / resume unit")
+    parser.add_argument("--block-size", type=int, default=4096, help="Patients per matmul + top-k block")
+    parser.add_argument("--format", choices=FORMATS, default="jsonl", help="parquet needs pyarrow")
+    parser.add_argument("--pool", choices=("thread", "process"), default="thread",
+                        help="process workers each load the model (share pages only for artifacts)")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--torch-threads", type=int, default=0,
+                        help="Intra-op threads per worker (default: cores / workers)")
+    parser.add_argument("--limit", type=int, default=0, help="Only score the first N patient rows")
+    parser.add_argument("--overwrite", action="store_true", help="Discard parts from an earlier run")
+    args = parser.parse_args()
+
+    if args.format == "parquet" and importlib.util.find_spec("pyarrow") is None:
+        parser.error("--format parquet needs pyarrow (pip install pyarrow)")
+
+    threads = args.torch_threads or max((os.cpu_count() or 1) // args.workers, 1)
+    model_path = args.model or default_model_paths()[0]
+    recommender = load_recommender(model_path)
+    num_rows = min(args.limit, recommender.num_patients) if args.limit else recommender.num_patients
+    chunks = [
+        (chunk, start, min(start + args.chunk_size, num_rows))
+        for chunk, start in enumerate(range(0, num_rows, args.chunk_size))
+    ]
+    manifest = {
+        "version": recommender.version,
+        "top_k": args.top_k,
+        "chunk_size": args.chunk_size,
+        "rows": num_rows,
+        "format": args.format,
+    }
+    try:
+        prepare_output(args.out, manifest, args.overwrite)
+    except ValueError as e:
+        parser.error(str(e))
+
+    pending = [c for c in chunks if not os.path.exists(part_path(args.out, c[0], args.format))]
+    if len(pending) < len(chunks):
+        print(f"Resuming: {len(chunks) - len(pending)} of {len(chunks)} chunks already written")
+
+    start = time.perf_counter()
+    job_args = [(args.out, chunk, lo, hi, args.top_k, args.block_size, args.format) for chunk, lo, hi in pending]
+    if args.pool == "process":
+        if args.workers > 1 and not is_artifact_dir(model_path):
+            print("Note: each process loads its own copy of a .pt model; export an artifact to share pages")
+        del recommender
+        executor = ProcessPoolExecutor(args.workers, initializer=_init_process, initargs=(model_path, threads))
+        task = _run_chunk_in_process
+    else:
+        torch.set_num_threads(threads)
+        executor = ThreadPoolExecutor(args.workers, thread_name_prefix="bulk-score")
+        task = partial(run_chunk, recommender)
+
+    patients = 0
+    with executor:
+        # Keep at most 2 chunks per worker in flight to bound memory
+        in_flight = []
+        jobs = iter(job_args)
+        for job in jobs:
+            in_flight.append(executor.submit(task, *job))
+            if len(in_flight) < 2 * args.workers:
+                continue
+            patients += _report(in_flight.pop(0).result(), patients, start, len(chunks))
+        for future in in_flight:
+            patients += _report(future.result(), patients, start, len(chunks))
+
+    with open(os.path.join(args.out, SUCCESS_NAME), "w") as f:
+        json.dump({**manifest, "chunks": len(chunks), "seconds": round(time.perf_counter() - start, 2)}, f)
+    print(f"Done: {len(chunks)} chunks in {args.out} ({time.perf_counter() - start:.1f}s this run)")
+
+
+def _report(result: dict, done: int, start: float, total_chunks: int) -> int:
+    done += result["patients"]
+    elapsed = time.perf_counter() - start
+    print(f"chunk {result['chunk'] + 1}/{total_chunks}: {result['patients']} patients "
+          f"(score {result['score_seconds']:.2f}s, write {result['write_seconds']:.2f}s) | "
+          f"{done / elapsed:,.0f} patients/s this run")
+    return result["patients"]
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,249 @@
+"""
+UMLS Concept Graph
+Integer-indexed CSR/CSC adjacency over the UMLS edge list with k-hop queries
+
+Nodes are CUIs mapped to rows of a sorted CUI array; relations are
+dictionary-encoded. Out-edges (CSR) and in-edges (CSC) are stored as
+indptr / neighbour / edge-id arrays, so every query only touches the rows of
+the nodes it expands and costs time proportional to its output.
+"""
+
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+DIRECTIONS = ("out", "in", "both")
+
+
+def _csr(keys: np.ndarray, values: np.ndarray, num_nodes: int):
+    """(indptr, neighbours, edge ids) grouping edges by key node."""
+    order = np.argsort(keys, kind="stable")
+    counts = np.bincount(keys, minlength=num_nodes)
+    indptr = np.zeros(num_nodes + 1, dtype=np.int64)
+    np.cumsum(counts, out=indptr[1:])
+    return indptr, values[order], order.astype(np.int64)
+
+
+def _gather_ranges(indptr: np.ndarray, nodes: np.ndarray) -> np.ndarray:
+    """Positions of all entries in indptr rows `nodes`, back to back."""
+    starts = indptr[nodes]
+    counts = indptr[nodes + 1] - starts
+    total = int(counts.sum())
+    return np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(total)
+
+
+class ConceptGraph:
+    """
+    Directed multigraph of UMLS concepts.
+
+    Args:
+        cuis: Sorted unique CUI array; node id = position in this array
+        src, dst: Edge endpoints as node ids
+        relation: Edge relation codes into relation_names
+        raw_relation, source_vocab: Per-edge codes into their dictionaries
+    """
+
+    def __init__(self, cuis, src, dst, relation, relation_names,
+                 raw_relation, raw_relation_names, source_vocab, source_vocab_names):
+        self.cuis = cuis
+        self.src = src
+        self.dst = dst
+        self.relation = relation
+        self.relation_names = relation_names
+        self.raw_relation = raw_relation
+        self.raw_relation_names = raw_relation_names
+        self.source_vocab = source_vocab
+        self.source_vocab_names = source_vocab_names
+
+        num_nodes = len(cuis)
+        self.out_indptr, self.out_nbr, self.out_eid = _csr(src, dst, num_nodes)
+        self.in_indptr, self.in_nbr, self.in_eid = _csr(dst, src, num_nodes)
+
+        # Reusable membership mask; only touched entries are reset after a query
+        self._mask = np.zeros(num_nodes, dtype=bool)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_csv(cls, edges_csv: str, node_cuis=None):
+        """Load edges_50k.csv (source, target, relation, raw_relation, source_vocab)."""
+        edges = pd.read_csv(edges_csv, dtype=str, keep_default_na=False)
+        for column in ("raw_relation", "source_vocab"):
+            if column not in edges.columns:
+                edges[column] = ""
+
+        endpoints = [edges["source"].to_numpy(dtype=str), edges["target"].to_numpy(dtype=str)]
+        if node_cuis is not None:
+            endpoints.append(np.asarray(node_cuis, dtype=str))
+        cuis = np.unique(np.concatenate(endpoints))
+
+        relation, relation_names = pd.factorize(edges["relation"])
+        raw_relation, raw_relation_names = pd.factorize(edges["raw_relation"])
+        source_vocab, source_vocab_names = pd.factorize(edges["source_vocab"])
+
+        return cls(
+            cuis=cuis,
+            src=np.searchsorted(cuis, endpoints[0]).astype(np.int64),
+            dst=np.searchsorted(cuis, endpoints[1]).astype(np.int64),
+            relation=relation.astype(np.int32),
+            relation_names=np.asarray(relation_names, dtype=object),
+            raw_relation=raw_relation.astype(np.int32),
+            raw_relation_names=np.asarray(raw_relation_names, dtype=object),
+            source_vocab=source_vocab.astype(np.int32),
+            source_vocab_names=np.asarray(source_vocab_names, dtype=object),
+        )
+
+    @classmethod
+    def empty(cls):
+        no_codes = np.empty(0, dtype=np.int32)
+        no_names = np.empty(0, dtype=object)
+        return cls(
+            cuis=np.empty(0, dtype=str),
+            src=np.empty(0, dtype=np.int64),
+            dst=np.empty(0, dtype=np.int64),
+            relation=no_codes, relation_names=no_names,
+            raw_relation=no_codes, raw_relation_names=no_names,
+            source_vocab=no_codes, source_vocab_names=no_names,
+        )
+
+    @property
+    def num_nodes(self) -> int:
+        return len(self.cuis)
+
+    @property
+    def num_edges(self) -> int:
+        return len(self.src)
+
+    def node_ids(self, cuis: list) -> np.ndarray:
+        """Node ids of the known CUIs (unknown CUIs are dropped)."""
+        if not self.num_nodes or not len(cuis):
+            return np.empty(0, dtype=np.int64)
+        queries = np.asarray(cuis, dtype=str)
+        pos = np.minimum(np.searchsorted(self.cuis, queries), self.num_nodes - 1)
+        return np.unique(pos[self.cuis[pos] == queries])
+
+    def relation_codes(self, relations: list):
+        """Relation codes for names, or None for "all relations"."""
+        if not relations:
+            return None
+        return np.flatnonzero(np.isin(self.relation_names, list(relations)))
+
+    def _incident(self, nodes: np.ndarray, direction: str, rel_codes):
+        """(edge ids, neighbour ids) of all edges incident to nodes."""
+        eids, nbrs = [], []
+        if direction in ("out", "both"):
+            pos = _gather_ranges(self.out_indptr, nodes)
+            eids.append(self.out_eid[pos])
+            nbrs.append(self.out_nbr[pos])
+        if direction in ("in", "both"):
+            pos = _gather_ranges(self.in_indptr, nodes)
+            eids.append(self.in_eid[pos])
+            nbrs.append(self.in_nbr[pos])
+        eids, nbrs = np.concatenate(eids), np.concatenate(nbrs)
+        if rel_codes is not None:
+            keep = np.isin(self.relation[eids], rel_codes)
+            eids, nbrs = eids[keep], nbrs[keep]
+        return eids, nbrs
+
+    def k_hop(self, seeds: np.ndarray, hops: int = 1, relations: list = None,
+              direction: str = "both", max_nodes: int = None) -> np.ndarray:
+        """
+        Nodes within `hops` edges of the seeds, in BFS order (seeds first).
+
+        Args:
+            seeds: Seed node ids
+            hops: Number of hops
+            relations: Only traverse these relation names (None = all)
+            direction: "out", "in" or "both"
+            max_nodes: Stop once this many nodes are reached
+        """
+        if direction not in DIRECTIONS:
+            raise ValueError(f"Unknown direction: {direction}")
+        rel_codes = self.relation_codes(relations)
+        seeds = np.unique(np.asarray(seeds, dtype=np.int64))
+        if max_nodes is not None:
+            seeds = seeds[:max_nodes]
+
+        with self._lock:
+            reached = [seeds]
+            self._mask[seeds] = True
+            frontier = seeds
+            total = len(seeds)
+            try:
+                for _ in range(hops):
+                    if not len(frontier) or (max_nodes is not None and total >= max_nodes):
+                        break
+                    _, nbrs = self._incident(frontier, direction, rel_codes)
+                    nbrs = np.unique(nbrs)
+                    frontier = nbrs[~self._mask[nbrs]]
+                    if max_nodes is not None:
+                        frontier = frontier[:max_nodes - total]
+                    self._mask[frontier] = True
+                    reached.append(frontier)
+                    total += len(frontier)
+            finally:
+                nodes = np.concatenate(reached)
+                self._mask[nodes] = False
+        return nodes
+
+    def induced_edges(self, nodes: np.ndarray, relations: list = None) -> np.ndarray:
+        """Edge ids with both endpoints in nodes."""
+        rel_codes = self.relation_codes(relations)
+        nodes = np.asarray(nodes, dtype=np.int64)
+        with self._lock:
+            self._mask[nodes] = True
+            try:
+                eids, nbrs = self._incident(nodes, "out", rel_codes)
+                eids = eids[self._mask[nbrs]]
+            finally:
+                self._mask[nodes] = False
+        return np.sort(eids)
+
+    def neighbourhood(self, cuis: list, hops: int = 1, relations: list = None,
+                      direction: str = "both", max_nodes: int = None):
+        """k-hop neighbourhood of CUIs plus the edges induced among it."""
+        nodes = self.k_hop(self.node_ids(cuis), hops, relations, direction, max_nodes)
+        return nodes, self.induced_edges(nodes, relations)
+
+    def subgraph(self, cuis: list, relations: list = None):
+        """Subgraph induced by exactly the given CUIs."""
+        nodes = self.node_ids(cuis)
+        return nodes, self.induced_edges(nodes, relations)
+
+    def stats(self) -> dict:
+        degree = np.diff(self.out_indptr) + np.diff(self.in_indptr)
+        return {
+            "nodes": self.num_nodes,
+            "edges": self.num_edges,
+            "relations": {
+                name: int(count) for name, count in
+                zip(self.relation_names.tolist(), np.bincount(self.relation, minlength=len(self.relation_names)).tolist())
+            },
+            "max_degree": int(degree.max()) if self.num_nodes else 0,
+        }
+
+    def edge_records(self, eids: np.ndarray) -> list:
+        """Edges as dicts with CUIs and decoded relation fields."""
+        return [
+            {"source": source, "target": target, "relation": relation,
+             "raw_relation": raw_relation, "source_vocab": source_vocab}
+            for source, target, relation, raw_relation, source_vocab in zip(
+                self.cuis[self.src[eids]].tolist(),
+                self.cuis[self.dst[eids]].tolist(),
+                self.relation_names[self.relation[eids]].tolist(),
+                self.raw_relation_names[self.raw_relation[eids]].tolist(),
+                self.source_vocab_names[self.source_vocab[eids]].tolist(),
+            )
+        ]
+
+
+def load_concept_graph(edges_csv: str, node_cuis=None) -> ConceptGraph:
+    """Load the edge list, or an empty graph if the file is missing."""
+    if not edges_csv or not os.path.exists(edges_csv):
+        print(f"Warning: UMLS edge list not found at {edges_csv}")
+        return ConceptGraph.empty()
+    graph = ConceptGraph.from_csv(edges_csv, node_cuis)
+    print(f"Loaded UMLS graph: {graph.num_nodes} nodes, {graph.num_edges} edges, "
+          f"{len(graph.relation_names)} relation types")
+    return graph
@@ -0,0 +1,296 @@
+"""
+UMLS Concept Search
+Prebuilt inverted indexes over concept names and synonyms
+
+Three indexes are built once from the ConceptTable:
+
+    - character trigrams -> concept rows (CSR), for substring queries of
+      three or more characters; candidates are the intersection of the
+      query's trigram postings, then verified with a plain substring test
+    - sorted word tokens, for prefix queries shorter than a trigram
+    - the table's sorted CUI array, for CUI-prefix lookups
+
+A query therefore only touches the concepts that can match it instead of
+scanning every name and synonym. When a common query still matches more
+than MAX_SCORED concepts, the candidates are pre-ranked with array
+operations (name prefix, then a word of the name starting with the query,
+then shorter name) and only the best MAX_SCORED are scored exactly.
+"""
+
+import heapq
+import re
+from bisect import bisect_left
+
+import numpy as np
+
+from concepts import ConceptTable
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_CUI_RE = re.compile(r"^c\d*$")
+_SEPARATOR = "\n"
+
+# Candidates scored exactly per query (at least 4x the limit); the rest are
+# cut by the pre-rank
+MAX_SCORED = 512
+# Cached semantic type filters
+_MAX_TYPE_MASKS = 256
+
+
+def normalize(text: str) -> str:
+    """Lowercase and collapse whitespace."""
+    return " ".join(text.lower().split())
+
+
+def _codepoints(text: str) -> np.ndarray:
+    return np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32).astype(np.int64)
+
+
+def _trigram_keys(codes: np.ndarray) -> np.ndarray:
+    """One int64 key per character trigram (codepoints fit in 21 bits)."""
+    return (codes[:-2] << 42) | (codes[1:-1] << 21) | codes[2:]
+
+
+class ConceptSearchIndex:
+    """
+    Ranked name/synonym/CUI search over a ConceptTable.
+
+    Ranking (highest first): exact name, name prefix, word prefix in name,
+    substring of name, then the same tiers for synonyms; ties go to the
+    shorter name, then the CUI.
+    """
+
+    def __init__(self, table: ConceptTable):
+        self.table = table
+        self.names = [normalize(name) for name in table.columns["preferred_name"].tolist()]
+        self.synonyms = [
+            [normalize(s) for s in synonyms.split("|") if s.strip()]
+            for synonyms in table.columns["synonyms"].tolist()
+        ]
+        # Searchable text per concept: name and synonyms on separate lines
+        self.texts = [
+            _SEPARATOR.join([name] + synonyms) for name, synonyms in zip(self.names, self.synonyms)
+        ]
+        self._build_trigrams()
+        self._build_tokens()
+        self._build_ranks()
+        self._type_masks = {}
+
+    def _build_trigrams(self):
+        corpus = _SEPARATOR.join(self.texts)
+        codes = _codepoints(corpus)
+        lengths = np.fromiter((len(text) + 1 for text in self.texts), dtype=np.int64, count=len(self.texts))
+        rows = np.repeat(np.arange(len(self.texts), dtype=np.int32), lengths)[:len(codes)]
+
+        if len(codes) < 3:
+            self.gram_keys = np.empty(0, dtype=np.int64)
+            self.gram_indptr = np.zeros(1, dtype=np.int64)
+            self.gram_rows = np.empty(0, dtype=np.int32)
+            self.gram_in_name = np.empty(0, dtype=bool)
+            return
+
+        # Trigrams that lie within the concept's name (its first line)
+        name_lengths = np.fromiter((len(name) for name in self.names), dtype=np.int64, count=len(self.names))
+        text_starts = np.cumsum(lengths) - lengths
+        in_name = (np.arange(len(codes) - 2) - text_starts[rows[:-2]] + 3) <= name_lengths[rows[:-2]]
+
+        keys = _trigram_keys(codes)
+        # Drop trigrams spanning a line break (they can never match a query)
+        separator = ord(_SEPARATOR)
+        valid = (codes[:-2] != separator) & (codes[1:-1] != separator) & (codes[2:] != separator)
+        keys, rows, in_name = keys[valid], rows[:-2][valid], in_name[valid]
+
+        # One posting per (trigram, row), flagged if any occurrence is in the name
+        order = np.lexsort((~in_name, rows, keys))
+        keys, rows, in_name = keys[order], rows[order], in_name[order]
+        first = np.ones(len(keys), dtype=bool)
+        first[1:] = (keys[1:] != keys[:-1]) | (rows[1:] != rows[:-1])
+        keys, rows, in_name = keys[first], rows[first], in_name[first]
+
+        self.gram_keys, starts = np.unique(keys, return_index=True)
+        self.gram_indptr = np.append(starts, len(keys)).astype(np.int64)
+        self.gram_rows = rows
+        self.gram_in_name = in_name
+
+    def _build_tokens(self):
+        tokens, rows, in_name = [], [], []
+        for row, (name, text) in enumerate(zip(self.names, self.texts)):
+            name_tokens = set(_TOKEN_RE.findall(name))
+            for token in set(_TOKEN_RE.findall(text)):
+                tokens.append(token)
+                rows.append(row)
+                in_name.append(token in name_tokens)
+        tokens = np.array(tokens, dtype=str)
+        order = np.argsort(tokens, kind="stable")
+        self.token_keys = tokens[order]
+        self.token_rows = np.array(rows, dtype=np.int32)[order]
+        self.token_in_name = np.array(in_name, dtype=bool)[order]
+
+    def _build_ranks(self):
+        """Names in sorted order for prefix ranges, and each row's tie-break rank."""
+        self.name_order = np.array(sorted(range(len(self.names)), key=self.names.__getitem__), dtype=np.int32)
+        self.sorted_names = [self.names[row] for row in self.name_order]
+        # Shorter name first, then CUI (rows are in CUI order)
+        lengths = np.fromiter((len(name) for name in self.names), dtype=np.int64, count=len(self.names))
+        self.rank = np.empty(len(self.names), dtype=np.int64)
+        self.rank[np.argsort(lengths, kind="stable")] = np.arange(len(self.names))
+
+    def _row_mask(self, rows: np.ndarray) -> np.ndarray:
+        mask = np.zeros(len(self.names), dtype=bool)
+        mask[rows] = True
+        return mask
+
+    def _trigram_candidates(self, query: str, names_only: bool = False) -> np.ndarray:
+        """Rows containing every trigram of the query (in their name, with names_only)."""
+        keys = np.unique(_trigram_keys(_codepoints(query)))
+        pos = np.searchsorted(self.gram_keys, keys)
+        if np.any(pos >= len(self.gram_keys)) or np.any(self.gram_keys[np.minimum(pos, len(self.gram_keys) - 1)] != keys):
+            return np.empty(0, dtype=np.int32)
+
+        starts, ends = self.gram_indptr[pos], self.gram_indptr[pos + 1]
+        candidates = None
+        for i in np.argsort(ends - starts):  # shortest posting list first
+            postings = self.gram_rows[starts[i]:ends[i]]
+            if names_only:
+                postings = postings[self.gram_in_name[starts[i]:ends[i]]]
+            candidates = postings if candidates is None else np.intersect1d(candidates, postings, assume_unique=True)
+            if not len(candidates):
+                break
+        return candidates
+
+    def _token_range(self, prefix: str, whole_word: bool = False) -> tuple:
+        """(start, end) of the tokens starting with prefix (equal to it with whole_word)."""
+        end = prefix if whole_word else prefix + "\uffff"
+        return (int(np.searchsorted(self.token_keys, prefix)),
+                int(np.searchsorted(self.token_keys, end, side="right" if whole_word else "left")))
+
+    def _token_prefix_candidates(self, prefix: str) -> np.ndarray:
+        lo, hi = self._token_range(prefix)
+        return np.flatnonzero(self._row_mask(self.token_rows[lo:hi])).astype(np.int32)
+
+    def _type_mask(self, semantic_type: str) -> np.ndarray:
+        """Rows whose semantic types contain semantic_type (cached per type)."""
+        mask = self._type_masks.get(semantic_type)
+        if mask is None:
+            if len(self._type_masks) >= _MAX_TYPE_MASKS:
+                self._type_masks.clear()
+            types = self.table.columns["semantic_types"]
+            mask = np.fromiter((semantic_type in t for t in types), dtype=bool, count=len(types))
+            self._type_masks[semantic_type] = mask
+        return mask
+
+    def _shortlist(self, query: str, candidates: np.ndarray, size: int) -> np.ndarray:
+        """
+        The `size` candidates most likely to rank first: names starting with
+        the query, then names with a word starting with it, then names
+        containing its trigrams, then synonym matches, each by name length
+        and CUI. Exact and prefix name matches always make the cut; for
+        broad queries a weaker match further down can be missed.
+        """
+        if len(candidates) <= size:
+            return candidates
+        group = np.full(len(candidates), 3, dtype=np.int64)
+        in_name = np.ones(len(candidates), dtype=bool)
+        if len(query) >= 3:
+            in_name = self._row_mask(self._trigram_candidates(query, names_only=True))[candidates]
+            group[in_name] = 2
+        token = _TOKEN_RE.match(query)
+        if token:
+            # A query like "heart att" needs the whole word "heart" in the name
+            lo, hi = self._token_range(token.group(), whole_word=token.end() < len(query))
+            word_prefix = self._row_mask(self.token_rows[lo:hi][self.token_in_name[lo:hi]])[candidates]
+            group[word_prefix & in_name] = 1
+        lo = bisect_left(self.sorted_names, query)
+        hi = bisect_left(self.sorted_names, query + "\uffff", lo)
+        group[self._row_mask(self.name_order[lo:hi])[candidates]] = 0
+
+        key = group * len(self.names) + self.rank[candidates]
+        return candidates[np.argpartition(key, size - 1)[:size]]
+
+    def cui_prefix(self, prefix: str) -> tuple:
+        """(start, end) rows of the CUIs starting with prefix."""
+        prefix = prefix.upper()
+        cuis = self.table.cuis
+        return int(np.searchsorted(cuis, prefix)), int(np.searchsorted(cuis, prefix + "\uffff"))
+
+    @staticmethod
+    def _tier(text: str, query: str) -> int:
+        """3 exact, 2 prefix, 1 word prefix, 0 substring, -1 no match."""
+        if text == query:
+            return 3
+        pos = text.find(query)
+        if pos < 0:
+            return -1
+        if pos == 0:
+            return 2
+        return 1 if not text[pos - 1].isalnum() else 0
+
+    def _score(self, row: int, query: str) -> float:
+        name_tier = self._tier(self.names[row], query)
+        if name_tier >= 0:
+            return 4.0 + name_tier
+        synonym_tier = max((self._tier(s, query) for s in self.synonyms[row]), default=-1)
+        return float(synonym_tier) if synonym_tier >= 0 else -1.0
+
+    def search(self, query: str, limit: int = 20, semantic_type: str = None) -> list:
+        """
+        Ranked concepts whose CUI, name or a synonym matches the query.
+
+        Args:
+            query: CUI prefix (e.g. "C00") or name/synonym substring
+            limit: Maximum number of results
+            semantic_type: Only return concepts with this semantic type
+
+        Returns:
+            List of dicts with cui, name, semantic_types, score and matched
+            ("cui", "name" or "synonym")
+        """
+        query = normalize(query)
+        if not query or limit <= 0:
+            return []
+
+        semantic_types = self.table.columns["semantic_types"]
+        scored = []
+
+        if _CUI_RE.match(query) and len(query) > 1:
+            start, end = self.cui_prefix(query)
+            for row in range(start, end):
+                if semantic_type and semantic_type not in semantic_types[row]:
+                    continue
+                scored.append((10.0, row, "cui"))
+                if len(scored) >= limit:
+                    break
+
+        if len(query) >= 3:
+            candidates = self._trigram_candidates(query)
+        else:
+            candidates = self._token_prefix_candidates(query)
+        if semantic_type and len(candidates):
+            candidates = candidates[self._type_mask(semantic_type)[candidates]]
+        candidates = self._shortlist(query, candidates, max(MAX_SCORED, 4 * limit))
+
+        for row in candidates.tolist():
+            score = self._score(row, query)
+            if score >= 0:
+                scored.append((score, row, "name" if score >= 4.0 else "synonym"))
+
+        # Partial sort; 2x the limit leaves room for rows that also matched by CUI
+        scored = heapq.nsmallest(
+            2 * limit, scored,
+            key=lambda item: (-item[0], self.rank[item[1]]),
+        )
+
+        results, seen = [], set()
+        for score, row, matched in scored:
+            if row in seen:
+                continue
+            seen.add(row)
+            results.append({
+                "cui": str(self.table.cuis[row]),
+                "name": self.table.columns["preferred_name"][row],
+                "semantic_types": semantic_types[row],
+                "score": score,
+                "matched": matched,
+            })
+            if len(results) >= limit:
+                break
+        return results
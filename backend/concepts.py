@@ -0,0 +1,134 @@
+"""
+UMLS Concept Metadata
+Indexed in-memory load of the UMLS node table for batched CUI lookups
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+
+class ConceptMetadata:
+    """Names and semantic types aligned with an external index (e.g. concept_idx)."""
+
+    def __init__(self, names: np.ndarray, semantic_types: np.ndarray):
+        self.names = names
+        self.semantic_types = semantic_types
+
+    def expand(self, records: list, indices) -> list:
+        """
+        Copies of records with name and semantic_types added, gathered for
+        all records at once. Records are not modified (they may be cached).
+        """
+        indices = np.asarray(indices, dtype=np.int64)
+        names = self.names[indices].tolist()
+        semantic_types = self.semantic_types[indices].tolist()
+        return [
+            {**record, "name": name, "semantic_types": types}
+            for record, name, types in zip(records, names, semantic_types)
+        ]
+
+
+class ConceptTable:
+    """
+    UMLS concepts held as a sorted CUI array plus aligned column arrays.
+
+    Lookups locate every requested CUI with one np.searchsorted, so a batch of
+    CUIs costs a single vectorized pass instead of one request per CUI.
+    """
+
+    COLUMNS = ["cui", "preferred_name", "semantic_types", "synonyms", "sources", "codes"]
+
+    def __init__(self, cuis: np.ndarray, columns: dict):
+        self.cuis = cuis        # sorted, unique
+        self.columns = columns  # column name -> object array aligned with cuis
+
+    @classmethod
+    def from_csv(cls, csv_path: str):
+        """Load the node table (cui, preferred_name, semantic_types, synonyms, ...)."""
+        df = pd.read_csv(
+            csv_path,
+            dtype=str,
+            keep_default_na=False,
+            usecols=lambda column: column in cls.COLUMNS,
+        )
+        return cls.from_dataframe(df)
+
+    @classmethod
+    def from_dataframe(cls, df: pd.DataFrame):
+        if "cui" not in df.columns:
+            return cls.empty()
+        df = df.drop_duplicates(subset=["cui"], keep="first").sort_values("cui", kind="stable")
+        cuis = df["cui"].to_numpy(dtype=str)
+        columns = {
+            name: (df[name].to_numpy(dtype=object) if name in df.columns
+                   else np.full(len(df), "", dtype=object))
+            for name in cls.COLUMNS[1:]
+        }
+        return cls(cuis, columns)
+
+    @classmethod
+    def empty(cls):
+        return cls(np.empty(0, dtype=str), {name: np.empty(0, dtype=object) for name in cls.COLUMNS[1:]})
+
+    def __len__(self) -> int:
+        return len(self.cuis)
+
+    def positions(self, cuis: list) -> np.ndarray:
+        """Row of each CUI in the table, -1 where unknown."""
+        if not len(self.cuis) or not len(cuis):
+            return np.full(len(cuis), -1, dtype=np.int64)
+        queries = np.asarray(cuis, dtype=str)
+        pos = np.minimum(np.searchsorted(self.cuis, queries), len(self.cuis) - 1)
+        return np.where(self.cuis[pos] == queries, pos, -1)
+
+    def _details(self, pos: int) -> dict:
+        """Row in the shape the CUI lookup service returns."""
+        return {
+            "name": self.columns["preferred_name"][pos],
+            "node_type": "concept",
+            "semantic_types": self.columns["semantic_types"][pos],
+            "canonical_code": str(self.cuis[pos]),
+            "sources": self.columns["sources"][pos],
+            "codes": self.columns["codes"][pos],
+            "synonyms": self.columns["synonyms"][pos],
+        }
+
+    def lookup_many(self, cuis: list) -> dict:
+        """
+        Resolve many CUIs at once.
+
+        Returns:
+            Dict of CUI -> {"found": bool, "data": details or None}
+        """
+        results = {}
+        for cui, pos in zip(cuis, self.positions(cuis).tolist()):
+            if pos < 0:
+                results[cui] = {"found": False, "data": None}
+            else:
+                results[cui] = {"found": True, "data": self._details(pos)}
+        return results
+
+    def aligned(self, cuis: list) -> ConceptMetadata:
+        """Metadata arrays aligned with the given CUI list ("" where unknown)."""
+        pos = self.positions(cuis)
+        known = pos >= 0
+        names = np.full(len(cuis), "", dtype=object)
+        semantic_types = np.full(len(cuis), "", dtype=object)
+        names[known] = self.columns["preferred_name"][pos[known]]
+        semantic_types[known] = self.columns["semantic_types"][pos[known]]
+        return ConceptMetadata(names, semantic_types)
+
+    def lookup(self, cui: str) -> dict:
+        return self.lookup_many([cui])[cui]
+
+
+def load_concept_table(csv_path: str) -> ConceptTable:
+    """Load the node table, or an empty table if the file is missing."""
+    if not csv_path or not os.path.exists(csv_path):
+        print(f"Warning: UMLS node table not found at {csv_path}")
+        return ConceptTable.empty()
+    table = ConceptTable.from_csv(csv_path)
+    print(f"Loaded {len(table)} UMLS concepts from {csv_path}")
+    return table
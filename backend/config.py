@@ -0,0 +1,82 @@
+"""
+Backend Configuration
+Settings read from environment variables, with defaults for local development
+"""
+
+import os
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.environ.get(name)
+    return int(value) if value else default
+
+
+# Embeddings to serve: an artifact directory or embeddings.pt (default: model/artifact,
+# else model/embeddings.pt + mappings.pt)
+MODEL_PATH = os.environ.get("DRUG_REC_MODEL_PATH") or None
+
+# Drug search: "exact" scores every drug, "ann" uses the IVF index
+SEARCH_MODE = os.environ.get("DRUG_REC_SEARCH_MODE", "exact")
+
+# IVF index settings (0 lists = choose from the number of drugs)
+ANN_NLIST = _env_int("DRUG_REC_ANN_NLIST", 0)
+ANN_NPROBE = _env_int("DRUG_REC_ANN_NPROBE", 8)
+ANN_INDEX_PATH = os.environ.get("DRUG_REC_ANN_INDEX_PATH") or None
+
+# Compressed embedding storage: "", "int8" or "float16"
+QUANTIZE = os.environ.get("DRUG_REC_QUANTIZE") or None
+# Candidates re-scored in float32 when quantized (0 = no re-scoring)
+RESCORE_K = _env_int("DRUG_REC_RESCORE_K", 0)
+
+# Recommendation result cache (0 entries = disabled, 0 TTL = never expire)
+CACHE_SIZE = _env_int("DRUG_REC_CACHE_SIZE", 10000)
+CACHE_TTL = float(os.environ.get("DRUG_REC_CACHE_TTL") or 300)
+
+# Micro-batching of concurrent /api/recommend calls (0 max size = disabled)
+BATCH_MAX_SIZE = _env_int("DRUG_REC_BATCH_MAX_SIZE", 64)
+BATCH_MAX_WAIT_MS = float(os.environ.get("DRUG_REC_BATCH_MAX_WAIT_MS") or 2)
+# Largest top_k a recommendation request may ask for
+MAX_TOP_K = _env_int("DRUG_REC_MAX_TOP_K", 100)
+# Most patient IDs in one /api/recommend/batch request
+MAX_BATCH_PATIENTS = _env_int("DRUG_REC_MAX_BATCH_PATIENTS", 1000)
+
+# Poll the model files every N seconds and hot-reload a new version (0 = only via /api/admin/reload)
+RELOAD_INTERVAL_S = float(os.environ.get("DRUG_REC_RELOAD_INTERVAL_S") or 0)
+
+# Components loaded and warmed in the background at startup, in order
+# ("" = load each on first use). Readiness waits for recommender and diagnoses.
+WARMUP = [name for name in (os.environ.get("DRUG_REC_WARMUP", "recommender,diagnoses")).split(",") if name.strip()]
+# After a required component fails to load, requests get 503 for this long before a retry
+LOAD_RETRY_S = float(os.environ.get("DRUG_REC_LOAD_RETRY_S") or 30)
+
+# Diagnoses: columnar store directory (see diagnoses.py), with the raw CSV as fallback
+_base_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DIAGNOSES_PATH = os.environ.get("DRUG_REC_DIAGNOSES_PATH") or os.path.join(_base_path, "model", "diagnoses")
+DIAGNOSES_CSV = os.environ.get("DRUG_REC_DIAGNOSES_CSV") or os.path.join(_base_path, "model", "mimic_diagnoses_mapped.csv")
+
+# Paths given to POST /api/admin/reload must lie under this directory (or DRUG_REC_MODEL_PATH's)
+MODEL_DIR = os.environ.get("DRUG_REC_MODEL_DIR") or os.path.join(_base_path, "model")
+# Token expected in the X-Admin-Token header of /api/admin/* (unset = local callers only)
+ADMIN_TOKEN = os.environ.get("DRUG_REC_ADMIN_TOKEN") or None
+
+# Score unseen patients from their diagnosis CUIs instead of returning 404
+COLD_START = os.environ.get("DRUG_REC_COLD_START", "1") not in ("0", "false", "False", "")
+
+# Live HGT inference on sampled subgraphs (off by default; needs torch-geometric)
+LIVE_MODE = os.environ.get("DRUG_REC_LIVE_MODE", "0") not in ("0", "false", "False", "")
+GRAPH_PATH = os.environ.get("DRUG_REC_GRAPH_PATH") or os.path.join(_base_path, "model", "graph_data.pt")
+HGT_CHECKPOINT = os.environ.get("DRUG_REC_HGT_CHECKPOINT") or os.path.join(_base_path, "model", "hgt_drug_recommender.pt")
+LIVE_NUM_NEIGHBORS = [int(n) for n in (os.environ.get("DRUG_REC_LIVE_NUM_NEIGHBORS") or "10,5").split(",")]
+LIVE_SUBGRAPH_CACHE = _env_int("DRUG_REC_LIVE_SUBGRAPH_CACHE", 1024)
+# Live requests over budget are answered from frozen embeddings
+LIVE_BUDGET_MS = float(os.environ.get("DRUG_REC_LIVE_BUDGET_MS") or 50)
+# Encodes running at once; live requests beyond that use frozen embeddings straight away
+LIVE_MAX_CONCURRENCY = _env_int("DRUG_REC_LIVE_MAX_CONCURRENCY", 2)
+
+# UMLS node table for CUI metadata (cui, preferred_name, semantic_types, synonyms, ...)
+NODES_CSV = os.environ.get("DRUG_REC_NODES_CSV") or os.path.join(_base_path, "public", "nodes_50k.csv")
+# UMLS edge list for the concept graph (source, target, relation, raw_relation, source_vocab)
+EDGES_CSV = os.environ.get("DRUG_REC_EDGES_CSV") or os.path.join(_base_path, "public", "edges_50k.csv")
+# Largest hops / max_nodes a /api/graph/neighbourhood request may ask for
+GRAPH_MAX_HOPS = _env_int("DRUG_REC_GRAPH_MAX_HOPS", 3)
+GRAPH_MAX_NODES = _env_int("DRUG_REC_GRAPH_MAX_NODES", 5000)
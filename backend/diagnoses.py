@@ -0,0 +1,276 @@
+"""
+Diagnosis Index
+Per-patient index over the MIMIC diagnoses table for O(1) slice lookups
+
+The index can be saved as a columnar store: one .npy file per column plus a
+small JSON header. ICD codes and CUIs are dictionary-encoded as int32 codes,
+and the store is opened with np.load(mmap_mode='r'), so only the pages a
+lookup touches are read from disk.
+
+Usage (convert the CSV once):
+    python diagnoses.py --csv mimic_diagnoses_mapped.csv --out ../model/diagnoses
+"""
+
+import argparse
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+HEADER_NAME = "header.json"
+FORMAT_NAME = "drug-rec-diagnoses"
+FORMAT_VERSION = 1
+
+
+class DiagnosisIndex:
+    """
+    Diagnoses grouped by subject_id into contiguous row ranges.
+
+    Built once at load: rows are stably sorted by subject_id (keeping the
+    original order within a patient), ICD codes are de-duplicated per patient
+    (first CUI wins), and each column is kept as a flat array. A lookup is a
+    binary search for the patient followed by a slice.
+    """
+
+    COLUMNS = ["subject_id", "hadm_id", "icd_code", "icd_version", "cui"]
+    ARRAYS = ["subject_ids", "offsets", "icd_code", "icd_version", "cui", "hadm_id"]
+
+    def __init__(self, subject_ids, offsets, icd_code, icd_version, cui, hadm_id,
+                 icd_code_dict, cui_dict):
+        self.subject_ids = subject_ids  # sorted unique subject ids
+        self.offsets = offsets          # rows of subject_ids[i] are offsets[i]:offsets[i + 1]
+        self.icd_code = icd_code        # int32 codes into icd_code_dict
+        self.icd_version = icd_version
+        self.cui = cui                  # int32 codes into cui_dict
+        self.hadm_id = hadm_id          # int64, -1 when missing
+        self.icd_code_dict = icd_code_dict
+        self.cui_dict = cui_dict
+
+    @classmethod
+    def from_dataframe(cls, df: pd.DataFrame):
+        """Build the index from a raw diagnoses DataFrame."""
+        if df.empty or not set(cls.COLUMNS).issubset(df.columns):
+            return cls.empty()
+
+        df = df.sort_values("subject_id", kind="stable")
+        df = df.drop_duplicates(subset=["subject_id", "icd_code"], keep="first")
+
+        subjects = df["subject_id"].to_numpy(dtype=np.int64)
+        subject_ids, starts = np.unique(subjects, return_index=True)
+        offsets = np.append(starts, len(subjects)).astype(np.int64)
+
+        icd_code, icd_code_dict = pd.factorize(df["icd_code"].astype(str))
+        cui, cui_dict = pd.factorize(df["cui"].astype(str))
+
+        return cls(
+            subject_ids=subject_ids,
+            offsets=offsets,
+            icd_code=icd_code.astype(np.int32),
+            icd_version=df["icd_version"].to_numpy(dtype=np.int16),
+            cui=cui.astype(np.int32),
+            hadm_id=df["hadm_id"].fillna(-1).to_numpy(dtype=np.int64),
+            icd_code_dict=np.asarray(icd_code_dict, dtype=object),
+            cui_dict=np.asarray(cui_dict, dtype=object),
+        )
+
+    @classmethod
+    def from_csv(cls, csv_path: str):
+        """Parse the raw CSV (only the needed columns) and build the index."""
+        df = pd.read_csv(
+            csv_path,
+            usecols=cls.COLUMNS,
+            dtype={"icd_code": str, "cui": str},
+        )
+        print(f"Loaded {len(df)} diagnosis records")
+        return cls.from_dataframe(df)
+
+    @classmethod
+    def empty(cls):
+        return cls(
+            subject_ids=np.empty(0, dtype=np.int64),
+            offsets=np.zeros(1, dtype=np.int64),
+            icd_code=np.empty(0, dtype=np.int32),
+            icd_version=np.empty(0, dtype=np.int16),
+            cui=np.empty(0, dtype=np.int32),
+            hadm_id=np.empty(0, dtype=np.int64),
+            icd_code_dict=np.empty(0, dtype=object),
+            cui_dict=np.empty(0, dtype=object),
+        )
+
+    def save(self, out_dir: str):
+        """
+        Write the index as a columnar store.
+
+        Written to a sibling temp directory and renamed into place, so readers
+        never see a half-written store.
+        """
+        tmp_dir = out_dir.rstrip(os.sep) + ".tmp"
+        if os.path.exists(tmp_dir):
+            shutil.rmtree(tmp_dir)
+        os.makedirs(tmp_dir)
+
+        for name in self.ARRAYS:
+            np.save(os.path.join(tmp_dir, f"{name}.npy"), np.ascontiguousarray(getattr(self, name)))
+        # Dictionaries are small; fixed-width bytes keep them pickle-free
+        np.save(os.path.join(tmp_dir, "icd_code_dict.npy"), self.icd_code_dict.astype(np.bytes_))
+        np.save(os.path.join(tmp_dir, "cui_dict.npy"), self.cui_dict.astype(np.bytes_))
+
+        header = {
+            "format": FORMAT_NAME,
+            "format_version": FORMAT_VERSION,
+            "rows": len(self),
+            "patients": self.num_patients,
+        }
+        with open(os.path.join(tmp_dir, HEADER_NAME), "w") as f:
+            json.dump(header, f, indent=2)
+
+        if os.path.exists(out_dir):
+            shutil.rmtree(out_dir)
+        os.rename(tmp_dir, out_dir)
+
+    @classmethod
+    def open(cls, store_dir: str):
+        """Open a columnar store; column files are memory-mapped read-only."""
+        with open(os.path.join(store_dir, HEADER_NAME)) as f:
+            header = json.load(f)
+        if header.get("format") != FORMAT_NAME or header.get("format_version") != FORMAT_VERSION:
+            raise ValueError(f"Not a diagnosis store: {store_dir}")
+
+        arrays = {
+            name: np.load(os.path.join(store_dir, f"{name}.npy"), mmap_mode="r")
+            for name in cls.ARRAYS
+        }
+        # Decode the dictionaries once so lookups gather Python strings directly
+        for name in ("icd_code_dict", "cui_dict"):
+            values = np.load(os.path.join(store_dir, f"{name}.npy"))
+            arrays[name] = np.array([v.decode() for v in values.tolist()], dtype=object)
+        return cls(**arrays)
+
+    @staticmethod
+    def is_store(path: str) -> bool:
+        return os.path.isfile(os.path.join(path, HEADER_NAME))
+
+    def __len__(self) -> int:
+        return int(self.offsets[-1])
+
+    @property
+    def num_patients(self) -> int:
+        return len(self.subject_ids)
+
+    def row_range(self, subject_id: int):
+        """(start, end) rows of a patient; (0, 0) if the patient is unknown."""
+        pos = np.searchsorted(self.subject_ids, subject_id)
+        if pos < len(self.subject_ids) and self.subject_ids[pos] == subject_id:
+            return int(self.offsets[pos]), int(self.offsets[pos + 1])
+        return 0, 0
+
+    def lookup(self, subject_id: int, top_k: int = 10) -> list:
+        """
+        Unique ICD codes for a patient, in original table order.
+
+        Returns:
+            List of dicts with icd_code, icd_version, cui and hadm_id
+        """
+        start, end = self.row_range(subject_id)
+        end = min(end, start + max(top_k, 0))
+        return [
+            {
+                "icd_code": icd_code,
+                "icd_version": icd_version,
+                "cui": cui,
+                "hadm_id": str(hadm_id) if hadm_id >= 0 else "",
+            }
+            for icd_code, icd_version, cui, hadm_id in zip(
+                self.icd_code_dict[self.icd_code[start:end]].tolist(),
+                self.icd_version[start:end].tolist(),
+                self.cui_dict[self.cui[start:end]].tolist(),
+                self.hadm_id[start:end].tolist(),
+            )
+        ]
+
+    def patient_cuis(self, subject_id: int) -> list:
+        """All de-duplicated diagnosis CUIs of a patient."""
+        start, end = self.row_range(subject_id)
+        return self.cui_dict[self.cui[start:end]].tolist()
+
+    def lookup_many(self, subject_ids: list, top_k: int = 10) -> list:
+        """
+        Unique ICD codes for many patients in one vectorized pass.
+
+        All patients are located with one searchsorted, their (top_k-capped)
+        row ranges are expanded into a single row-index array, and each column
+        is gathered once before being split back per patient.
+
+        Returns:
+            List aligned with subject_ids, each a list of diagnosis dicts
+        """
+        if not self.num_patients:
+            return [[] for _ in subject_ids]
+
+        queries = np.asarray(subject_ids, dtype=np.int64)
+        pos = np.minimum(np.searchsorted(self.subject_ids, queries), self.num_patients - 1)
+        found = self.subject_ids[pos] == queries
+
+        starts = np.where(found, self.offsets[pos], 0)
+        ends = np.where(found, self.offsets[pos + 1], 0)
+        counts = np.minimum(ends - starts, max(top_k, 0))
+
+        # Row indices of every requested slice, back to back
+        total = int(counts.sum())
+        rows = np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(total)
+
+        icd_codes = self.icd_code_dict[self.icd_code[rows]].tolist()
+        icd_versions = self.icd_version[rows].tolist()
+        cuis = self.cui_dict[self.cui[rows]].tolist()
+        hadm_ids = self.hadm_id[rows].tolist()
+
+        results = []
+        offset = 0
+        for count in counts.tolist():
+            results.append([
+                {
+                    "icd_code": icd_codes[i],
+                    "icd_version": icd_versions[i],
+                    "cui": cuis[i],
+                    "hadm_id": str(hadm_ids[i]) if hadm_ids[i] >= 0 else "",
+                }
+                for i in range(offset, offset + count)
+            ])
+            offset += count
+        return results
+
+
+def load_diagnosis_index(store_path: str = None, csv_path: str = None) -> DiagnosisIndex:
+    """
+    Open the columnar store if present, else build from the CSV.
+
+    Returns an empty index when neither exists.
+    """
+    if store_path and DiagnosisIndex.is_store(store_path):
+        index = DiagnosisIndex.open(store_path)
+        print(f"Opened diagnosis store {store_path}")
+    elif csv_path and os.path.exists(csv_path):
+        index = DiagnosisIndex.from_csv(csv_path)
+    else:
+        print(f"Warning: No diagnosis data at {store_path} or {csv_path}")
+        return DiagnosisIndex.empty()
+
+    print(f"Indexed {len(index)} unique diagnoses for {index.num_patients} patients")
+    return index
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert the diagnoses CSV to a columnar store")
+    parser.add_argument("--csv", required=True, help="Path to mimic_diagnoses_mapped.csv")
+    parser.add_argument("--out", required=True, help="Output store directory")
+    args = parser.parse_args()
+
+    index = DiagnosisIndex.from_csv(args.csv)
+    index.save(args.out)
+    print(f"Wrote {len(index)} rows for {index.num_patients} patients to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,290 @@
+"""
+Ranking Evaluation
+Recall, Precision, NDCG and MAP@K over every patient from exported embeddings
+
+Ground-truth prescriptions are held as CSR (patient row -> drug columns).
+Patients with at least one true drug are scored in blocks: one
+(block, drugs) matmul, optional masking of the patient's training drugs,
+one top-K_max, and hit flags looked up for the whole block with
+np.searchsorted. Cumulative sums over the hit matrix then give every
+metric at every K from 1 to K_max in the same pass.
+
+Edge files (truth and training edges) may be:
+    .npz  with patient_idx / concept_idx arrays of embedding rows, e.g.
+          from hgt-model.py after RandomLinkSplit:
+              store = test_data['patient', 'prescribed', 'concept']
+              pairs = store.edge_label_index[:, store.edge_label == 1]
+              np.savez("test_edges.npz", patient_idx=pairs[0].numpy(), concept_idx=pairs[1].numpy())
+    .csv  with patient_id (or subject_id) and cui (or cuid) columns
+    .pt   graph_data.pt: every ('patient', 'prescribed', 'concept') edge
+
+Usage (from backend/):
+    python evaluation.py --model ../model/artifact --truth test_edges.npz \\
+        --train train_edges.npz --k 50 --ks 1,5,10,20,50 --out eval.json
+"""
+
+import argparse
+import json
+import time
+
+import numpy as np
+import pandas as pd
+import torch
+
+from inference import DrugRecommender, load_recommender
+
+EDGE_TYPE = ("patient", "prescribed", "concept")
+
+
+def _ranges(starts: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    """Concatenation of arange(start, start + count) for each pair."""
+    total = int(counts.sum())
+    if not total:
+        return np.empty(0, dtype=np.int64)
+    ends = np.cumsum(counts)
+    offsets = np.repeat(starts - (ends - counts), counts)
+    return np.arange(total, dtype=np.int64) + offsets
+
+
+def _sorted_unique(keys: np.ndarray) -> np.ndarray:
+    """Sorted distinct values (a plain sort is much faster than np.unique's hashing here)."""
+    keys = np.sort(keys)
+    if len(keys):
+        keys = keys[np.concatenate([[True], keys[1:] != keys[:-1]])]
+    return keys
+
+
+class PrescriptionCSR:
+    """
+    Patient -> drug adjacency in CSR form, in the recommender's drug-local
+    column space.
+
+    Args:
+        indptr: (num_patients + 1,) offsets into indices
+        indices: Sorted drug columns of each patient
+        num_drugs: Number of drug columns
+        unreachable: Per patient, true concepts that are not drugs the
+            recommender can rank (counted as misses, not as columns)
+    """
+
+    def __init__(self, indptr: np.ndarray, indices: np.ndarray, num_drugs: int, unreachable: np.ndarray = None):
+        self.indptr = indptr
+        self.indices = indices
+        self.num_drugs = num_drugs
+        self.unreachable = unreachable if unreachable is not None else np.zeros(len(indptr) - 1, dtype=np.int64)
+
+    @classmethod
+    def from_edges(cls, patient_idx, concept_idx, drug_concept_idx: np.ndarray, num_patients: int):
+        """
+        Build from (patient row, concept row) pairs. Duplicate pairs count
+        once; concepts outside the drug table are kept only as counts.
+        """
+        patient_idx = np.asarray(patient_idx, dtype=np.int64)
+        concept_idx = np.asarray(concept_idx, dtype=np.int64)
+        ok = (patient_idx >= 0) & (patient_idx < num_patients) & (concept_idx >= 0)
+        patient_idx, concept_idx = patient_idx[ok], concept_idx[ok]
+
+        # concept row -> drug column (-1 = not a drug)
+        size = max(int(concept_idx.max(initial=-1)), int(drug_concept_idx.max(initial=-1))) + 1
+        concept_to_drug = np.full(size, -1, dtype=np.int64)
+        concept_to_drug[drug_concept_idx] = np.arange(len(drug_concept_idx))
+
+        pairs = _sorted_unique(patient_idx * size + concept_idx)
+        patient_idx, concept_idx = pairs // size, pairs % size
+        drug_idx = concept_to_drug[concept_idx]
+        reachable = drug_idx >= 0
+
+        unreachable = np.bincount(patient_idx[~reachable], minlength=num_patients).astype(np.int64)
+        keys = _sorted_unique(patient_idx[reachable] * len(drug_concept_idx) + drug_idx[reachable])
+        return cls.from_keys(keys, len(drug_concept_idx), num_patients, unreachable)
+
+    @classmethod
+    def from_keys(cls, keys: np.ndarray, num_drugs: int, num_patients: int, unreachable: np.ndarray = None):
+        """Build from sorted unique patient * num_drugs + drug keys."""
+        counts = np.bincount(keys // num_drugs, minlength=num_patients)
+        indptr = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+        return cls(indptr, keys % num_drugs, num_drugs, unreachable)
+
+    @property
+    def num_patients(self) -> int:
+        return len(self.indptr) - 1
+
+    @property
+    def nnz(self) -> int:
+        return len(self.indices)
+
+    def keys(self) -> np.ndarray:
+        """Sorted patient * num_drugs + drug key of every edge."""
+        rows = np.repeat(np.arange(self.num_patients, dtype=np.int64), np.diff(self.indptr))
+        return rows * self.num_drugs + self.indices
+
+    def counts(self) -> np.ndarray:
+        """True drugs per patient, including unreachable ones."""
+        return np.diff(self.indptr) + self.unreachable
+
+    def without(self, other: "PrescriptionCSR") -> "PrescriptionCSR":
+        """Edges not in other (e.g. truth minus training edges)."""
+        keys = self.keys()
+        other_keys = other.keys()
+        if len(other_keys):
+            pos = np.minimum(np.searchsorted(other_keys, keys), len(other_keys) - 1)
+            keys = keys[other_keys[pos] != keys]
+        return PrescriptionCSR.from_keys(keys, self.num_drugs, self.num_patients, self.unreachable)
+
+    def columns_of(self, rows: np.ndarray):
+        """(position in rows, drug column) of every edge of the given patients."""
+        starts = self.indptr[rows]
+        counts = self.indptr[rows + 1] - starts
+        positions = np.repeat(np.arange(len(rows), dtype=np.int64), counts)
+        return positions, self.indices[_ranges(starts, counts)]
+
+
+def load_edges(path: str, recommender: DrugRecommender):
+    """
+    (patient rows, concept rows) of an edge file (see module docstring).
+    CSV IDs that are not in the recommender's maps are dropped.
+    """
+    if path.endswith(".npz"):
+        arrays = np.load(path)
+        return arrays["patient_idx"], arrays["concept_idx"]
+    if path.endswith(".pt"):
+        data = torch.load(path, weights_only=False, map_location="cpu")
+        edge_index = data[EDGE_TYPE].edge_index
+        return edge_index[0].numpy(), edge_index[1].numpy()
+
+    df = pd.read_csv(path, dtype=str)
+    patient_col = "patient_id" if "patient_id" in df.columns else "subject_id"
+    cui_col = "cui" if "cui" in df.columns else "cuid"
+    df = df.dropna(subset=[patient_col, cui_col])
+    patient_idx = recommender.patient_ids.lookup_many(df[patient_col].str.strip().to_numpy(dtype=str))
+    concept_idx = recommender.concept_ids.lookup_many(df[cui_col].str.strip().to_numpy(dtype=str))
+    known = (patient_idx >= 0) & (concept_idx >= 0)
+    if not known.all():
+        print(f"Dropped {int((~known).sum())} of {len(known)} edges with unknown patient IDs or CUIs")
+    return patient_idx[known], concept_idx[known]
+
+
+def _ideal_dcg(max_k: int) -> np.ndarray:
+    """ideal[m] = DCG of m hits at the top ranks (m = 0..max_k)."""
+    return np.concatenate([[0.0], np.cumsum(1.0 / np.log2(np.arange(2, max_k + 2)))])
+
+
+@torch.no_grad()
+def evaluate(recommender: DrugRecommender, truth: PrescriptionCSR, max_k: int = 50,
+             train: PrescriptionCSR = None, block_size: int = 4096) -> dict:
+    """
+    Mean Recall, Precision, NDCG and MAP at every K in 1..max_k.
+
+    Args:
+        recommender: Loaded embeddings (scored exactly, in float32;
+            dequantized first if loaded with quantize)
+        truth: Held-out prescriptions
+        max_k: Largest cut-off
+        train: Training prescriptions to mask out of each ranking (and
+            out of the truth, if they overlap)
+        block_size: Patients per matmul + top-k block
+
+    Returns:
+        Dict with patients, edge counts and per-metric lists indexed by K - 1
+
+    Raises:
+        ValueError: If no truth edge (after masking) is a rankable drug
+    """
+    if train is not None:
+        truth = truth.without(train)
+    if truth.nnz == 0:
+        raise ValueError(f"No truth edge is a rankable drug ({int(truth.unreachable.sum())} point at "
+                         "other concepts; any others were masked as training edges)")
+    num_drugs = truth.num_drugs
+    max_k = min(max_k, num_drugs)
+    truth_keys = truth.keys()
+    true_counts = truth.counts()
+    rows = np.flatnonzero(true_counts > 0)
+
+    drug_vectors = recommender._concept_vectors(torch.from_numpy(recommender.drug_concept_idx)).T.contiguous()
+    ranks = np.arange(1, max_k + 1)
+    discounts = 1.0 / np.log2(ranks + 1)
+    ideal = _ideal_dcg(max_k)
+    sums = {name: np.zeros(max_k) for name in ("recall", "precision", "ndcg", "map")}
+
+    for start in range(0, len(rows), block_size):
+        block = rows[start:start + block_size]
+        scores = recommender._patient_vectors(torch.from_numpy(block)) @ drug_vectors
+        if train is not None:
+            positions, columns = train.columns_of(block)
+            scores[torch.from_numpy(positions), torch.from_numpy(columns)] = float("-inf")
+        top_idx = torch.topk(scores, max_k, dim=1).indices.numpy()
+
+        # Hit flags for the whole block by key lookup in the sorted truth keys
+        keys = block[:, None] * num_drugs + top_idx
+        pos = np.minimum(np.searchsorted(truth_keys, keys), len(truth_keys) - 1)
+        hits = truth_keys[pos] == keys
+
+        n_true = true_counts[block][:, None].astype(np.float64)
+        cum_hits = np.cumsum(hits, axis=1)
+        sums["recall"] += (cum_hits / n_true).sum(axis=0)
+        sums["precision"] += (cum_hits / ranks).sum(axis=0)
+        dcg = np.cumsum(hits * discounts, axis=1)
+        sums["ndcg"] += (dcg / ideal[np.minimum(n_true, ranks).astype(np.int64)]).sum(axis=0)
+        # AP@K: precision at each hit rank, over min(K, true drugs)
+        precision_at_hits = np.cumsum(hits * (cum_hits / ranks), axis=1)
+        sums["map"] += (precision_at_hits / np.minimum(n_true, ranks)).sum(axis=0)
+
+    num_rows = max(len(rows), 1)
+    return {
+        "patients": len(rows),
+        "truth_edges": truth.nnz,
+        "unreachable_truth_edges": int(truth.unreachable.sum()),
+        "masked_train_edges": train.nnz if train is not None else 0,
+        "num_drugs": num_drugs,
+        "max_k": max_k,
+        **{name: (values / num_rows).tolist() for name, values in sums.items()},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Full-population ranking metrics from exported embeddings")
+    parser.add_argument("--model", help="Artifact directory or embeddings.pt (default: as the API)")
+    parser.add_argument("--truth", required=True, help="Held-out prescription edges (.npz, .csv or graph .pt)")
+    parser.add_argument("--train", help="Training edges to mask from the rankings")
+    parser.add_argument("--k", type=int, default=50, help="Largest K (every K up to it is computed)")
+    parser.add_argument("--ks", default="1,5,10,20,50", help="Cut-offs to print")
+    parser.add_argument("--block-size", type=int, default=4096)
+    parser.add_argument("--out", help="Write all curves as JSON here")
+    args = parser.parse_args()
+
+    recommender = load_recommender(args.model)
+    num_patients = recommender.num_patients
+    drug_concept_idx = recommender.drug_concept_idx
+
+    start = time.perf_counter()
+    truth = PrescriptionCSR.from_edges(*load_edges(args.truth, recommender), drug_concept_idx, num_patients)
+    train = None
+    if args.train:
+        train = PrescriptionCSR.from_edges(*load_edges(args.train, recommender), drug_concept_idx, num_patients)
+    print(f"Loaded edges in {time.perf_counter() - start:.2f}s: {truth.nnz} truth"
+          + (f", {train.nnz} train" if train is not None else ""))
+
+    start = time.perf_counter()
+    try:
+        result = evaluate(recommender, truth, args.k, train, args.block_size)
+    except ValueError as e:
+        parser.error(str(e))
+    result["seconds"] = round(time.perf_counter() - start, 3)
+    print(f"Evaluated {result['patients']} patients x {result['num_drugs']} drugs in {result['seconds']}s "
+          f"({result['unreachable_truth_edges']} truth edges are not rankable drugs)")
+
+    print(f"{'K':>4} {'Recall':>8} {'Precision':>10} {'NDCG':>8} {'MAP':>8}")
+    for k in (int(k) for k in args.ks.split(",")):
+        if 1 <= k <= result["max_k"]:
+            print(f"{k:>4} {result['recall'][k - 1]:>8.4f} {result['precision'][k - 1]:>10.4f} "
+                  f"{result['ndcg'][k - 1]:>8.4f} {result['map'][k - 1]:>8.4f}")
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"Wrote curves to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
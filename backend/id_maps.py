@@ -0,0 +1,284 @@
+"""
+Compact ID Maps
+String ID <-> row maps stored as sorted int64 arrays instead of Python dicts
+
+MIMIC subject IDs ("10000032") and UMLS CUIs ("C0000039") are decimal
+numbers with an optional fixed prefix, so each is kept as one int64 code.
+Lookups are a np.searchsorted over the sorted codes; strings are only
+rendered for responses. IDs that do not round-trip through the encoding
+(e.g. leading zeros in a patient ID) go to a small fallback dict.
+
+Memory comparison:
+    python id_maps.py --patients 1000000 --concepts 1000000
+"""
+
+import argparse
+import time
+import tracemalloc
+
+import numpy as np
+
+ENCODE_CHUNK = 1 << 20
+
+PATIENT_FORMAT = {"prefix": "", "width": 0}
+CUI_FORMAT = {"prefix": "C", "width": 7}
+
+
+def encode(ids, prefix: str = "", width: int = 0):
+    """
+    Vectorized encoding of string IDs into int64 codes.
+
+    With width > 0 the digits after the prefix must have exactly that many
+    characters (CUIs); with width 0 they must have no leading zero (subject
+    IDs), so every accepted code renders back to the identical string.
+
+    Returns:
+        Tuple of (codes with -1 where not encodable, bool mask of encodable)
+    """
+    ids = np.asarray(ids)
+    if ids.dtype.kind != "U":
+        ids = ids.astype(str)
+    n = len(ids)
+    codes = np.full(n, -1, dtype=np.int64)
+    ok = np.zeros(n, dtype=bool)
+    columns = ids.dtype.itemsize // 4
+    if not n or not columns:
+        return codes, ok
+
+    p = len(prefix)
+    for start in range(0, n, ENCODE_CHUNK):
+        chunk = np.ascontiguousarray(ids[start:start + ENCODE_CHUNK])
+        chars = chunk.view(np.uint32).reshape(len(chunk), columns).astype(np.int64)
+        lengths = (chars != 0).sum(axis=1)
+        digits = lengths - p
+
+        valid = digits > 0
+        for i, char in enumerate(prefix):
+            valid &= (chars[:, i] == ord(char)) if i < columns else False
+        values = np.zeros(len(chunk), dtype=np.int64)
+        for col in range(p, columns):
+            inside = col < lengths
+            digit = chars[:, col] - 48
+            valid &= ~inside | ((digit >= 0) & (digit <= 9))
+            values = np.where(inside, values * 10 + digit, values)
+
+        if width:
+            valid &= digits == width
+        elif p < columns:
+            valid &= (digits <= 18) & ((digits == 1) | (chars[:, p] != 48))
+
+        codes[start:start + len(chunk)] = np.where(valid, values, -1)
+        ok[start:start + len(chunk)] = valid
+    return codes, ok
+
+
+class IdMap:
+    """
+    Bidirectional map between string IDs and embedding rows.
+
+    Args:
+        keys: Sorted int64 codes of all encodable IDs
+        key_rows: Row of each key
+        num_rows: Number of rows (embedding table size)
+        prefix, width: ID format (see encode)
+        extra: String ID -> row for IDs that do not encode
+        row_codes: Precomputed code of each row (e.g. memory-mapped from an
+            artifact); derived from keys / key_rows when not given
+    """
+
+    def __init__(self, keys: np.ndarray, key_rows: np.ndarray, num_rows: int,
+                 prefix: str = "", width: int = 0, extra: dict = None, row_codes: np.ndarray = None):
+        self.keys = keys
+        self.key_rows = key_rows
+        self.prefix = prefix
+        self.width = width
+        self.extra = extra or {}
+        self.extra_by_row = {row: id_ for id_, row in self.extra.items()}
+
+        # Code of each row, for rendering (-1 = no encodable ID)
+        if row_codes is not None and len(row_codes) == num_rows:
+            self.row_codes = row_codes
+        else:
+            self.row_codes = np.full(num_rows, -1, dtype=np.int64)
+            self.row_codes[np.asarray(key_rows)] = keys
+
+    @classmethod
+    def from_pairs(cls, ids, rows, num_rows: int, prefix: str = "", width: int = 0):
+        """Build from parallel arrays of string IDs and their rows."""
+        ids = np.asarray(ids)
+        if ids.dtype.kind != "U":
+            ids = ids.astype(str)
+        rows = np.asarray(rows, dtype=np.int64)
+        codes, ok = encode(ids, prefix, width)
+
+        order = np.argsort(codes[ok], kind="stable")
+        extra = {
+            str(ids[i]): int(rows[i])
+            for i in np.flatnonzero(~ok).tolist() if ids[i]
+        }
+        return cls(codes[ok][order], rows[ok][order], num_rows, prefix, width, extra)
+
+    @classmethod
+    def from_dict(cls, mapping: dict, num_rows: int, prefix: str = "", width: int = 0):
+        """Build from a {string ID: row} dict, as pickled in mappings.pt."""
+        ids = np.array(list(mapping.keys()), dtype=str)
+        rows = np.fromiter(mapping.values(), dtype=np.int64, count=len(mapping))
+        return cls.from_pairs(ids, rows, num_rows, prefix, width)
+
+    @classmethod
+    def from_row_ids(cls, row_ids, prefix: str = "", width: int = 0):
+        """Build from an array of IDs indexed by row ("" = row has no ID)."""
+        return cls.from_pairs(row_ids, np.arange(len(row_ids)), len(row_ids), prefix, width)
+
+    @classmethod
+    def from_sorted(cls, keys, key_rows, row_ids, prefix: str = "", width: int = 0, row_codes=None):
+        """
+        Reopen a map from its saved keys / key_rows (and optionally row_codes)
+        arrays, e.g. memory-mapped.
+
+        row_ids (IDs by row) is only read for rows without a key, to restore
+        the fallback dict.
+        """
+        id_map = cls(keys, key_rows, len(row_ids), prefix, width, row_codes=row_codes)
+        missing = np.flatnonzero(id_map.row_codes < 0)
+        if len(missing):
+            ids = np.asarray(row_ids)[missing]
+            if ids.dtype.kind != "U":
+                ids = ids.astype(str)
+            id_map.extra = {id_: int(row) for id_, row in zip(ids.tolist(), missing.tolist()) if id_}
+            id_map.extra_by_row = {row: id_ for id_, row in id_map.extra.items()}
+        return id_map
+
+    @classmethod
+    def sequential(cls, num_rows: int, prefix: str = "", width: int = 0):
+        """Row i has code i (the fallback when no mapping was exported)."""
+        rows = np.arange(num_rows, dtype=np.int64)
+        return cls(rows, rows.copy(), num_rows, prefix, width)
+
+    def __len__(self) -> int:
+        return len(self.keys) + len(self.extra)
+
+    def __contains__(self, id_) -> bool:
+        return self.get(id_) is not None
+
+    @property
+    def num_rows(self) -> int:
+        return len(self.row_codes)
+
+    @property
+    def nbytes(self) -> int:
+        return self.keys.nbytes + self.key_rows.nbytes + self.row_codes.nbytes
+
+    def _encode_one(self, id_: str):
+        if not id_.startswith(self.prefix):
+            return None
+        digits = id_[len(self.prefix):]
+        if not digits or not digits.isascii() or not digits.isdigit():
+            return None
+        if self.width:
+            return int(digits) if len(digits) == self.width else None
+        if len(digits) > 18 or (len(digits) > 1 and digits[0] == "0"):
+            return None
+        return int(digits)
+
+    def get(self, id_):
+        """Row of an ID, or None if unknown (surrounding whitespace is ignored)."""
+        id_ = str(id_).strip()
+        code = self._encode_one(id_)
+        if code is not None and len(self.keys):
+            pos = int(np.searchsorted(self.keys, code))
+            if pos < len(self.keys) and self.keys[pos] == code:
+                return int(self.key_rows[pos])
+        return self.extra.get(id_)
+
+    def lookup_many(self, ids) -> np.ndarray:
+        """Rows of many IDs at once, -1 where unknown."""
+        ids = np.asarray(ids)
+        if ids.dtype.kind != "U":
+            ids = ids.astype(str)
+        codes, ok = encode(ids, self.prefix, self.width)
+        rows = np.full(len(ids), -1, dtype=np.int64)
+        if len(self.keys):
+            pos = np.minimum(np.searchsorted(self.keys, codes), len(self.keys) - 1)
+            found = ok & (self.keys[pos] == codes)
+            rows[found] = self.key_rows[pos[found]]
+        if self.extra:
+            for i in np.flatnonzero(rows < 0).tolist():
+                rows[i] = self.extra.get(str(ids[i]), -1)
+        return rows
+
+    def ids_of(self, rows) -> list:
+        """String IDs of rows ("" for rows without one)."""
+        rows = np.asarray(rows, dtype=np.int64)
+        codes = self.row_codes[rows]
+        text = codes.astype(str)
+        if self.width:
+            text = np.char.zfill(text, self.width)
+        if self.prefix:
+            text = np.char.add(self.prefix, text)
+        ids = text.tolist()
+        for i in np.flatnonzero(codes < 0).tolist():
+            ids[i] = self.extra_by_row.get(int(rows[i]), "")
+        return ids
+
+    def id_of(self, row: int) -> str:
+        return self.ids_of([row])[0]
+
+    def sample(self, n: int) -> list:
+        """The IDs of the first n rows that have one."""
+        rows = np.flatnonzero(self.row_codes >= 0)[:n].tolist()
+        if len(rows) < n and self.extra:
+            rows = sorted(rows + list(self.extra_by_row))[:n]
+        return self.ids_of(rows)
+
+
+def _traced(build):
+    """(result, peak MB, retained MB, seconds) of building a structure."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = build()
+    seconds = time.perf_counter() - start
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, peak / 2**20, retained / 2**20, seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Memory of dict vs array-backed ID maps")
+    parser.add_argument("--patients", type=int, default=1000000)
+    parser.add_argument("--concepts", type=int, default=1000000)
+    args = parser.parse_args()
+
+    patient_ids = (10000000 + np.arange(args.patients)).astype(str)
+    cuis = np.char.add("C", np.char.zfill((np.arange(args.concepts) * 3).astype(str), 7))
+
+    cases = [
+        ("patients", patient_ids, PATIENT_FORMAT),
+        ("concepts", cuis, CUI_FORMAT),
+    ]
+    for name, ids, fmt in cases:
+        # The dict owns its key strings, as when unpickled from mappings.pt
+        lookup, _, dict_mb, dict_s = _traced(lambda: {id_: row for row, id_ in enumerate(ids.tolist())})
+        id_map, peak_mb, map_mb, map_s = _traced(lambda: IdMap.from_row_ids(ids, **fmt))
+        print(f"{name}: {len(ids)} IDs | dict {dict_mb:.1f} MB ({dict_s:.2f}s) | "
+              f"IdMap {map_mb:.1f} MB, peak {peak_mb:.1f} MB ({map_s:.2f}s)")
+
+        probe = ids[:: max(len(ids) // 10000, 1)].tolist()
+        start = time.perf_counter()
+        for id_ in probe:
+            lookup.get(id_)
+        dict_us = (time.perf_counter() - start) / len(probe) * 1e6
+        start = time.perf_counter()
+        for id_ in probe:
+            id_map.get(id_)
+        map_us = (time.perf_counter() - start) / len(probe) * 1e6
+        start = time.perf_counter()
+        id_map.lookup_many(probe)
+        batch_us = (time.perf_counter() - start) / len(probe) * 1e6
+        print(f"  lookup: dict {dict_us:.2f} us | IdMap.get {map_us:.2f} us | "
+              f"IdMap.lookup_many {batch_us:.3f} us per ID")
+        del lookup, id_map
+
+
+if __name__ == "__main__":
+    main()
@@ -3,9 +3,22 @@ Drug Recommendation Inference Module
 Uses pre-computed embeddings for fast inference without sparse dependencies
 """
 
+import hashlib
+import json
 import os
+import threading
+import time
+import numpy as np
 import torch
 
+import config
+import metrics
+from ann_index import IVFIndex, recall_vs_exact
+from artifacts import HEADER_NAME, is_artifact_dir, load_artifact
+from id_maps import CUI_FORMAT, PATIENT_FORMAT, IdMap
+from quantization import QUANTIZE_MODES, QuantizedMatrix, quantization_report
+from result_cache import RecommendationCache
+
 
 class DrugRecommender:
     """
@@ -13,11 +26,57 @@ class DrugRecommender:
     No model inference required - just embedding similarity.
     """
     
-    def __init__(self, embeddings_path: str, mappings_path: str):
+    def __init__(
+        self,
+        embeddings_path: str,
+        mappings_path: str = None,
+        search_mode: str = "exact",
+        ann_nlist: int = 0,
+        ann_nprobe: int = 8,
+        ann_index_path: str = None,
+        quantize: str = None,
+        rescore_k: int = 0,
+        cache_size: int = 0,
+        cache_ttl: float = 300.0,
+    ):
+        """
+        Args:
+            embeddings_path: Path to embeddings.pt, or to an exported
+                memory-mapped artifact directory (see artifacts.py)
+            mappings_path: Path to mappings.pt (unused for artifact directories)
+            search_mode: "exact" to score every drug, "ann" to use an IVF index
+            ann_nlist: Number of IVF lists when building the index (0 = auto)
+            ann_nprobe: Number of IVF lists scanned per query
+            ann_index_path: Prebuilt index file; built at load time if missing
+            quantize: Store embeddings as "int8" or "float16" instead of float32
+                (the ANN index then scans the compressed drug table too)
+            rescore_k: With quantize, re-score this many candidates against a
+                float32 copy of the drug table (0 = rank on the compressed
+                vectors only)
+            cache_size: Max patients in the result cache (0 = disabled)
+            cache_ttl: Seconds before a cached result expires (0 = never)
+        """
+        if search_mode not in ("exact", "ann"):
+            raise ValueError(f"Unknown search mode: {search_mode}")
+        if quantize and quantize not in QUANTIZE_MODES:
+            raise ValueError(f"Unknown quantization mode: {quantize}")
+        
         print("Loading pre-computed embeddings...")
         
-        # Load embeddings
-        embeddings = torch.load(embeddings_path, weights_only=False, map_location='cpu')
+        load_start = time.perf_counter()
+        if is_artifact_dir(embeddings_path):
+            # Zero-copy: tensors are views over memory-mapped files
+            print(f"Opening memory-mapped artifact: {embeddings_path}")
+            embeddings, self.mappings, self.version = load_artifact(embeddings_path)
+        else:
+            embeddings = torch.load(embeddings_path, weights_only=False, map_location='cpu')
+            
+            # Load mappings
+            print(f"Loading mappings from: {mappings_path}")
+            self.mappings = torch.load(mappings_path, weights_only=False, map_location='cpu')
+            self.version = pt_version(embeddings_path)
+        metrics.LOAD_SECONDS.observe(time.perf_counter() - load_start, artifact="embeddings")
+        
         self.patient_embeddings = embeddings['patient_embeddings']
         self.concept_embeddings = embeddings['concept_embeddings']
         self.drug_concept_indices = embeddings['drug_concept_indices']
@@ -30,48 +89,217 @@ class DrugRecommender:
         self.drug_embeddings = self.concept_embeddings[self.drug_concept_indices]
         print(f"Drug embeddings: {self.drug_embeddings.shape}")
         
-        # Load mappings
-        print(f"Loading mappings from: {mappings_path}")
-        self.mappings = torch.load(mappings_path, weights_only=False, map_location='cpu')
+        # Optional approximate index over drug embeddings
+        self.search_mode = search_mode
+        self.ann_nprobe = ann_nprobe
+        self.ann_index = None
+        if search_mode == "ann":
+            self._setup_ann_index(ann_nlist, ann_index_path)
+        
+        # Optional compressed storage
+        self.quantize = quantize
+        self.rescore_k = rescore_k
+        self.num_patients = self.patient_embeddings.size(0)
+        self.num_concepts = self.concept_embeddings.size(0)
+        self.patient_store = None
+        self.concept_store = None
+        self.drug_store = None
+        if quantize:
+            self._setup_quantized()
+        
+        # Per-patient result cache, keyed by artifact version
+        self.cache = RecommendationCache(max_entries=cache_size, ttl_seconds=cache_ttl)
         
         # Setup ID mappings
         self._setup_mappings()
-        print("DrugRecommender ready!")
+        print(f"DrugRecommender ready! (version {self.version})")
+    
+    def _setup_ann_index(self, nlist: int, index_path: str = None):
+        """Load a prebuilt IVF index, or build one from the drug embeddings."""
+        start = time.perf_counter()
+        if index_path and os.path.exists(index_path):
+            self.ann_index = IVFIndex.load(index_path, self.drug_embeddings)
+            print(f"Loaded ANN index from {index_path}")
+        else:
+            self.ann_index = IVFIndex.build(self.drug_embeddings, nlist=nlist)
+            if index_path:
+                self.ann_index.save(index_path)
+        elapsed = time.perf_counter() - start
+        metrics.LOAD_SECONDS.observe(elapsed, artifact="ann_index")
+        print(f"ANN index: {self.ann_index.nlist} lists, nprobe={self.ann_nprobe} "
+              f"({elapsed:.2f}s)")
+    
+    def _setup_quantized(self):
+        """
+        Build compressed tables and drop the float32 patient and concept
+        tables. Re-scoring only keeps the (small) float32 drug table.
+        """
+        start = time.perf_counter()
+        float_bytes = sum(
+            t.numel() * t.element_size()
+            for t in (self.patient_embeddings, self.concept_embeddings, self.drug_embeddings)
+        )
+        
+        self.patient_store = QuantizedMatrix.from_float(self.patient_embeddings, self.quantize)
+        self.concept_store = QuantizedMatrix.from_float(self.concept_embeddings, self.quantize)
+        self.drug_store = self.concept_store.take(self.drug_concept_indices)
+        quant_bytes = self.patient_store.nbytes + self.concept_store.nbytes + self.drug_store.nbytes
+        
+        # Rows are gathered from the compressed stores from now on
+        self.patient_embeddings = None
+        self.concept_embeddings = None
+        if self.rescore_k:
+            quant_bytes += self.drug_embeddings.numel() * self.drug_embeddings.element_size()
+        else:
+            self.drug_embeddings = None
+        if self.ann_index is not None:
+            # The index scans the same drug table the exact path would
+            self.ann_index.vectors = self.drug_embeddings if self.rescore_k else self.drug_store
+        
+        elapsed = time.perf_counter() - start
+        metrics.LOAD_SECONDS.observe(elapsed, artifact="quantized")
+        print(f"Quantized embeddings ({self.quantize}): {float_bytes / 2**20:.1f} MB -> "
+              f"{quant_bytes / 2**20:.1f} MB ({elapsed:.2f}s)")
     
     def _setup_mappings(self):
-        """Setup patient and drug ID mappings."""
+        """Setup patient and drug ID mappings as array-backed IdMaps."""
         # Patient ID to index mapping (MIMIC patient IDs like '10000032')
-        if 'pid_to_idx' in self.mappings:
-            self.patient_to_idx = self.mappings['pid_to_idx']
+        if 'patient_ids' in self.mappings:
+            self.patient_ids = self.mappings['patient_ids']
+        elif 'pid_to_idx' in self.mappings:
+            self.patient_ids = IdMap.from_dict(self.mappings['pid_to_idx'], self.num_patients, **PATIENT_FORMAT)
         elif 'patient_to_idx' in self.mappings:
-            self.patient_to_idx = self.mappings['patient_to_idx']
+            self.patient_ids = IdMap.from_dict(self.mappings['patient_to_idx'], self.num_patients, **PATIENT_FORMAT)
         else:
-            num_patients = self.patient_embeddings.size(0)
-            self.patient_to_idx = {str(i): i for i in range(num_patients)}
+            self.patient_ids = IdMap.sequential(self.num_patients, **PATIENT_FORMAT)
         
         # CUID to index mapping (CUIDs like 'C0000039')
-        if 'cui_to_idx' in self.mappings:
-            # Create reverse mapping: index -> CUID
-            self.idx_to_cuid = {v: k for k, v in self.mappings['cui_to_idx'].items()}
+        if 'concept_ids' in self.mappings:
+            self.concept_ids = self.mappings['concept_ids']
+        elif 'cui_to_idx' in self.mappings:
+            self.concept_ids = IdMap.from_dict(self.mappings['cui_to_idx'], self.num_concepts, **CUI_FORMAT)
         elif 'concept_to_idx' in self.mappings:
-            self.idx_to_cuid = {v: k for k, v in self.mappings['concept_to_idx'].items()}
+            self.concept_ids = IdMap.from_dict(self.mappings['concept_to_idx'], self.num_concepts, **CUI_FORMAT)
         elif 'idx_to_concept' in self.mappings:
-            self.idx_to_cuid = self.mappings['idx_to_concept']
+            idx_to_concept = self.mappings['idx_to_concept']
+            self.concept_ids = IdMap.from_pairs(
+                np.array(list(idx_to_concept.values()), dtype=str),
+                np.fromiter(idx_to_concept.keys(), dtype=np.int64, count=len(idx_to_concept)),
+                self.num_concepts,
+                **CUI_FORMAT,
+            )
         else:
-            self.idx_to_cuid = {i: f"C{i:07d}" for i in range(self.concept_embeddings.size(0))}
+            self.concept_ids = IdMap.sequential(self.num_concepts, **CUI_FORMAT)
+        # The pickled dicts are no longer needed
+        self.mappings = None
+        
+        # Drug-local lookup arrays so results are gathered, not looked up per item
+        self.drug_concept_idx = self.drug_concept_indices.numpy().astype(np.int64)
+        self.drug_cuis = np.array(self.concept_cuis(self.drug_concept_idx), dtype=object)
         
-        print(f"Patient mappings: {len(self.patient_to_idx)} patients")
-        print(f"Concept mappings: {len(self.idx_to_cuid)} concepts")
+        print(f"Patient mappings: {len(self.patient_ids)} patients "
+              f"({self.patient_ids.nbytes / 2**20:.1f} MB)")
+        print(f"Concept mappings: {len(self.concept_ids)} concepts "
+              f"({self.concept_ids.nbytes / 2**20:.1f} MB)")
         
         # Print sample mappings for verification
-        sample_patients = list(self.patient_to_idx.items())[:3]
-        sample_concepts = list(self.idx_to_cuid.items())[:3]
-        print(f"Sample patient IDs: {sample_patients}")
-        print(f"Sample concept CUIDs: {sample_concepts}")
+        print(f"Sample patient IDs: {self.patient_ids.sample(3)}")
+        print(f"Sample concept CUIDs: {self.concept_ids.sample(3)}")
+    
+    def concept_cuis(self, concept_idx) -> list:
+        """CUIs of concept rows; rows without one render as C<row>."""
+        concept_idx = np.asarray(concept_idx, dtype=np.int64)
+        cuis = self.concept_ids.ids_of(concept_idx)
+        for i, cui in enumerate(cuis):
+            if not cui:
+                cuis[i] = f"C{int(concept_idx[i]):07d}"
+        return cuis
     
     def get_sample_patients(self, n: int = 20) -> list:
         """Get sample patient IDs."""
-        return list(self.patient_to_idx.keys())[:n]
+        return self.patient_ids.sample(n)
+    
+    def resolve_patient_idx(self, patient_id: str):
+        """Map a patient ID to its embedding row, or None if unknown."""
+        return self.patient_ids.get(patient_id)
+    
+    def _not_found_error(self, patient_id: str) -> dict:
+        """Error dict for an unknown patient, with sample valid IDs."""
+        sample_ids = self.patient_ids.sample(10)
+        return {"error": f"Patient ID '{patient_id}' not found. Sample valid IDs: {sample_ids}"}
+    
+    def _build_recommendation_rows(self, topk_idx: torch.Tensor, topk_scores: torch.Tensor) -> list:
+        """
+        Turn a (batch, k) block of local drug indices and scores into
+        recommendation dicts, one list per row.
+        
+        CUIs, concept indices and rounded scores are gathered for the whole
+        block with NumPy; Python only zips the resulting lists.
+        """
+        idx = topk_idx.numpy()
+        valid = idx >= 0  # unfilled ANN slots are -1
+        safe_idx = np.where(valid, idx, 0)
+        cuids = self.drug_cuis[safe_idx].tolist()
+        concept_idx = self.drug_concept_idx[safe_idx].tolist()
+        scores = np.round(topk_scores.numpy().astype(np.float64), 4).tolist()
+        
+        rows = []
+        for row_valid, row_cuids, row_scores, row_concepts in zip(
+            valid.all(axis=1).tolist(), cuids, scores, concept_idx
+        ):
+            row = [
+                {"cuid": cuid, "score": score, "concept_idx": concept}
+                for cuid, score, concept in zip(row_cuids, row_scores, row_concepts)
+            ]
+            if not row_valid:
+                row = [rec for rec, ok in zip(row, valid[len(rows)].tolist()) if ok]
+            rows.append(row)
+        return rows
+    
+    def _patient_vectors(self, rows: torch.Tensor) -> torch.Tensor:
+        """Float32 (batch, dim) patient embeddings for the given rows."""
+        if self.patient_embeddings is not None:
+            return self.patient_embeddings[rows].float()
+        return self.patient_store.dequantize(rows)
+    
+    def _concept_vectors(self, rows: torch.Tensor) -> torch.Tensor:
+        """Float32 (n, dim) concept embeddings for the given rows."""
+        if self.concept_embeddings is not None:
+            return self.concept_embeddings[rows].float()
+        return self.concept_store.dequantize(rows)
+    
+    def _score_topk(self, patient_embs: torch.Tensor, top_k: int):
+        """
+        Top-k drugs for a (batch, dim) block of patient embeddings.
+        
+        Returns:
+            Tuple of (scores, local drug indices), each (batch, k)
+        """
+        if self.ann_index is not None:
+            with metrics.stage("ann_search"):
+                return self.ann_index.search(patient_embs, top_k, nprobe=self.ann_nprobe)
+        
+        if self.drug_store is not None:
+            # Candidates from the compressed drug table
+            shortlist = max(top_k, self.rescore_k)
+            with metrics.stage("matmul"):
+                scores = self.drug_store.matmul(patient_embs)
+            with metrics.stage("topk"):
+                topk_scores, topk_idx = torch.topk(scores, min(shortlist, scores.size(1)), dim=1)
+            if not self.rescore_k:
+                return topk_scores, topk_idx
+            
+            # Exact float32 re-scoring of the shortlist
+            with metrics.stage("rescore"):
+                exact = torch.einsum('bsd,bd->bs', self.drug_embeddings[topk_idx].float(), patient_embs)
+                exact_scores, pos = torch.topk(exact, min(top_k, exact.size(1)), dim=1)
+                return exact_scores, torch.gather(topk_idx, 1, pos)
+        
+        # (batch, dim) x (dim, num_drugs) -> (batch, num_drugs)
+        with metrics.stage("matmul"):
+            scores = torch.matmul(patient_embs, self.drug_embeddings.T)
+        with metrics.stage("topk"):
+            return torch.topk(scores, min(top_k, scores.size(1)), dim=1)
     
     @torch.no_grad()
     def recommend(self, patient_id: str, top_k: int = 5) -> list:
@@ -85,59 +313,264 @@ class DrugRecommender:
         Returns:
             List of dicts with drug CUID and score
         """
-        # Get patient index
-        if patient_id in self.patient_to_idx:
-            patient_idx = self.patient_to_idx[patient_id]
-        else:
-            # Try different formats
-            patient_id_str = str(patient_id).strip()
-            if patient_id_str in self.patient_to_idx:
-                patient_idx = self.patient_to_idx[patient_id_str]
-            else:
-                # Return list of valid sample patient IDs in error message
-                sample_ids = list(self.patient_to_idx.keys())[:10]
-                return {"error": f"Patient ID '{patient_id}' not found. Sample valid IDs: {sample_ids}"}
+        with metrics.stage("id_lookup"):
+            patient_idx = self.resolve_patient_idx(patient_id)
+        if patient_idx is None:
+            metrics.RECOMMENDATIONS.inc(result="not_found")
+            # Return list of valid sample patient IDs in error message
+            return self._not_found_error(patient_id)
+        
+        cached = self.cache.get(self.version, patient_idx, top_k)
+        if cached is not None:
+            metrics.RECOMMENDATIONS.inc(result="cache_hit")
+            return cached
+        metrics.RECOMMENDATIONS.inc(result="computed")
+        metrics.BATCH_SIZE.observe(1, source="single")
         
         # Get patient embedding
-        patient_emb = self.patient_embeddings[patient_idx]
-        
-        # Calculate similarity scores with all drugs (dot product)
-        scores = torch.matmul(self.drug_embeddings, patient_emb)
-        
-        # Get top-k
-        topk_scores, topk_idx = torch.topk(scores, min(top_k, scores.size(0)))
-        
-        # Build recommendations
-        recommendations = []
-        for i, (idx, score) in enumerate(zip(topk_idx.tolist(), topk_scores.tolist())):
-            # Map local drug index to global concept index
-            concept_idx = self.drug_concept_indices[idx].item()
-            cuid = self.idx_to_cuid.get(concept_idx, f"C{concept_idx:07d}")
-            recommendations.append({
-                "cuid": str(cuid),
-                "score": round(float(score), 4),
-                "concept_idx": concept_idx
-            })
+        with metrics.stage("embedding_gather"):
+            patient_emb = self._patient_vectors(torch.tensor([patient_idx], dtype=torch.long))
+        
+        # Score against all drugs (dot product) and take top-k
+        topk_scores, topk_idx = self._score_topk(patient_emb, top_k)
         
+        with metrics.stage("build_rows"):
+            recommendations = self._build_recommendation_rows(topk_idx, topk_scores)[0]
+        self.cache.put(self.version, patient_idx, top_k, recommendations)
         return recommendations
+    
+    @torch.no_grad()
+    def recommend_batch(self, patient_ids: list, top_k: int = 5) -> list:
+        """
+        Recommend top-k drugs for many patients in one scoring pass.
+        
+        Known patients are gathered into a single (batch, dim) matrix and
+        scored against all drugs with one matrix-matrix product and a
+        batched top-k.
+        
+        Args:
+            patient_ids: List of patient identifiers
+            top_k: Number of recommendations per patient
+            
+        Returns:
+            List aligned with patient_ids; each entry is either a list of
+            recommendation dicts or an error dict for an unknown patient
+        """
+        results = [None] * len(patient_ids)
+        rows, positions = [], []
+        with metrics.stage("id_lookup"):
+            patient_idxs = [self.resolve_patient_idx(patient_id) for patient_id in patient_ids]
+        for pos, (patient_id, patient_idx) in enumerate(zip(patient_ids, patient_idxs)):
+            if patient_idx is None:
+                results[pos] = self._not_found_error(patient_id)
+                continue
+            cached = self.cache.get(self.version, patient_idx, top_k)
+            if cached is not None:
+                results[pos] = cached
+            else:
+                rows.append(patient_idx)
+                positions.append(pos)
+        
+        not_found = sum(idx is None for idx in patient_idxs)
+        metrics.RECOMMENDATIONS.inc(not_found, result="not_found")
+        metrics.RECOMMENDATIONS.inc(len(patient_ids) - not_found - len(rows), result="cache_hit")
+        metrics.RECOMMENDATIONS.inc(len(rows), result="computed")
+        
+        if rows:
+            metrics.BATCH_SIZE.observe(len(rows), source="batch")
+            with metrics.stage("embedding_gather"):
+                patient_embs = self._patient_vectors(torch.tensor(rows, dtype=torch.long))
+            topk_scores, topk_idx = self._score_topk(patient_embs, top_k)
+            
+            with metrics.stage("build_rows"):
+                built = self._build_recommendation_rows(topk_idx, topk_scores)
+            for pos, patient_idx, recommendations in zip(positions, rows, built):
+                results[pos] = recommendations
+                self.cache.put(self.version, patient_idx, top_k, recommendations)
+        
+        return results
+    
+    @torch.no_grad()
+    def recommend_from_concepts(self, cuis: list, top_k: int = 5, weights: list = None) -> list:
+        """
+        Cold-start recommendations for a patient without an embedding.
+        
+        The patient vector is the (weighted) mean of the concept embeddings of
+        their diagnosis CUIs, scored against the drugs like any other patient.
+        Repeated CUIs count once per occurrence unless weights are given.
+        
+        Args:
+            cuis: Diagnosis CUIs (e.g. ['C0011849', 'C0020538'])
+            top_k: Number of recommendations
+            weights: Optional per-CUI weights, aligned with cuis
+            
+        Returns:
+            List of dicts with drug CUID and score, or an error dict when none
+            of the CUIs has a concept embedding
+        """
+        if weights is None:
+            weights = [1.0] * len(cuis)
+        elif len(weights) != len(cuis):
+            raise ValueError(f"Got {len(weights)} weights for {len(cuis)} CUIs")
+        elif not valid_weights(weights):
+            raise ValueError("Weights must be finite, non-negative and sum to more than 0")
+        rows = self.concept_ids.lookup_many(cuis) if cuis else np.empty(0, dtype=np.int64)
+        known = rows >= 0
+        rows = rows[known]
+        row_weights = np.asarray(weights, dtype=np.float32)[known]
+        
+        if not len(rows) or row_weights.sum() <= 0:
+            return {"error": f"None of the {len(cuis)} CUIs with a positive weight have concept embeddings"}
+        
+        concept_embs = self._concept_vectors(torch.from_numpy(rows))
+        w = torch.from_numpy(row_weights).unsqueeze(1)
+        patient_emb = (concept_embs * w).sum(dim=0, keepdim=True) / w.sum()
+        
+        return self.recommend_for_vector(patient_emb, top_k)
+    
+    @torch.no_grad()
+    def recommend_for_vector(self, patient_emb: torch.Tensor, top_k: int = 5) -> list:
+        """
+        Recommend top-k drugs for an externally computed patient vector
+        (cold start, live HGT encoding).
+        
+        Args:
+            patient_emb: (dim,) or (1, dim) patient embedding
+            top_k: Number of recommendations
+        """
+        patient_emb = patient_emb.reshape(1, -1).float()
+        topk_scores, topk_idx = self._score_topk(patient_emb, top_k)
+        return self._build_recommendation_rows(topk_idx, topk_scores)[0]
+    
+    def ann_recall(self, sample_size: int = 1000, top_k: int = 10, nprobe: int = None) -> dict:
+        """
+        Recall of the ANN index against exact search on sampled patients.
+        
+        Args:
+            sample_size: Number of patients to sample
+            top_k: Cut-off for recall
+            nprobe: Lists scanned per query (defaults to the configured value)
+            
+        Returns:
+            Dict with recall@k and per-query latency of both paths
+        """
+        drug_vectors = self.drug_embeddings if self.drug_embeddings is not None else self.drug_store.dequantize()
+        index = self.ann_index or IVFIndex.build(drug_vectors)
+        n = min(sample_size, self.num_patients)
+        sample = torch.randperm(self.num_patients)[:n]
+        return recall_vs_exact(index, self._patient_vectors(sample), k=top_k,
+                               nprobe=nprobe or self.ann_nprobe)
+    
+    def quantization_report(self, sample_size: int = 1000, top_k: int = 10) -> dict:
+        """
+        Memory saved and top-k agreement of the configured quantized path.
+        
+        Requires the float32 tables, i.e. a recommender loaded without quantize.
+        """
+        if self.patient_embeddings is None:
+            raise ValueError("Float32 embeddings were released; load without quantize to compare")
+        return quantization_report(
+            self.patient_embeddings,
+            self.drug_embeddings,
+            self.quantize or "int8",
+            top_k=top_k,
+            rescore_k=self.rescore_k,
+            sample_size=sample_size,
+        )
+
+
+def valid_weights(weights: list) -> bool:
+    """Whether cold-start CUI weights are finite, non-negative and sum to more than 0."""
+    values = np.asarray(weights, dtype=np.float64)
+    return bool(np.isfinite(values).all() and (values >= 0).all() and values.sum() > 0)
+
+
+def default_model_paths():
+    """
+    (embeddings_path, mappings_path) from DRUG_REC_MODEL_PATH, else under
+    model/, preferring the memory-mapped artifact when it has been exported.
+    """
+    if config.MODEL_PATH:
+        if is_artifact_dir(config.MODEL_PATH):
+            return config.MODEL_PATH, None
+        return config.MODEL_PATH, os.path.join(os.path.dirname(config.MODEL_PATH), "mappings.pt")
+    base_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    artifact_path = os.path.join(base_path, "model", "artifact")
+    if is_artifact_dir(artifact_path):
+        return artifact_path, None
+    return os.path.join(base_path, "model", "embeddings.pt"), os.path.join(base_path, "model", "mappings.pt")
+
+
+def pt_version(embeddings_path: str) -> str:
+    """
+    Version of an embeddings.pt: its resolved path, size and modification
+    time in ns, so two files written in the same second still differ.
+    """
+    real_path = os.path.realpath(embeddings_path)
+    stat = os.stat(real_path)
+    path_hash = hashlib.sha1(real_path.encode()).hexdigest()[:8]
+    return f"pt-{stat.st_mtime_ns}-{stat.st_size}-{path_hash}"
+
+
+def source_version(embeddings_path: str):
+    """
+    Version a recommender loaded from this path would report, without
+    loading it (None if nothing is there yet).
+    """
+    if is_artifact_dir(embeddings_path):
+        try:
+            with open(os.path.join(embeddings_path, HEADER_NAME)) as f:
+                return json.load(f).get("version")
+        except (OSError, ValueError):
+            return None
+    if os.path.isfile(embeddings_path):
+        return pt_version(embeddings_path)
+    return None
+
+
+def load_recommender(embeddings_path: str = None, mappings_path: str = None,
+                     ann_index_path: str = config.ANN_INDEX_PATH) -> DrugRecommender:
+    """
+    Build a DrugRecommender with the configured search, quantization and
+    cache settings.
+    
+    Args:
+        embeddings_path: Artifact directory or embeddings.pt (default: model/)
+        mappings_path: mappings.pt next to embeddings.pt if not given
+        ann_index_path: Prebuilt IVF index to load (None = build in memory)
+    """
+    if embeddings_path is None:
+        embeddings_path, mappings_path = default_model_paths()
+    elif mappings_path is None and not is_artifact_dir(embeddings_path):
+        mappings_path = os.path.join(os.path.dirname(embeddings_path), "mappings.pt")
+    
+    print(f"Embeddings path: {embeddings_path}")
+    print(f"Mappings path: {mappings_path}")
+    
+    return DrugRecommender(
+        embeddings_path,
+        mappings_path,
+        search_mode=config.SEARCH_MODE,
+        ann_nlist=config.ANN_NLIST,
+        ann_nprobe=config.ANN_NPROBE,
+        ann_index_path=ann_index_path,
+        quantize=config.QUANTIZE,
+        rescore_k=config.RESCORE_K,
+        cache_size=config.CACHE_SIZE,
+        cache_ttl=config.CACHE_TTL,
+    )
 
 
 # Singleton instance
 _recommender = None
+_recommender_lock = threading.Lock()
 
 
 def get_recommender():
-    """Get or create the recommender singleton."""
+    """Get or create the recommender singleton (loaded once under a lock)."""
     global _recommender
     if _recommender is None:
-        base_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-        embeddings_path = os.path.join(base_path, "model", "embeddings.pt")
-        mappings_path = os.path.join(base_path, "model", "mappings.pt")
-        
-        print(f"Base path: {base_path}")
-        print(f"Embeddings path: {embeddings_path}")
-        print(f"Mappings path: {mappings_path}")
-        
-        _recommender = DrugRecommender(embeddings_path, mappings_path)
-    
+        with _recommender_lock:
+            if _recommender is None:
+                _recommender = load_recommender()
     return _recommender
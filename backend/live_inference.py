@@ -0,0 +1,186 @@
+"""
+Live HGT Inference
+Runs the HGT encoder on a patient's sampled 2-hop neighbourhood at request time
+
+Frozen embeddings go stale as prescriptions accumulate; this path re-encodes
+the patient from the current graph instead. Neighbour sampling is done in
+plain PyTorch over per-edge-type CSC arrays (no torch-sparse / pyg-lib), and
+two caches keep repeated and overlapping patients cheap:
+
+    - sampled subgraphs, LRU by patient index
+    - per-node input projections (encoder.lin_dict), which depend only on the
+      node's own features and so are shared by every subgraph the node is in
+
+The resulting patient vector is scored against the recommender's drug table,
+so live mode still covers the whole drug vocabulary.
+"""
+
+import threading
+from collections import OrderedDict
+
+import torch
+
+from model import HGTLinkPredictor
+
+
+class NeighbourSampler:
+    """Uniform fan-out neighbour sampling over a HeteroData graph."""
+
+    def __init__(self, data, num_neighbors: list, seed: int = 0):
+        self.num_neighbors = num_neighbors
+        self.seed = seed
+
+        # CSC per edge type: incoming neighbours of each destination node
+        self.csc = {}
+        for edge_type in data.edge_types:
+            src_type, _, dst_type = edge_type
+            src, dst = data[edge_type].edge_index
+            order = torch.argsort(dst, stable=True)
+            counts = torch.bincount(dst, minlength=data[dst_type].num_nodes)
+            rowptr = torch.zeros(counts.numel() + 1, dtype=torch.long)
+            rowptr[1:] = torch.cumsum(counts, 0)
+            self.csc[edge_type] = (rowptr, src[order])
+
+    def sample(self, node_type: str, node_idx: int):
+        """
+        Sample the multi-hop neighbourhood of one seed node.
+
+        Returns:
+            Tuple of (n_id_dict, edge_index_dict): global node ids per type
+            (seed first) and local edge indices per edge type
+        """
+        # Own generator per call: samples run on several threads at once,
+        # and the same seed node always gets the same subgraph
+        generator = torch.Generator().manual_seed(self.seed * 1_000_003 + node_idx)
+        n_ids = {node_type: [node_idx]}
+        local = {node_type: {node_idx: 0}}
+        edges = {}
+        frontier = {node_type: [node_idx]}
+
+        for fanout in self.num_neighbors:
+            next_frontier = {}
+            for edge_type, (rowptr, col) in self.csc.items():
+                src_type, _, dst_type = edge_type
+                for dst in frontier.get(dst_type, []):
+                    start, end = rowptr[dst].item(), rowptr[dst + 1].item()
+                    if start == end:
+                        continue
+                    neighbours = col[start:end]
+                    if end - start > fanout:
+                        pick = torch.randperm(end - start, generator=generator)[:fanout]
+                        neighbours = neighbours[pick]
+
+                    src_local = local.setdefault(src_type, {})
+                    src_ids = n_ids.setdefault(src_type, [])
+                    for src in neighbours.tolist():
+                        if src not in src_local:
+                            src_local[src] = len(src_ids)
+                            src_ids.append(src)
+                            next_frontier.setdefault(src_type, []).append(src)
+                        edges.setdefault(edge_type, []).append((src_local[src], local[dst_type][dst]))
+            frontier = next_frontier
+
+        n_id_dict = {nt: torch.tensor(ids, dtype=torch.long) for nt, ids in n_ids.items()}
+        edge_index_dict = {
+            et: torch.tensor(pairs, dtype=torch.long).T.contiguous()
+            for et, pairs in edges.items()
+        }
+        return n_id_dict, edge_index_dict
+
+
+class LiveRecommender:
+    """
+    On-demand patient encoder built from HGTLinkPredictor.
+
+    Args:
+        graph_path: HeteroData graph saved by the training notebook
+        checkpoint_path: Checkpoint with model_state_dict and hidden_channels
+        num_neighbors: Fan-out per hop, as in recommend_drugs_for_patient_safe
+        subgraph_cache_size: Patients whose sampled subgraph is kept
+    """
+
+    def __init__(self, graph_path: str, checkpoint_path: str, num_neighbors: list = None,
+                 subgraph_cache_size: int = 1024):
+        print(f"Loading graph for live inference: {graph_path}")
+        self.data = torch.load(graph_path, weights_only=False, map_location='cpu')
+        # String fields break HGTConv, as in training
+        for node_type in self.data.node_types:
+            if 'node_id' in self.data[node_type]:
+                del self.data[node_type].node_id
+
+        checkpoint = torch.load(checkpoint_path, weights_only=False, map_location='cpu')
+        self.model = HGTLinkPredictor(
+            hidden_channels=checkpoint.get("hidden_channels", 64),
+            metadata=self.data.metadata(),
+            data=self.data,
+        )
+        self.model.load_state_dict(checkpoint["model_state_dict"])
+        self.model.eval()
+
+        self.sampler = NeighbourSampler(self.data, num_neighbors or [10, 5])
+        self.subgraph_cache_size = subgraph_cache_size
+        self._subgraphs = OrderedDict()
+        self._projections = {}  # node type -> (cache tensor, filled mask)
+        self._lock = threading.Lock()
+        self.subgraph_hits = 0
+        self.subgraph_misses = 0
+        print(f"Live HGT encoder ready (fan-out {self.sampler.num_neighbors})")
+
+    def _subgraph(self, patient_idx: int):
+        with self._lock:
+            cached = self._subgraphs.get(patient_idx)
+            if cached is not None:
+                self._subgraphs.move_to_end(patient_idx)
+                self.subgraph_hits += 1
+                return cached
+            self.subgraph_misses += 1
+
+        subgraph = self.sampler.sample('patient', patient_idx)
+        with self._lock:
+            self._subgraphs[patient_idx] = subgraph
+            while len(self._subgraphs) > self.subgraph_cache_size:
+                self._subgraphs.popitem(last=False)
+        return subgraph
+
+    def _project(self, node_type: str, n_id: torch.Tensor) -> torch.Tensor:
+        """Input projection of the given nodes, computing only uncached rows."""
+        with self._lock:
+            if node_type not in self._projections:
+                hidden = self.model.encoder.lin_dict[node_type].out_features
+                num_nodes = self.data[node_type].num_nodes
+                self._projections[node_type] = (
+                    torch.empty(num_nodes, hidden),
+                    torch.zeros(num_nodes, dtype=torch.bool),
+                )
+            cache, filled = self._projections[node_type]
+            missing = n_id[~filled[n_id]]
+
+        if missing.numel() > 0:
+            projected = self.model.encoder.lin_dict[node_type](self.data[node_type].x[missing])
+            with self._lock:
+                cache[missing] = projected
+                filled[missing] = True
+        return cache[n_id]
+
+    @torch.no_grad()
+    def patient_embedding(self, patient_idx: int) -> torch.Tensor:
+        """Fresh (1, hidden) embedding of a patient from its current neighbourhood."""
+        n_id_dict, edge_index_dict = self._subgraph(patient_idx)
+
+        x_dict = {nt: self._project(nt, n_id) for nt, n_id in n_id_dict.items()}
+        for conv in self.model.encoder.convs:
+            x_dict = conv(x_dict, edge_index_dict)
+
+        # The seed patient is always local node 0
+        return x_dict['patient'][:1]
+
+    def stats(self) -> dict:
+        with self._lock:
+            projected = {nt: int(filled.sum().item()) for nt, (_, filled) in self._projections.items()}
+            return {
+                "subgraph_cache_entries": len(self._subgraphs),
+                "subgraph_hits": self.subgraph_hits,
+                "subgraph_misses": self.subgraph_misses,
+                "projected_nodes": projected,
+            }
+
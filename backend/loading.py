@@ -0,0 +1,155 @@
+"""
+Single-Flight Loading
+Serving components loaded once, warmed up at startup, with readiness state
+
+Each heavy table (recommender, diagnosis store, UMLS tables, live model) is
+a Component. The first caller loads it under a lock; callers arriving while
+the load runs wait for that same load instead of starting another.
+warm_up() loads a list of components on a background thread when the app
+starts, and readiness() reports whether every required one has finished,
+for a load balancer to poll.
+"""
+
+import threading
+import time
+
+import metrics
+
+# Loaded (possibly with a fallback) and able to serve
+SERVING_STATES = ("ready", "degraded")
+
+
+class Component:
+    """
+    A lazily loaded, single-flight serving component.
+
+    Args:
+        name: Name in readiness output and the load-time histogram
+        load: Zero-argument function returning the loaded object
+        warm: Optional function run on the loaded object (e.g. a dummy
+            query) before it is marked ready; failures are only reported
+        fallback: Optional zero-argument function giving a stand-in when
+            load fails (state "degraded"); without one the error is raised
+            and the next get() tries again
+        required: Whether readiness waits for this component
+        retry_interval: Seconds after a failed load (without fallback)
+            during which get() re-raises that failure instead of loading again
+    """
+
+    def __init__(self, name: str, load, warm=None, fallback=None, required: bool = False,
+                 retry_interval: float = 0.0):
+        self.name = name
+        self.load = load
+        self.warm = warm
+        self.fallback = fallback
+        self.required = required
+        self.retry_interval = retry_interval
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._value = None
+        self.state = "pending"
+        self.error = None
+        self.started_at = None
+        self.failed_at = None
+        self.load_seconds = None
+        self.warm_seconds = None
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    def peek(self):
+        """The loaded object, or None without triggering a load."""
+        return self._value if self._loaded else None
+
+    def get(self):
+        """The loaded object, loading it first if no one has yet."""
+        if self._loaded:
+            return self._value
+        requested_at = time.time()
+        with self._lock:
+            if not self._loaded:
+                # Callers that waited on a load which just failed, or that come
+                # within retry_interval of it, get its error instead of a new load
+                if self.state == "failed" and self.failed_at >= requested_at - self.retry_interval:
+                    raise RuntimeError(f"{self.name} failed to load: {self.error}")
+                self._load()
+        return self._value
+
+    def retry_in(self) -> float:
+        """Seconds until a failed component may be loaded again (0 = now)."""
+        if self.state != "failed":
+            return 0.0
+        return max(0.0, self.failed_at + self.retry_interval - time.time())
+
+    def _load(self):
+        self.state = "loading"
+        self.error = None
+        self.started_at = time.time()
+        start = time.perf_counter()
+        try:
+            value = self.load()
+        except Exception as e:
+            self.load_seconds = round(time.perf_counter() - start, 3)
+            self.error = str(e)
+            if self.fallback is None:
+                self.state = "failed"
+                self.failed_at = time.time()
+                raise
+            print(f"Error loading {self.name}: {e}")
+            self._value = self.fallback()
+            self._loaded = True
+            self.state = "degraded"
+            return
+        self.load_seconds = round(time.perf_counter() - start, 3)
+        metrics.LOAD_SECONDS.observe(self.load_seconds, artifact=self.name)
+
+        if self.warm is not None and value is not None:
+            start = time.perf_counter()
+            try:
+                self.warm(value)
+            except Exception as e:
+                print(f"Warm-up of {self.name} failed: {e}")
+                self.error = f"warm-up: {e}"
+            self.warm_seconds = round(time.perf_counter() - start, 3)
+
+        self._value = value
+        self._loaded = True
+        self.state = "ready"
+
+    def status(self) -> dict:
+        return {
+            "state": self.state,
+            "required": self.required,
+            "started_at": self.started_at,
+            "failed_at": self.failed_at,
+            "load_seconds": self.load_seconds,
+            "warm_seconds": self.warm_seconds,
+            "error": self.error,
+        }
+
+
+def warm_up(components: list) -> threading.Thread:
+    """Load components one after another on a background thread."""
+
+    def run():
+        start = time.perf_counter()
+        for component in components:
+            try:
+                component.get()
+            except Exception as e:
+                print(f"Warm-up could not load {component.name}: {e}")
+        print(f"Warm-up finished in {time.perf_counter() - start:.2f}s: "
+              + ", ".join(f"{c.name}={c.state}" for c in components))
+
+    thread = threading.Thread(target=run, name="warm-up", daemon=True)
+    thread.start()
+    return thread
+
+
+def readiness(components: list) -> dict:
+    """Per-component state, and ready = every required component can serve."""
+    return {
+        "ready": all(c.state in SERVING_STATES for c in components if c.required),
+        "components": {c.name: c.status() for c in components},
+    }
@@ -3,18 +3,48 @@ FastAPI Backend for Drug Recommendation System
 Uses pre-computed embeddings for fast inference
 """
 
-from fastapi import FastAPI, HTTPException
+import asyncio
+import contextlib
+import hmac
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import JSONResponse, PlainTextResponse
+from pydantic import BaseModel, Field
 from typing import List, Optional
 import uvicorn
-import pandas as pd
-from pathlib import Path
+
+import config
+import metrics
+from batching import MicroBatcher
+from concept_graph import ConceptGraph, load_concept_graph
+from concept_search import ConceptSearchIndex
+from concepts import ConceptTable, load_concept_table
+from diagnoses import DiagnosisIndex, load_diagnosis_index
+from inference import valid_weights
+from loading import Component, readiness, warm_up
+from reloader import ModelSlot, warm_recommender
+
+@contextlib.asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start loading and warming components in the background; /api/ready tracks progress."""
+    names = [name for name in config.WARMUP if name in _components]
+    unknown = sorted(set(config.WARMUP) - set(names))
+    if unknown:
+        print(f"Ignoring unknown warm-up components: {', '.join(unknown)}")
+    if names:
+        warm_up([_components[name] for name in names])
+    yield
+
 
 app = FastAPI(
     title="Drug Recommendation API",
     description="HGT-based drug recommendation system",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
 )
 
 # CORS middleware for Next.js frontend
@@ -27,21 +57,121 @@ app.add_middleware(
 )
 
 
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    """Per-route latency histogram (route templates keep label cardinality bounded)."""
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        metrics.REQUEST_SECONDS.observe(
+            time.perf_counter() - start,
+            method=request.method,
+            route=getattr(route, "path", "unmatched"),
+            status=status,
+        )
+
+
+# Probes answer without waiting for components to load
+UNGATED_PATHS = {"/api/health", "/api/ready", "/metrics"}
+LOCAL_HOSTS = {"127.0.0.1", "::1"}
+
+
+@app.middleware("http")
+async def wait_for_required_components(request: Request, call_next):
+    """
+    Requests that arrive before the required components have loaded wait
+    for that (single) load on a worker thread, so the event loop keeps
+    answering probes meanwhile. A component that failed to load answers 503
+    until its retry interval has passed; the next request then retries the
+    load, again on a worker thread.
+    """
+    if request.url.path not in UNGATED_PATHS:
+        for component in _components.values():
+            if not component.required or component.loaded:
+                continue
+            try:
+                await asyncio.to_thread(component.get)
+            except Exception as e:
+                return JSONResponse(
+                    {"detail": f"Service unavailable: {e}"}, status_code=503,
+                    headers={"Retry-After": str(max(1, round(component.retry_in())))},
+                )
+    return await call_next(request)
+
+
 # Request/Response models
 class RecommendRequest(BaseModel):
     patient_id: str
-    top_k: Optional[int] = 5
+    top_k: Optional[int] = Field(5, ge=1, le=config.MAX_TOP_K)
+    live: Optional[bool] = None  # None = DRUG_REC_LIVE_MODE
 
 
 class DrugRecommendation(BaseModel):
     cuid: str
     score: float
     concept_idx: int
+    name: Optional[str] = None            # only with expand=names
+    semantic_types: Optional[str] = None  # only with expand=names
 
 
 class RecommendResponse(BaseModel):
     patient_id: str
     recommendations: List[DrugRecommendation]
+    cold_start: bool = False
+    live: bool = False
+    version: Optional[str] = None  # model version that scored the request
+
+
+class ColdStartRequest(BaseModel):
+    cuis: List[str]
+    top_k: Optional[int] = Field(5, ge=1, le=config.MAX_TOP_K)
+    weights: Optional[List[float]] = None
+
+
+class BatchRecommendRequest(BaseModel):
+    patient_ids: List[str] = Field(..., max_length=config.MAX_BATCH_PATIENTS)
+    top_k: Optional[int] = Field(5, ge=1, le=config.MAX_TOP_K)
+
+
+class BatchRecommendItem(BaseModel):
+    patient_id: str
+    recommendations: List[DrugRecommendation] = []
+    cold_start: bool = False
+    error: Optional[str] = None
+
+
+class BatchRecommendResponse(BaseModel):
+    results: List[BatchRecommendItem]
+    version: Optional[str] = None
+
+
+class ReloadRequest(BaseModel):
+    path: Optional[str] = None           # artifact dir or embeddings.pt (default: current source)
+    mappings_path: Optional[str] = None  # mappings.pt, for embeddings.pt sources
+    force: Optional[bool] = False
+    wait: Optional[bool] = False
+
+
+class CuiBatchRequest(BaseModel):
+    cuis: List[str]
+
+
+class GraphNeighbourhoodRequest(BaseModel):
+    cuis: List[str]
+    hops: int = Field(1, ge=1, le=config.GRAPH_MAX_HOPS)
+    relations: Optional[List[str]] = None
+    direction: Optional[str] = "both"
+    max_nodes: int = Field(500, ge=1, le=config.GRAPH_MAX_NODES)
+
+
+class GraphSubgraphRequest(BaseModel):
+    cuis: List[str]
+    relations: Optional[List[str]] = None
 
 
 class DiagnosisItem(BaseModel):
@@ -49,6 +179,8 @@ class DiagnosisItem(BaseModel):
     icd_version: int
     cui: str
     hadm_id: str
+    name: Optional[str] = None            # only with expand=names (unset fields are left out)
+    semantic_types: Optional[str] = None  # only with expand=names
 
 
 class DiagnosesResponse(BaseModel):
@@ -56,61 +188,370 @@ class DiagnosesResponse(BaseModel):
     diagnoses: List[DiagnosisItem]
 
 
-# Lazy load recommender and diagnosis data
-_recommender = None
-_diagnosis_df = None
+class BulkDiagnosesRequest(BaseModel):
+    patient_ids: List[str]
+    top_k: Optional[int] = 10
+
+
+class BulkDiagnosesItem(BaseModel):
+    patient_id: str
+    diagnoses: List[DiagnosisItem] = []
+    error: Optional[str] = None
+
+
+class BulkDiagnosesResponse(BaseModel):
+    results: List[BulkDiagnosesItem]
+
+
+def _load_live_recommender():
+    from live_inference import LiveRecommender
+    return LiveRecommender(
+        config.GRAPH_PATH,
+        config.HGT_CHECKPOINT,
+        num_neighbors=config.LIVE_NUM_NEIGHBORS,
+        subgraph_cache_size=config.LIVE_SUBGRAPH_CACHE,
+    )
+
+
+def _build_concept_search():
+    search = ConceptSearchIndex(get_concept_table())
+    print(f"Built search index over {len(search.table)} UMLS concepts")
+    return search
+
+
+def _warm_recommender(recommender):
+    warm_recommender(recommender, batch_sizes=(1, max(config.BATCH_MAX_SIZE, 1)))
+
+
+def _warm_diagnoses(index: DiagnosisIndex):
+    index.lookup_many(index.subject_ids[:64].tolist(), 10)
+
+
+# Single-flight loaders: each table is loaded once, by warm-up or the first
+# request, and callers arriving meanwhile wait for that load.
+# The recommender itself lives in a slot that hot-swaps reloaded versions.
+_model_slot = ModelSlot(warm=_warm_recommender, poll_interval=config.RELOAD_INTERVAL_S)
+_components = {
+    component.name: component for component in (
+        Component("recommender", lambda: _model_slot.get(), warm=_warm_recommender, required=True,
+                  retry_interval=config.LOAD_RETRY_S),
+        Component(
+            "diagnoses",
+            lambda: load_diagnosis_index(config.DIAGNOSES_PATH, config.DIAGNOSES_CSV),
+            warm=_warm_diagnoses, fallback=DiagnosisIndex.empty, required=True,
+        ),
+        Component("concepts", lambda: load_concept_table(config.NODES_CSV), fallback=ConceptTable.empty),
+        Component("concept_search", lambda: _build_concept_search()),
+        Component(
+            "concept_graph",
+            lambda: load_concept_graph(config.EDGES_CSV, get_concept_table().cuis),
+            fallback=ConceptGraph.empty,
+        ),
+        Component("live_model", _load_live_recommender, fallback=lambda: None),
+    )
+}
+_concept_metadata = None  # ((version, recommender id), ConceptMetadata by concept_idx)
+
 
 def get_recommender():
-    global _recommender
-    if _recommender is None:
-        from inference import get_recommender as load_recommender
-        _recommender = load_recommender()
-    return _recommender
+    """
+    The serving recommender. Handlers should call this once per request and
+    keep the result, so a hot reload never mixes two versions in one response.
+    """
+    component = _components["recommender"]
+    if not component.loaded:
+        component.get()
+    return _model_slot.current
+
+
+def get_live_recommender():
+    """Live HGT encoder, or None if its graph/checkpoint cannot be loaded."""
+    return _components["live_model"].get()
+
+
+# Live encodes run on their own bounded pool, never on the default executor
+_live_executor = ThreadPoolExecutor(max_workers=config.LIVE_MAX_CONCURRENCY, thread_name_prefix="live-encode")
+_live_slots = threading.BoundedSemaphore(config.LIVE_MAX_CONCURRENCY)
+
+# Coalesces concurrent /api/recommend calls into batched scoring passes
+_batcher = MicroBatcher(
+    lambda: get_recommender(),
+    max_batch_size=config.BATCH_MAX_SIZE,
+    max_wait_ms=config.BATCH_MAX_WAIT_MS,
+    max_top_k=config.MAX_TOP_K,
+)
 
 
 def get_diagnosis_data():
-    global _diagnosis_df
-    if _diagnosis_df is None:
-        try:
-            csv_path = Path(r"C:\Users\saisi\OneDrive\Documents\Desktop\mimic_diagnoses_mapped.csv")
-            if not csv_path.exists():
-                print(f"Warning: Diagnosis CSV not found at {csv_path}")
-                return pd.DataFrame()  # Return empty DataFrame instead of raising error
-            _diagnosis_df = pd.read_csv(csv_path)
-            print(f"Loaded {len(_diagnosis_df)} diagnosis records")
-        except Exception as e:
-            print(f"Error loading diagnosis CSV: {e}")
-            _diagnosis_df = pd.DataFrame()  # Return empty DataFrame on error
-    return _diagnosis_df
+    return _components["diagnoses"].get()  # Empty index on error
+
+
+def get_concept_table():
+    return _components["concepts"].get()  # Empty table on error
+
+
+def get_concept_search():
+    return _components["concept_search"].get()
+
+
+def get_concept_graph():
+    return _components["concept_graph"].get()  # Empty graph on error
+
+
+async def load_component(name: str):
+    """
+    A component from an async handler. A first load runs on a worker
+    thread, so the event loop keeps serving other requests meanwhile.
+    """
+    component = _components[name]
+    if component.loaded:
+        return component.peek()
+    return await asyncio.to_thread(component.get)
+
+
+def graph_response(graph: ConceptGraph, nodes, edges) -> dict:
+    """Nodes (with names) and edges of a concept subgraph."""
+    cuis = graph.cuis[nodes].tolist()
+    metadata = get_concept_table().aligned(cuis)
+    return {
+        "nodes": metadata.expand([{"cui": cui} for cui in cuis], range(len(cuis))),
+        "edges": graph.edge_records(edges),
+    }
+
+
+def get_concept_metadata(recommender):
+    """Concept names/semantic types aligned with the recommender's concept indices."""
+    global _concept_metadata
+    # Keyed by the instance too: a forced reload can keep the version string
+    key = (recommender.version, id(recommender))
+    if _concept_metadata is None or _concept_metadata[0] != key:
+        cuis = recommender.concept_cuis(range(recommender.num_concepts))
+        _concept_metadata = (key, get_concept_table().aligned(cuis))
+    return _concept_metadata[1]
+
+
+def expand_names(expand: Optional[str]) -> bool:
+    return expand is not None and "names" in expand.split(",")
+
+
+def expand_recommendations(recommendations: list, recommender) -> list:
+    """Add name and semantic_types to recommendation dicts scored by `recommender`."""
+    metadata = get_concept_metadata(recommender)
+    with metrics.stage("expand_names"):
+        return metadata.expand(recommendations, [rec["concept_idx"] for rec in recommendations])
+
+
+def expand_diagnoses(diagnoses: list) -> list:
+    """Add name and semantic_types to diagnosis dicts."""
+    table = get_concept_table()
+    with metrics.stage("expand_names"):
+        metadata = table.aligned([diag["cui"] for diag in diagnoses])
+        return metadata.expand(diagnoses, range(len(diagnoses)))
+
+
+def cold_start_recommendations(recommender, patient_id: str, top_k: int):
+    """
+    Recommendations for a patient missing from the embeddings, built from
+    their diagnosis CUIs. Returns None when cold start is disabled or the
+    patient has no usable diagnoses.
+    """
+    if not config.COLD_START:
+        return None
+    try:
+        cuis = get_diagnosis_data().patient_cuis(int(patient_id))
+    except ValueError:
+        return None
+    if not cuis:
+        return None
+    recommendations = recommender.recommend_from_concepts(cuis, top_k)
+    if isinstance(recommendations, dict):
+        return None
+    metrics.RECOMMENDATIONS.inc(result="cold_start")
+    return recommendations
+
+
+async def live_recommendations(recommender, patient_id: str, top_k: int):
+    """
+    Recommendations from a freshly encoded patient subgraph, or None when
+    live inference is unavailable or fails, the patient is unknown, every
+    encode slot is busy, or encoding does not finish within
+    DRUG_REC_LIVE_BUDGET_MS. An encoding that overruns keeps its slot until
+    it finishes (warming the caches for the next call), so at most
+    DRUG_REC_LIVE_MAX_CONCURRENCY encodes ever run at once.
+    """
+    patient_idx = recommender.resolve_patient_idx(patient_id)
+    live = await asyncio.to_thread(get_live_recommender)
+    if live is None or patient_idx is None:
+        return None
+    if not _live_slots.acquire(blocking=False):
+        metrics.RECOMMENDATIONS.inc(result="live_busy")
+        return None
+    # Released when the encode finishes, or is cancelled before it starts
+    encode = _live_executor.submit(live.patient_embedding, patient_idx)
+    encode.add_done_callback(lambda _: _live_slots.release())
+    try:
+        patient_emb = await asyncio.wait_for(
+            asyncio.wrap_future(encode),
+            timeout=config.LIVE_BUDGET_MS / 1000.0
+        )
+    except asyncio.TimeoutError:
+        metrics.RECOMMENDATIONS.inc(result="live_timeout")
+        return None
+    except Exception as e:
+        print(f"Live encoding of patient {patient_id} failed, using frozen embeddings: {e}")
+        metrics.RECOMMENDATIONS.inc(result="live_error")
+        return None
+    metrics.RECOMMENDATIONS.inc(result="live")
+    return recommender.recommend_for_vector(patient_emb, top_k)
 
 
 @app.get("/api/health")
 async def health_check():
     """Health check endpoint."""
-    return {"status": "healthy", "service": "drug-recommendation-api"}
+    return {
+        "status": "healthy",
+        "service": "drug-recommendation-api",
+        "version": _model_slot.version,
+        "loaded_at": _model_slot.loaded_at,
+        "reloading": _model_slot.state["state"] == "loading",
+        "ready": readiness(list(_components.values()))["ready"],
+    }
+
+
+@app.get("/api/ready")
+async def readiness_check():
+    """
+    Readiness probe: 200 once the recommender and diagnosis store are
+    loaded and warmed, 503 before. Lists load state and timings per component.
+    """
+    status = readiness(list(_components.values()))
+    status["version"] = _model_slot.version
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
 
 
 @app.post("/api/recommend", response_model=RecommendResponse)
-async def recommend_drugs(request: RecommendRequest):
+async def recommend_drugs(request: RecommendRequest, expand: Optional[str] = None):
     """
     Get drug recommendations for a patient.
+    Pass ?expand=names to include concept names and semantic types.
     """
     try:
         recommender = get_recommender()
-        recommendations = recommender.recommend(
-            patient_id=request.patient_id,
-            top_k=request.top_k or 5
-        )
+        live = config.LIVE_MODE if request.live is None else request.live
+        recommendations = None
+        if live:
+            recommendations = await live_recommendations(recommender, request.patient_id, request.top_k or 5)
+            live = recommendations is not None
+        
+        if recommendations is None and config.BATCH_MAX_SIZE > 0:
+            # The batch may run on a newer version than `recommender`
+            recommendations, recommender = await _batcher.submit(request.patient_id, request.top_k or 5)
+        elif recommendations is None:
+            recommendations = await asyncio.to_thread(
+                recommender.recommend,
+                patient_id=request.patient_id,
+                top_k=request.top_k or 5
+            )
         
+        cold_start = False
+        if isinstance(recommendations, dict) and "error" in recommendations:
+            # Unseen patient: fall back to their diagnosis CUIs
+            fallback = await asyncio.to_thread(
+                cold_start_recommendations, recommender, request.patient_id, request.top_k or 5
+            )
+            if fallback is None:
+                raise HTTPException(status_code=404, detail=recommendations["error"])
+            recommendations, cold_start = fallback, True
+        
+        if expand_names(expand):
+            recommendations = await asyncio.to_thread(expand_recommendations, recommendations, recommender)
+        
+        # Recommendations are already plain dicts of the response shape;
+        # returning a Response skips re-validating them through pydantic
+        with metrics.stage("serialize"):
+            return JSONResponse({
+                "patient_id": request.patient_id,
+                "recommendations": recommendations,
+                "cold_start": cold_start,
+                "live": live,
+                "version": recommender.version,
+            })
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+def _batch_recommendations(recommender, patient_ids: List[str], top_k: int, expand: bool = False) -> list:
+    """Batched scoring plus cold-start fallback, as response dicts."""
+    batch = recommender.recommend_batch(patient_ids=patient_ids, top_k=top_k)
+    
+    results = []
+    for patient_id, recommendations in zip(patient_ids, batch):
+        cold_start = False
         if isinstance(recommendations, dict) and "error" in recommendations:
-            raise HTTPException(status_code=404, detail=recommendations["error"])
+            fallback = cold_start_recommendations(recommender, patient_id, top_k)
+            if fallback is None:
+                results.append({"patient_id": patient_id, "recommendations": [],
+                                "cold_start": False, "error": recommendations["error"]})
+                continue
+            recommendations, cold_start = fallback, True
+        if expand:
+            recommendations = expand_recommendations(recommendations, recommender)
+        results.append({"patient_id": patient_id, "recommendations": recommendations,
+                        "cold_start": cold_start, "error": None})
+    return results
+
+
+@app.post("/api/recommend/batch", response_model=BatchRecommendResponse)
+async def recommend_drugs_batch(request: BatchRecommendRequest, expand: Optional[str] = None):
+    """
+    Get drug recommendations for many patients in one call.
+    Unknown patient IDs are reported per item instead of failing the request.
+    Pass ?expand=names to include concept names and semantic types.
+    """
+    try:
+        recommender = get_recommender()
+        results = await asyncio.to_thread(
+            _batch_recommendations,
+            recommender,
+            request.patient_ids,
+            request.top_k or 5,
+            expand_names(expand)
+        )
         
-        return RecommendResponse(
-            patient_id=request.patient_id,
-            recommendations=recommendations
+        with metrics.stage("serialize"):
+            return JSONResponse({"results": results, "version": recommender.version})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/api/recommend/cold-start", response_model=List[DrugRecommendation])
+async def recommend_drugs_cold_start(request: ColdStartRequest):
+    """
+    Get drug recommendations directly from a list of diagnosis CUIs,
+    for patients that have no embedding yet.
+    """
+    if request.weights is not None:
+        if len(request.weights) != len(request.cuis):
+            raise HTTPException(status_code=400, detail="weights must have one entry per CUI")
+        if not valid_weights(request.weights):
+            raise HTTPException(status_code=400, detail="weights must be finite, non-negative and sum to more than 0")
+    try:
+        recommender = get_recommender()
+        recommendations = await asyncio.to_thread(
+            recommender.recommend_from_concepts,
+            request.cuis,
+            request.top_k or 5,
+            request.weights
         )
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    
+    if isinstance(recommendations, dict) and "error" in recommendations:
+        raise HTTPException(status_code=404, detail=recommendations["error"])
+    # The body is a bare list, so the model version goes in a header
+    return JSONResponse(recommendations, headers={"X-Model-Version": recommender.version})
 
 
 @app.get("/api/patients")
@@ -118,46 +559,105 @@ async def list_patients():
     """Get list of available patient IDs (sample)."""
     try:
         recommender = get_recommender()
-        patient_ids = list(recommender.patient_to_idx.keys())[:20]
-        return {"patients": patient_ids, "total": len(recommender.patient_to_idx)}
+        return {"patients": recommender.get_sample_patients(20), "total": len(recommender.patient_ids)}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.get("/api/diagnoses/{patient_id}", response_model=DiagnosesResponse)
-async def get_patient_diagnoses(patient_id: str, top_k: Optional[int] = 10):
+@app.get("/api/cache/stats")
+async def cache_stats():
+    """Hit/miss counters of the recommendation result cache."""
+    try:
+        return get_recommender().cache.stats()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+def check_admin(request: Request):
+    """
+    Admin routes need the DRUG_REC_ADMIN_TOKEN in X-Admin-Token, or, when
+    no token is configured, a caller on this host (behind a proxy, set a token).
+    """
+    if config.ADMIN_TOKEN:
+        token = request.headers.get("X-Admin-Token", "")
+        if not hmac.compare_digest(token.encode(), config.ADMIN_TOKEN.encode()):
+            raise HTTPException(status_code=401, detail="Missing or invalid X-Admin-Token")
+    elif request.client is None or request.client.host not in LOCAL_HOSTS:
+        raise HTTPException(status_code=403, detail="Admin routes are local-only without DRUG_REC_ADMIN_TOKEN")
+
+
+def is_model_path(path: str) -> bool:
+    """Whether path lies under DRUG_REC_MODEL_DIR or the directory of DRUG_REC_MODEL_PATH."""
+    roots = [config.MODEL_DIR] + ([os.path.dirname(config.MODEL_PATH)] if config.MODEL_PATH else [])
+    real = os.path.realpath(path)
+    for root in roots:
+        root = os.path.realpath(root)
+        if os.path.commonpath([real, root]) == root:
+            return True
+    return False
+
+
+@app.post("/api/admin/reload", status_code=202)
+async def reload_model(request: ReloadRequest, http_request: Request):
+    """
+    Load a new model version in the background and swap it in once it
+    validates. In-flight requests finish on the version they started with.
+    `path` / `mappings_path` must lie under the model directory.
+    Returns 409 if a reload is already running.
+    """
+    check_admin(http_request)
+    for path in (request.path, request.mappings_path):
+        if path and not is_model_path(path):
+            raise HTTPException(status_code=403, detail=f"{path} is outside the model directory")
+    started = _model_slot.reload(
+        request.path, request.mappings_path, force=bool(request.force), wait=False
+    )
+    if not started:
+        raise HTTPException(status_code=409, detail="A reload is already in progress")
+    if request.wait:
+        while _model_slot.state["state"] == "loading":
+            await asyncio.sleep(0.05)
+    return _model_slot.status()
+
+
+@app.get("/api/admin/reload")
+async def reload_status(http_request: Request):
+    """Serving version, its source files and the outcome of the last reload."""
+    check_admin(http_request)
+    return _model_slot.status()
+
+
+@app.get("/api/batching/stats")
+async def batching_stats():
+    """Batch counts and average batch size of the micro-batcher."""
+    return _batcher.stats()
+
+
+@app.get("/api/live/stats")
+async def live_stats():
+    """Cache counters of the live HGT encoder."""
+    live = await asyncio.to_thread(get_live_recommender) if config.LIVE_MODE else _components["live_model"].peek()
+    if live is None:
+        return {"enabled": False}
+    return {"enabled": True, "budget_ms": config.LIVE_BUDGET_MS, **live.stats()}
+
+
+@app.get("/api/diagnoses/{patient_id}", response_model=DiagnosesResponse, response_model_exclude_unset=True)
+async def get_patient_diagnoses(patient_id: str, top_k: Optional[int] = 10, expand: Optional[str] = None):
     """
     Get diagnoses for a patient from MIMIC dataset.
     Returns unique ICD codes (one CUI per ICD code).
+    Pass ?expand=names to include concept names and semantic types.
     """
     try:
-        df = get_diagnosis_data()
-        
-        # Filter by patient ID
-        patient_data = df[df['subject_id'] == int(patient_id)]
-        
-        if patient_data.empty:
-            return DiagnosesResponse(
-                patient_id=patient_id,
-                diagnoses=[]
-            )
-        
-        # Deduplicate: keep first CUI per unique ICD code
-        unique_diagnoses = patient_data.drop_duplicates(subset=['icd_code'], keep='first')
+        index = get_diagnosis_data()
         
-        # Limit to top_k
-        unique_diagnoses = unique_diagnoses.head(top_k)
-        
-        # Convert to response format
-        diagnoses = [
-            DiagnosisItem(
-                icd_code=str(row['icd_code']),
-                icd_version=int(row['icd_version']),
-                cui=str(row['cui']),
-                hadm_id=str(row['hadm_id'])
-            )
-            for _, row in unique_diagnoses.iterrows()
-        ]
+        # Slice of pre-deduplicated ICD codes (one CUI per ICD code)
+        with metrics.stage("diagnoses_lookup"):
+            diagnoses = index.lookup(int(patient_id), top_k)
+        if expand_names(expand):
+            await load_component("concepts")
+            diagnoses = expand_diagnoses(diagnoses)
         
         return DiagnosesResponse(
             patient_id=patient_id,
@@ -169,12 +669,149 @@ async def get_patient_diagnoses(patient_id: str, top_k: Optional[int] = 10):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/api/diagnoses/bulk", response_model=BulkDiagnosesResponse, response_model_exclude_unset=True)
+async def get_bulk_diagnoses(request: BulkDiagnosesRequest, expand: Optional[str] = None):
+    """
+    Get diagnoses for many patients in one vectorized pass.
+    Invalid patient IDs are reported per item instead of failing the request.
+    Pass ?expand=names to include concept names and semantic types.
+    """
+    try:
+        index = get_diagnosis_data()
+        
+        subject_ids, positions = [], []
+        results = [None] * len(request.patient_ids)
+        for pos, patient_id in enumerate(request.patient_ids):
+            try:
+                subject_id = int(patient_id)
+            except ValueError:
+                subject_id = None
+            # Subject IDs are looked up as one int64 array
+            if subject_id is None or not -2**63 <= subject_id < 2**63:
+                results[pos] = BulkDiagnosesItem(patient_id=patient_id, diagnoses=[], error="Invalid patient ID format")
+                continue
+            subject_ids.append(subject_id)
+            positions.append(pos)
+        
+        top_k = request.top_k if request.top_k is not None else 10
+        with metrics.stage("diagnoses_lookup"):
+            found = index.lookup_many(subject_ids, top_k)
+        if expand_names(expand):
+            await load_component("concepts")
+        for pos, diagnoses in zip(positions, found):
+            if expand_names(expand):
+                diagnoses = expand_diagnoses(diagnoses)
+            results[pos] = BulkDiagnosesItem(patient_id=request.patient_ids[pos], diagnoses=diagnoses, error=None)
+        
+        return BulkDiagnosesResponse(results=results)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/api/cui/{cui}")
+async def get_cui(cui: str):
+    """
+    Get UMLS metadata for one CUI.
+    Same response shape as the standalone CUI lookup service.
+    """
+    try:
+        table = await load_component("concepts")
+        return table.lookup(cui)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/api/cui/batch")
+async def get_cuis_batch(request: CuiBatchRequest):
+    """
+    Get UMLS metadata for many CUIs in one call.
+    Returns {"results": {cui: {"found": bool, "data": {...} | null}}}.
+    """
+    try:
+        table = await load_component("concepts")
+        return {"results": table.lookup_many(request.cuis)}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/api/concepts/search")
+async def search_concepts(q: str, limit: Optional[int] = 20, semantic_type: Optional[str] = None):
+    """
+    Ranked UMLS concept search by CUI prefix, name or synonym.
+    Queries of 3+ characters match substrings; shorter ones match word prefixes.
+    """
+    try:
+        search = await load_component("concept_search")
+        results = search.search(q, limit=min(max(limit or 0, 0), 1000), semantic_type=semantic_type)
+        return {"query": q, "results": results}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/api/graph/neighbourhood")
+async def get_graph_neighbourhood(request: GraphNeighbourhoodRequest):
+    """
+    k-hop neighbourhood of one or more CUIs in the UMLS graph.
+    Returns the reached nodes and every edge among them, optionally
+    restricted to the given relation types.
+    """
+    if request.direction not in ("out", "in", "both"):
+        raise HTTPException(status_code=400, detail="direction must be 'out', 'in' or 'both'")
+    try:
+        graph = await load_component("concept_graph")
+        nodes, edges = graph.neighbourhood(
+            request.cuis,
+            hops=request.hops,
+            relations=request.relations,
+            direction=request.direction,
+            max_nodes=request.max_nodes,
+        )
+        return graph_response(graph, nodes, edges)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/api/graph/subgraph")
+async def get_graph_subgraph(request: GraphSubgraphRequest):
+    """Subgraph of the UMLS graph induced by the given CUIs."""
+    try:
+        graph = await load_component("concept_graph")
+        nodes, edges = graph.subgraph(request.cuis, relations=request.relations)
+        return graph_response(graph, nodes, edges)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/api/graph/stats")
+async def graph_stats():
+    """Node/edge counts and edges per relation type of the UMLS graph."""
+    graph = await load_component("concept_graph")
+    return graph.stats()
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """Latency histograms, batch sizes, cache counters and load times (Prometheus text format)."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+def _cache_stats():
+    recommender = _model_slot.current
+    return recommender.cache.stats() if recommender is not None else None
+
+
+metrics.REGISTRY.register(metrics.CallbackGauge(
+    "drug_rec_cache_entries", "Patients held in the result cache",
+    lambda: (_cache_stats() or {}).get("entries"),
+))
+metrics.REGISTRY.register(metrics.CallbackGauge(
+    "drug_rec_cache_hit_ratio", "Result cache hits / lookups since start",
+    lambda: (_cache_stats() or {}).get("hit_rate"),
+))
+
+
 if __name__ == "__main__":
     print("Starting Drug Recommendation API...")
-    print("Loading embeddings (this may take a moment)...")
-    
-    # Pre-load embeddings
-    get_recommender()
-    
-    print("Ready! Starting server on http://localhost:8001")
+    print("Loading embeddings in the background; poll /api/ready until it returns 200")
+    print("Starting server on http://localhost:8001")
     uvicorn.run(app, host="0.0.0.0", port=8001)
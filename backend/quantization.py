@@ -0,0 +1,187 @@
+"""
+Quantized Embedding Storage
+Per-row scaled int8 or float16 copies of embedding tables, dequantized on the fly
+
+Usage (memory and top-k agreement report against float32):
+    python quantization.py --artifact ../model/artifact --rescore-k 0 50
+"""
+
+import argparse
+import contextlib
+import io
+
+import torch
+
+QUANTIZE_MODES = ("int8", "float16")
+
+
+class QuantizedMatrix:
+    """
+    Compressed (n, dim) embedding table.
+
+    int8 rows are stored as round(x / scale) with one float32 scale per row
+    (scale = max|x| / 127); float16 rows are stored as-is at half precision.
+    """
+
+    def __init__(self, data: torch.Tensor, scales: torch.Tensor, mode: str):
+        self.data = data
+        self.scales = scales  # (n,) float32 for int8, None for float16
+        self.mode = mode
+
+    @classmethod
+    @torch.no_grad()
+    def from_float(cls, tensor: torch.Tensor, mode: str, chunk_size: int = 65536):
+        """Quantize a float tensor, a chunk of rows at a time."""
+        if mode not in QUANTIZE_MODES:
+            raise ValueError(f"Unknown quantization mode: {mode}")
+
+        if mode == "float16":
+            return cls(tensor.to(torch.float16), None, mode)
+
+        n = tensor.size(0)
+        data = torch.empty(tensor.shape, dtype=torch.int8)
+        scales = torch.empty(n, dtype=torch.float32)
+        for start in range(0, n, chunk_size):
+            chunk = tensor[start:start + chunk_size].float()
+            scale = chunk.abs().amax(dim=1).clamp(min=1e-12) / 127.0
+            data[start:start + chunk_size] = torch.round(chunk / scale.unsqueeze(1)).clamp(-127, 127).to(torch.int8)
+            scales[start:start + chunk_size] = scale
+        return cls(data, scales, mode)
+
+    def size(self, dim: int = None):
+        return self.data.size() if dim is None else self.data.size(dim)
+
+    @property
+    def nbytes(self) -> int:
+        total = self.data.numel() * self.data.element_size()
+        if self.scales is not None:
+            total += self.scales.numel() * self.scales.element_size()
+        return total
+
+    def take(self, indices: torch.Tensor):
+        """Row subset as a new QuantizedMatrix."""
+        scales = self.scales[indices] if self.scales is not None else None
+        return QuantizedMatrix(self.data[indices], scales, self.mode)
+
+    def dequantize(self, rows: torch.Tensor = None) -> torch.Tensor:
+        """Float32 copy of the given rows (all rows if None)."""
+        data = self.data if rows is None else self.data[rows]
+        if self.scales is None:
+            return data.float()
+        scales = self.scales if rows is None else self.scales[rows]
+        return data.float() * scales.unsqueeze(-1)
+
+    @torch.no_grad()
+    def matmul(self, queries: torch.Tensor, chunk_size: int = 65536) -> torch.Tensor:
+        """
+        Scores of float32 queries against every stored row.
+
+        Rows are widened to float32 a chunk at a time; for int8 the per-row
+        scale is applied to the scores instead of the vectors.
+
+        Returns:
+            (batch, n) float32 scores
+        """
+        queries = queries.float()
+        scores = torch.empty(queries.size(0), self.data.size(0), dtype=torch.float32)
+        for start in range(0, self.data.size(0), chunk_size):
+            block = self.data[start:start + chunk_size].float()
+            block_scores = torch.matmul(queries, block.T)
+            if self.scales is not None:
+                block_scores *= self.scales[start:start + chunk_size]
+            scores[:, start:start + chunk_size] = block_scores
+        return scores
+
+
+def tensor_nbytes(tensor: torch.Tensor) -> int:
+    return tensor.numel() * tensor.element_size()
+
+
+@torch.no_grad()
+def quantization_report(
+    patient_embeddings: torch.Tensor,
+    drug_embeddings: torch.Tensor,
+    mode: str,
+    top_k: int = 10,
+    rescore_k: int = 0,
+    sample_size: int = 1000,
+) -> dict:
+    """
+    Memory saved and top-k agreement of a quantized path against float32.
+
+    Args:
+        patient_embeddings: Float32 patient table
+        drug_embeddings: Float32 drug table
+        mode: "int8" or "float16"
+        top_k: Cut-off for agreement
+        rescore_k: Shortlist re-scored in float32 (0 = no re-scoring)
+        sample_size: Number of sampled patients
+
+    Returns:
+        Dict with byte counts and the fraction of float32 top-k recovered
+    """
+    patient_store = QuantizedMatrix.from_float(patient_embeddings, mode)
+    drug_store = QuantizedMatrix.from_float(drug_embeddings, mode)
+
+    n = min(sample_size, patient_embeddings.size(0))
+    sample = torch.randperm(patient_embeddings.size(0))[:n]
+    k = min(top_k, drug_embeddings.size(0))
+
+    exact_queries = patient_embeddings[sample].float()
+    _, exact_ids = torch.topk(torch.matmul(exact_queries, drug_embeddings.float().T), k, dim=1)
+
+    if rescore_k:
+        # Shortlist from compressed drugs, then exact float32 scores
+        shortlist = min(max(k, rescore_k), drug_embeddings.size(0))
+        _, cand = torch.topk(drug_store.matmul(exact_queries), shortlist, dim=1)
+        exact = torch.einsum('bsd,bd->bs', drug_embeddings[cand].float(), exact_queries)
+        _, pos = torch.topk(exact, k, dim=1)
+        quant_ids = torch.gather(cand, 1, pos)
+    else:
+        queries = patient_store.dequantize(sample)
+        _, quant_ids = torch.topk(drug_store.matmul(queries), k, dim=1)
+
+    hits = (quant_ids.unsqueeze(2) == exact_ids.unsqueeze(1)).any(dim=2).sum().item()
+    float_bytes = tensor_nbytes(patient_embeddings) + tensor_nbytes(drug_embeddings)
+    quant_bytes = patient_store.nbytes + drug_store.nbytes
+    return {
+        "mode": mode,
+        "rescore_k": rescore_k,
+        "k": k,
+        "queries": n,
+        "float32_mb": round(float_bytes / 2**20, 2),
+        "quantized_mb": round(quant_bytes / 2**20, 2),
+        "saved_mb": round((float_bytes - quant_bytes) / 2**20, 2),
+        "topk_agreement": round(hits / max(n * k, 1), 4),
+    }
+
+
+def main():
+    from inference import DrugRecommender
+
+    parser = argparse.ArgumentParser(description="Quantized embedding memory / agreement report")
+    parser.add_argument("--artifact", help="Memory-mapped artifact directory")
+    parser.add_argument("--embeddings", help="Path to embeddings.pt")
+    parser.add_argument("--mappings", help="Path to mappings.pt")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--rescore-k", type=int, nargs="+", default=[0, 50])
+    parser.add_argument("--queries", type=int, default=1000, help="Number of sampled patients")
+    args = parser.parse_args()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        recommender = DrugRecommender(args.artifact or args.embeddings, args.mappings)
+
+    for mode in QUANTIZE_MODES:
+        for rescore_k in args.rescore_k:
+            print(quantization_report(
+                recommender.patient_embeddings,
+                recommender.drug_embeddings,
+                mode,
+                top_k=args.k,
+                rescore_k=rescore_k,
+                sample_size=args.queries,
+            ))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,288 @@
+"""
+Model Hot Reload
+Loads a new embedding version in the background and swaps it in atomically
+
+The serving DrugRecommender lives in a ModelSlot. A reload builds the new
+version on a background thread while the old one keeps serving, checks its
+shapes and ID mappings, then replaces the slot's reference in one
+assignment. Requests hold on to the recommender they started with, so
+in-flight work finishes on the old version and its tables are freed once
+the last of those requests returns. Both versions are resident during the
+swap (memory-mapped artifacts share pages with the page cache).
+"""
+
+import os
+import threading
+import time
+
+import torch
+
+import config
+import metrics
+from inference import default_model_paths, load_recommender, source_version
+
+# A new version is rejected if fewer of its rows than this have an ID
+MIN_MAPPED_FRACTION = 0.5
+
+
+@torch.no_grad()
+def validate_recommender(recommender, current=None, sample_size: int = 16, top_k: int = 5) -> dict:
+    """
+    Check a freshly loaded recommender before it serves traffic.
+
+    Args:
+        recommender: The new DrugRecommender
+        current: The version being replaced, if any
+        sample_size: Patients scored as a smoke test
+        top_k: Recommendations per smoke-test patient
+
+    Returns:
+        Dict of shapes and counts (raises ValueError on the first failed check)
+    """
+    num_patients, num_concepts = recommender.num_patients, recommender.num_concepts
+    num_drugs = len(recommender.drug_concept_idx)
+    if not num_patients or not num_concepts or not num_drugs:
+        raise ValueError(f"Empty tables: {num_patients} patients, {num_concepts} concepts, {num_drugs} drugs")
+
+    first = torch.tensor([0])
+    dim = recommender._patient_vectors(first).size(1)
+    concept_dim = recommender._concept_vectors(first).size(1)
+    if dim != concept_dim:
+        raise ValueError(f"Patient embedding dim {dim} != concept embedding dim {concept_dim}")
+
+    drug_idx = recommender.drug_concept_idx
+    if drug_idx.min() < 0 or drug_idx.max() >= num_concepts:
+        raise ValueError(f"Drug concept indices outside [0, {num_concepts})")
+
+    if recommender.patient_ids.num_rows != num_patients:
+        raise ValueError(f"Patient ID map covers {recommender.patient_ids.num_rows} rows, "
+                         f"embeddings have {num_patients}")
+    if recommender.concept_ids.num_rows != num_concepts:
+        raise ValueError(f"Concept ID map covers {recommender.concept_ids.num_rows} rows, "
+                         f"embeddings have {num_concepts}")
+    # Mappings from another export typically cover only part of the rows
+    for kind, id_map, num_rows in (("Patient", recommender.patient_ids, num_patients),
+                                   ("Concept", recommender.concept_ids, num_concepts)):
+        mapped = len(id_map)
+        if mapped < MIN_MAPPED_FRACTION * num_rows:
+            raise ValueError(f"{kind} ID map covers only {mapped} of {num_rows} rows")
+
+    # Smoke test: score a few mapped patients end to end (bypassing the cache)
+    sample = recommender.get_sample_patients(sample_size)
+    rows = torch.from_numpy(recommender.patient_ids.lookup_many(sample))
+    if (rows < 0).any():
+        raise ValueError("Sampled patient IDs do not resolve to their own rows")
+    scores, idx = recommender._score_topk(recommender._patient_vectors(rows), top_k)
+    if not torch.isfinite(scores).all():
+        raise ValueError("Non-finite recommendation scores")
+    results = recommender._build_recommendation_rows(idx, scores)
+    expected = min(top_k, num_drugs)
+    if recommender.ann_index is None and any(len(recs) != expected for recs in results):
+        raise ValueError(f"Smoke test returned fewer than {expected} recommendations")
+
+    if current is not None and config.LIVE_MODE:
+        # The live HGT encoder produces vectors of the dimension it was trained with
+        current_dim = current._patient_vectors(first).size(1)
+        if dim != current_dim:
+            raise ValueError(f"Embedding dim changed {current_dim} -> {dim} while live mode is on")
+
+    return {
+        "patients": num_patients,
+        "concepts": num_concepts,
+        "drugs": num_drugs,
+        "dim": dim,
+        "mapped_patients": len(recommender.patient_ids),
+        "mapped_concepts": len(recommender.concept_ids),
+        "smoke_test_patients": len(sample),
+    }
+
+
+@torch.no_grad()
+def warm_recommender(recommender, batch_sizes=(1, 64), top_k: int = 10):
+    """
+    Dummy scoring passes at the batch sizes serving will use, so the first
+    real requests do not pay for lazy kernel setup and page faults on the
+    drug table.
+    """
+    for batch_size in batch_sizes:
+        sample = recommender.get_sample_patients(max(batch_size, 1))
+        rows = torch.from_numpy(recommender.patient_ids.lookup_many(sample))
+        rows = rows[rows >= 0]
+        if len(rows):
+            scores, idx = recommender._score_topk(recommender._patient_vectors(rows), top_k)
+            recommender._build_recommendation_rows(idx, scores)
+
+
+def _same_path(path: str, other: str) -> bool:
+    return os.path.realpath(path) == os.path.realpath(other)
+
+
+class ModelSlot:
+    """
+    Holds the serving DrugRecommender and hot-swaps reloaded versions.
+
+    Args:
+        loader: load_recommender-compatible factory
+        validate: validate_recommender-compatible check
+        warm: Optional warm-up run on a validated version before the swap
+        poll_interval: Seconds between checks of the model files for a new
+            version (0 = reload only when asked)
+    """
+
+    def __init__(self, loader=load_recommender, validate=validate_recommender, warm=None,
+                 poll_interval: float = 0.0):
+        self.loader = loader
+        self.validate = validate
+        self.warm = warm
+        self.poll_interval = poll_interval
+        self._current = None
+        self._source = None  # (embeddings_path, mappings_path); None = model/ defaults
+        self._load_lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        self._poller = None
+        self._failed_version = None
+        self.loaded_at = None
+        self.state = {"state": "idle", "reloads": 0, "last_error": None, "last_reload": None}
+
+    @property
+    def current(self):
+        """The serving recommender, or None before the first load."""
+        return self._current
+
+    @property
+    def version(self):
+        current = self._current
+        return current.version if current is not None else None
+
+    def get(self):
+        """
+        The serving recommender, loading the default model on first use.
+        Concurrent first callers wait for a single load.
+        """
+        if self._current is None:
+            with self._load_lock:
+                if self._current is None:
+                    self.set(self.loader())
+        return self._current
+
+    def set(self, recommender, embeddings_path: str = None, mappings_path: str = None):
+        """Serve this recommender from now on (no validation)."""
+        self._current = recommender
+        self._source = (embeddings_path, mappings_path) if embeddings_path else None
+        self.loaded_at = time.time()
+        self._ensure_polling()
+
+    def _source_paths(self):
+        return self._source or default_model_paths()
+
+    def reload(self, embeddings_path: str = None, mappings_path: str = None,
+               force: bool = False, wait: bool = False) -> bool:
+        """
+        Load a new version in the background and swap it in if it validates.
+
+        Args:
+            embeddings_path: Artifact directory or embeddings.pt
+                (default: where the current version came from)
+            mappings_path: mappings.pt, for embeddings.pt sources
+            force: Reload even if the source reports the serving version
+            wait: Block until the reload has finished
+
+        Returns:
+            False if another reload is already running, else True
+        """
+        if not self._reload_lock.acquire(blocking=False):
+            return False
+        self.state["state"] = "loading"
+        thread = threading.Thread(
+            target=self._reload, args=(embeddings_path, mappings_path, force),
+            name="model-reload", daemon=True,
+        )
+        thread.start()
+        if wait:
+            thread.join()
+        return True
+
+    def _reload(self, embeddings_path: str, mappings_path: str, force: bool):
+        start = time.perf_counter()
+        if embeddings_path is None:
+            embeddings_path, mappings_path = self._source_paths()
+            explicit = self._source is not None
+        else:
+            explicit = True
+        target_version = source_version(embeddings_path)
+        previous = self._current
+        # A different file with an equal version (e.g. a copy) is still reloaded
+        same_source = _same_path(embeddings_path, self._source_paths()[0])
+        record = {
+            "source": embeddings_path,
+            "from_version": previous.version if previous is not None else None,
+            "to_version": target_version,
+            "started_at": time.time(),
+        }
+        try:
+            if target_version is None:
+                raise ValueError(f"No model found at {embeddings_path}")
+            if not force and previous is not None and same_source and target_version == previous.version:
+                record["result"] = "unchanged"
+                return
+
+            # A saved IVF index belongs to the old drug table, so rebuild it
+            recommender = self.loader(embeddings_path, mappings_path, ann_index_path=None)
+            record["to_version"] = recommender.version
+            record["checks"] = self.validate(recommender, previous)
+            if self.warm is not None:
+                self.warm(recommender)
+
+            # Single reference assignment: new requests see the new version,
+            # requests already holding `previous` finish on it
+            self._current = recommender
+            self._source = (embeddings_path, mappings_path) if explicit else None
+            self.loaded_at = time.time()
+            self._failed_version = None
+            self.state["reloads"] += 1
+            self.state["last_error"] = None
+            record["result"] = "success"
+            print(f"Hot-reloaded model {record['from_version']} -> {recommender.version}")
+        except Exception as e:
+            self._failed_version = target_version
+            self.state["last_error"] = str(e)
+            record["result"] = "failed"
+            record["error"] = str(e)
+            print(f"Model reload from {embeddings_path} failed: {e}")
+        finally:
+            record["seconds"] = round(time.perf_counter() - start, 3)
+            metrics.RELOADS.inc(result=record["result"])
+            if record["result"] == "success":
+                metrics.LOAD_SECONDS.observe(record["seconds"], artifact="reload")
+            self.state["last_reload"] = record
+            self.state["state"] = "idle"
+            self._reload_lock.release()
+
+    def _ensure_polling(self):
+        if self.poll_interval > 0 and self._poller is None:
+            self._poller = threading.Thread(target=self._poll, name="model-reload-poll", daemon=True)
+            self._poller.start()
+
+    def _poll(self):
+        """Reload whenever the source files report a version other than the serving one."""
+        while True:
+            time.sleep(self.poll_interval)
+            try:
+                version = source_version(self._source_paths()[0])
+            except OSError:
+                continue
+            if version is not None and version != self.version and version != self._failed_version:
+                self.reload()
+
+    def status(self) -> dict:
+        embeddings_path, mappings_path = self._source_paths()
+        return {
+            "version": self.version,
+            "loaded_at": self.loaded_at,
+            "source": embeddings_path,
+            "mappings": mappings_path,
+            "available_version": source_version(embeddings_path),
+            "poll_interval_s": self.poll_interval,
+            **self.state,
+        }
+
@@ -0,0 +1,87 @@
+"""
+Recommendation Result Cache
+Bounded LRU + TTL cache of per-patient top-k results
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class RecommendationCache:
+    """
+    LRU cache keyed by (artifact version, patient index).
+
+    Each entry stores the largest top-k computed so far for that patient, so a
+    cached top-10 also answers requests for top-5. Entries from a different
+    artifact version never match, and the whole cache is dropped the first
+    time a new version is seen.
+    """
+
+    def __init__(self, max_entries: int = 10000, ttl_seconds: float = 300.0):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._version = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def _check_version(self, version: str):
+        if version != self._version:
+            self._entries.clear()
+            self._version = version
+
+    def get(self, version: str, patient_idx: int, top_k: int):
+        """Cached recommendations for top_k, or None on a miss."""
+        if not self.enabled:
+            return None
+        with self._lock:
+            self._check_version(version)
+            entry = self._entries.get(patient_idx)
+            if entry is not None:
+                cached_k, recommendations, stored_at = entry
+                expired = self.ttl_seconds and time.monotonic() - stored_at > self.ttl_seconds
+                if expired:
+                    del self._entries[patient_idx]
+                elif cached_k >= top_k:
+                    self._entries.move_to_end(patient_idx)
+                    self.hits += 1
+                    return recommendations[:top_k]
+            self.misses += 1
+            return None
+
+    def put(self, version: str, patient_idx: int, top_k: int, recommendations: list):
+        """Store a result unless a larger top-k is already cached."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._check_version(version)
+            entry = self._entries.get(patient_idx)
+            if entry is not None and entry[0] > top_k:
+                return
+            self._entries[patient_idx] = (top_k, recommendations, time.monotonic())
+            self._entries.move_to_end(patient_idx)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "version": self._version,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            }
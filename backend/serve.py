@@ -0,0 +1,155 @@
+"""
+Multi-worker Server
+Prepares the serving tables once as memory-mapped files, then runs N uvicorn workers over them
+
+`python main.py` serves from a single process. Plain `uvicorn --workers N`
+would make each worker torch.load its own copy of embeddings.pt and parse
+the diagnoses CSV into its own arrays. This supervisor instead:
+
+    1. exports embeddings.pt / mappings.pt to an artifact (artifacts.py)
+       unless an up-to-date one exists
+    2. converts the diagnoses CSV to a columnar store (diagnoses.py)
+       unless an up-to-date one exists
+    3. builds the IVF index once when DRUG_REC_SEARCH_MODE=ann
+    4. reads every file once so the page cache is warm
+    5. starts the workers with DRUG_REC_MODEL_PATH / DRUG_REC_DIAGNOSES_PATH
+       pointing at those files and torch threads split between them
+
+Workers map the files read-only (copy-on-write), so all of them share one
+copy of the tables in the page cache: resident memory grows by each
+worker's interpreter and small per-process arrays, not by the tables.
+DRUG_REC_QUANTIZE builds compressed copies in each worker and so gives up
+the sharing. The UMLS node/edge tables are still loaded per worker, on
+first use.
+
+With several workers, POST /api/admin/reload only reaches the worker that
+received it; set --reload-interval so every worker polls the artifact and
+re-export to the same directory to roll out a new version.
+
+Usage (from backend/):
+    python serve.py --workers 4 --port 8001
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import config
+from ann_index import IVFIndex
+from artifacts import export_artifact, is_artifact_dir, load_artifact
+from diagnoses import DiagnosisIndex
+from inference import default_model_paths
+
+READ_CHUNK = 16 << 20
+
+
+def _is_stale(target: str, sources: list) -> bool:
+    """Whether target is missing or older than any existing source file."""
+    if not os.path.exists(target):
+        return True
+    built = os.path.getmtime(target)
+    return any(os.path.exists(src) and os.path.getmtime(src) > built for src in sources)
+
+
+def prepare_artifact(embeddings_path: str, mappings_path: str, artifact_dir: str) -> str:
+    """Artifact directory to serve, exported from the .pt files if needed."""
+    if is_artifact_dir(embeddings_path):
+        return embeddings_path
+    header = os.path.join(artifact_dir, "header.json")
+    if _is_stale(header, [embeddings_path, mappings_path]):
+        print(f"Exporting {embeddings_path} to {artifact_dir}")
+        export_artifact(embeddings_path, mappings_path, artifact_dir)
+    return artifact_dir
+
+
+def prepare_diagnoses(store_dir: str, csv_path: str):
+    """Columnar diagnosis store to serve, converted from the CSV if needed (None if neither exists)."""
+    header = os.path.join(store_dir, "header.json")
+    if os.path.exists(csv_path) and _is_stale(header, [csv_path]):
+        print(f"Converting {csv_path} to {store_dir}")
+        DiagnosisIndex.from_csv(csv_path).save(store_dir)
+    return store_dir if DiagnosisIndex.is_store(store_dir) else None
+
+
+def prepare_ann_index(artifact_dir: str) -> str:
+    """Build the IVF index over the artifact's drugs once, next to the artifact."""
+    index_path = config.ANN_INDEX_PATH or os.path.join(artifact_dir, "ann_index.pt")
+    if _is_stale(index_path, [os.path.join(artifact_dir, "header.json")]):
+        embeddings, _, _ = load_artifact(artifact_dir)
+        drugs = embeddings["concept_embeddings"][embeddings["drug_concept_indices"]]
+        IVFIndex.build(drugs, nlist=config.ANN_NLIST).save(index_path)
+        print(f"Built ANN index at {index_path}")
+    return index_path
+
+
+def preload(paths: list) -> int:
+    """Read files once so workers start on a warm page cache. Returns bytes read."""
+    total = 0
+    for path in paths:
+        files = [os.path.join(path, name) for name in sorted(os.listdir(path))] if os.path.isdir(path) else [path]
+        for file in files:
+            if not os.path.isfile(file):
+                continue
+            with open(file, "rb", buffering=0) as f:
+                while True:
+                    chunk = f.read(READ_CHUNK)
+                    if not chunk:
+                        break
+                    total += len(chunk)
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the API from several workers sharing memory-mapped tables")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--artifact-dir", help="Where to export embeddings.pt (default: next to it, as artifact/)")
+    parser.add_argument("--torch-threads", type=int, default=0,
+                        help="Intra-op threads per worker (default: cores / workers)")
+    parser.add_argument("--reload-interval", type=float, default=config.RELOAD_INTERVAL_S,
+                        help="Seconds between each worker's check for a new artifact (0 = off)")
+    parser.add_argument("--no-preload", action="store_true", help="Skip reading the files into the page cache")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    embeddings_path, mappings_path = default_model_paths()
+    artifact_dir = args.artifact_dir or os.path.join(os.path.dirname(embeddings_path), "artifact")
+    artifact_dir = prepare_artifact(embeddings_path, mappings_path, artifact_dir)
+    diagnoses_dir = prepare_diagnoses(config.DIAGNOSES_PATH, config.DIAGNOSES_CSV)
+
+    env = {
+        "DRUG_REC_MODEL_PATH": artifact_dir,
+        "DRUG_REC_RELOAD_INTERVAL_S": str(args.reload_interval),
+    }
+    shared = [artifact_dir]
+    if diagnoses_dir:
+        env["DRUG_REC_DIAGNOSES_PATH"] = diagnoses_dir
+        shared.append(diagnoses_dir)
+    if config.SEARCH_MODE == "ann":
+        env["DRUG_REC_ANN_INDEX_PATH"] = prepare_ann_index(artifact_dir)
+    if config.QUANTIZE:
+        print("Warning: DRUG_REC_QUANTIZE builds a private compressed copy in every worker")
+
+    # One BLAS/OpenMP pool per worker, sized so workers do not oversubscribe cores
+    threads = args.torch_threads or max((os.cpu_count() or 1) // args.workers, 1)
+    env["OMP_NUM_THREADS"] = env["MKL_NUM_THREADS"] = str(threads)
+
+    if not args.no_preload:
+        read = preload(shared)
+        print(f"Preloaded {read / 2**20:.0f} MB into the page cache")
+    print(f"Shared tables ready in {time.perf_counter() - start:.1f}s: {', '.join(shared)}")
+
+    # Replace this process with uvicorn, so the memory used for exporting is
+    # returned before the workers start; they read the paths from the environment
+    print(f"Starting {args.workers} workers ({threads} torch threads each) on http://{args.host}:{args.port}")
+    sys.stdout.flush()
+    os.execvpe(sys.executable, [
+        sys.executable, "-m", "uvicorn", "main:app",
+        "--host", args.host, "--port", str(args.port), "--workers", str(args.workers),
+    ], {**os.environ, **env})
+
+
+if __name__ == "__main__":
+    main()
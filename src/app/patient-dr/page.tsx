@@ -13,7 +13,7 @@ import {
 
 // API base URLs
 const RECOMMEND_API = "http://localhost:8001";  // Drug recommendation backend
-const CUI_API = "http://localhost:8000";  // CUI lookup backend
+const CUI_API = RECOMMEND_API;  // CUI lookup (served by the recommendation backend)
 
 interface DrugRecommendation {
     cuid: string;
@@ -31,6 +31,11 @@ interface DrugDetails {
     synonyms: string;
 }
 
+interface CuiLookup {
+    found: boolean;
+    data: DrugDetails | null;
+}
+
 interface DiagnosisItem {
     icd_code: string;
     icd_version: number;
@@ -88,12 +93,12 @@ interface DrugCardProps {
     isTop: boolean;
     maxScore: number;
     index: number;
+    details: DrugDetails | null;
 }
 
-function DrugCard({ drug, rank, isTop, maxScore, index }: DrugCardProps) {
+function DrugCard({ drug, rank, isTop, maxScore, index, details }: DrugCardProps) {
     const [expanded, setExpanded] = useState(false);
-    const [details, setDetails] = useState<DrugDetails | null>(null);
-    const [drugName, setDrugName] = useState<string>("");
+    const drugName = details?.name || drug.cuid;
     const [barVisible, setBarVisible] = useState(false);
 
     // Animate the score bar on mount
@@ -102,25 +107,6 @@ function DrugCard({ drug, rank, isTop, maxScore, index }: DrugCardProps) {
         return () => clearTimeout(timer);
     }, [index]);
 
-    // Fetch drug name on mount
-    useEffect(() => {
-        const fetchName = async () => {
-            try {
-                const res = await fetch(`${CUI_API}/api/cui/${drug.cuid}`);
-                if (res.ok) {
-                    const data = await res.json();
-                    if (data.found && data.data) {
-                        setDrugName(data.data.name || drug.cuid);
-                        setDetails(data.data);
-                    }
-                }
-            } catch {
-                setDrugName(drug.cuid);
-            }
-        };
-        fetchName();
-    }, [drug.cuid]);
-
     const handleExpand = () => {
         setExpanded(!expanded);
     };
@@ -528,6 +514,7 @@ export default function PatientDR() {
     const [error, setError] = useState<string | null>(null);
     const [recommendations, setRecommendations] = useState<DrugRecommendation[]>([]);
     const [drugNames, setDrugNames] = useState<Record<string, string>>({});
+    const [drugDetails, setDrugDetails] = useState<Record<string, DrugDetails>>({});
     const [diagnoses, setDiagnoses] = useState<DiagnosisItem[]>([]);
     const [diagnosisNames, setDiagnosisNames] = useState<Record<string, string>>({});
     const [showDiagnoses, setShowDiagnoses] = useState(false);
@@ -588,56 +575,63 @@ export default function PatientDR() {
             setSearchedPatientId(patientId);
 
             // Fetch diagnoses
+            let patientDiagnoses: DiagnosisItem[] = [];
             try {
                 const diagResponse = await fetch(`${RECOMMEND_API}/api/diagnoses/${patientId}?top_k=20`);
                 if (diagResponse.ok) {
                     const diagData = await diagResponse.json();
-
-                    const diagNames: Record<string, string> = {};
-                    const validDiagnoses: DiagnosisItem[] = [];
-
-                    for (const diag of diagData.diagnoses || []) {
-                        if (validDiagnoses.length >= 10) break;
-
-                        try {
-                            const res = await fetch(`${CUI_API}/api/cui/${diag.cui}`);
-                            if (res.ok) {
-                                const cuiData = await res.json();
-                                if (cuiData.found && cuiData.data && cuiData.data.name) {
-                                    diagNames[diag.cui] = cuiData.data.name;
-                                    validDiagnoses.push(diag);
-                                }
-                            }
-                        } catch {
-                            continue;
-                        }
-                    }
-
-                    setDiagnoses(validDiagnoses);
-                    setDiagnosisNames(diagNames);
+                    patientDiagnoses = diagData.diagnoses || [];
                 }
             } catch (diagError) {
                 console.error("Failed to fetch diagnoses:", diagError);
-                setDiagnoses([]);
-                setDiagnosisNames({});
             }
 
-            // Fetch drug names for the graph
+            // Resolve all diagnosis and drug CUIs in one batch call
+            let cuiResults: Record<string, CuiLookup> = {};
+            try {
+                const cuis = [
+                    ...patientDiagnoses.map((diag) => diag.cui),
+                    ...data.recommendations.map((drug: DrugRecommendation) => drug.cuid),
+                ];
+                const cuiResponse = await fetch(`${CUI_API}/api/cui/batch`, {
+                    method: "POST",
+                    headers: { "Content-Type": "application/json" },
+                    body: JSON.stringify({ cuis }),
+                });
+                if (cuiResponse.ok) {
+                    cuiResults = (await cuiResponse.json()).results || {};
+                }
+            } catch (cuiError) {
+                console.error("Failed to fetch CUI details:", cuiError);
+            }
+
+            const diagNames: Record<string, string> = {};
+            const validDiagnoses: DiagnosisItem[] = [];
+            for (const diag of patientDiagnoses) {
+                if (validDiagnoses.length >= 10) break;
+                const cuiData = cuiResults[diag.cui];
+                if (cuiData?.found && cuiData.data?.name) {
+                    diagNames[diag.cui] = cuiData.data.name;
+                    validDiagnoses.push(diag);
+                }
+            }
+            setDiagnoses(validDiagnoses);
+            setDiagnosisNames(diagNames);
+
+            // Drug names for the graph and details for the cards
             const names: Record<string, string> = {};
+            const details: Record<string, DrugDetails> = {};
             for (const drug of data.recommendations) {
-                try {
-                    const res = await fetch(`${CUI_API}/api/cui/${drug.cuid}`);
-                    if (res.ok) {
-                        const cuiData = await res.json();
-                        if (cuiData.found && cuiData.data) {
-                            names[drug.cuid] = cuiData.data.name;
-                        }
-                    }
-                } catch {
+                const cuiData = cuiResults[drug.cuid];
+                if (cuiData?.found && cuiData.data) {
+                    names[drug.cuid] = cuiData.data.name;
+                    details[drug.cuid] = cuiData.data;
+                } else {
                     names[drug.cuid] = drug.cuid;
                 }
             }
             setDrugNames(names);
+            setDrugDetails(details);
         } catch (err) {
             setError(err instanceof Error ? err.message : "An error occurred");
             setRecommendations([]);
@@ -984,6 +978,7 @@ export default function PatientDR() {
                                                     isTop={index === 0}
                                                     maxScore={maxScore}
                                                     index={index}
+                                                    details={drugDetails[drug.cuid] || null}
                                                 />
                                             ))
                                         ) : (